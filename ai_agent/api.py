@@ -147,20 +147,21 @@ def is_created(news_date: str, news_source: str, api_key: str = None) -> bool:
         return False
 
 
-def create_news_send_to_api(news_date: str, news_category: str) -> bool:
+def create_news_send_to_api(news_date: str, news_category: str, bypass_cache: bool = False) -> bool:
     """
     Execute Gemini CLI prompt and send the result to the API
 
     Args:
         news_date: Date in YYYY-MM-DD format
         news_category: News category from available categories
+        bypass_cache: Call Gemini even if the response is cached
 
     Returns:
         True if successful, False otherwise
     """
     # Execute Gemini CLI prompt
     print(f"Getting news for category: {news_category}, date: {news_date}")
-    gemini_response = execute_gemini_prompt(news_category, news_date)
+    gemini_response = execute_gemini_prompt(news_category, news_date, bypass_cache=bypass_cache)
 
     if not gemini_response:
         print("Error: Failed to get response from Gemini CLI")
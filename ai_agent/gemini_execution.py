@@ -7,6 +7,11 @@ import argparse
 from datetime import date
 from typing import Optional, Dict, List
 
+from response_cache import get_cached_response, response_cache_key, store_response
+
+# Model name of the cache keys of Gemini CLI responses
+GEMINI_CACHE_MODEL = "gemini-cli"
+
 # Mapping of news categories to their respective prompt files
 CATEGORY_PROMPT_MAPPING: Dict[str, str] = {
     "polish_rap": "prompts/polish-rap-news.md",
@@ -24,13 +29,17 @@ def list_all_categories() -> List[str]:
     """Return list of all available categories"""
     return list(CATEGORY_PROMPT_MAPPING.keys())
 
-def execute_gemini_prompt(news_category: str, news_date: str) -> Optional[str]:
+def execute_gemini_prompt(news_category: str, news_date: str, bypass_cache: bool = False) -> Optional[str]:
     """
     Execute Gemini CLI with prompt for specified category and date
 
+    Successful responses are cached by (general rules, rendered prompt), so a
+    rerun for the same category and date returns without calling Gemini.
+
     Args:
         category: News category key from CATEGORY_PROMPT_MAPPING
         news_date: Date in YYYY-MM-DD format
+        bypass_cache: Call Gemini even if the response is cached (the cache is refreshed)
 
     Returns:
         Gemini CLI response content if successful, None otherwise
@@ -50,7 +59,14 @@ def execute_gemini_prompt(news_category: str, news_date: str) -> Optional[str]:
             general_rules = f.read()
 
         # Replace the date variable and append general rules
-        prompt = prompt_content.replace("{{news_date}}", news_date) + "\n\n" + general_rules
+        rendered_prompt = prompt_content.replace("{{news_date}}", news_date)
+        prompt = rendered_prompt + "\n\n" + general_rules
+
+        cache_key = response_cache_key(GEMINI_CACHE_MODEL, general_rules, rendered_prompt)
+        cached = get_cached_response(cache_key, bypass=bypass_cache)
+        if cached is not None:
+            print(f"Using cached Gemini CLI response for category: {news_category}, date: {news_date}")
+            return cached
 
         # Execute gemini CLI
         print(f"Executing Gemini CLI for category: {news_category}, date: {news_date}")
@@ -66,6 +82,9 @@ def execute_gemini_prompt(news_category: str, news_date: str) -> Optional[str]:
         if result.returncode == 0:
             print("Gemini CLI Output:")
             print(result.stdout)
+            # Empty output is a failure too; only real responses are cached
+            if result.stdout.strip():
+                store_response(cache_key, GEMINI_CACHE_MODEL, result.stdout)
             return result.stdout
         else:
             print(f"Error executing Gemini CLI: {result.stderr}")
@@ -84,6 +103,7 @@ def main():
     parser.add_argument("category", help="News category", choices=list_all_categories())
     parser.add_argument("date", help="Date in YYYY-MM-DD format")
     parser.add_argument("--list-categories", action="store_true", help="List all available categories")
+    parser.add_argument("--bypass-cache", action="store_true", help="Call Gemini even if the response is cached")
 
     args = parser.parse_args()
 
@@ -100,7 +120,7 @@ def main():
         print("Error: Invalid date format. Use YYYY-MM-DD")
         sys.exit(1)
 
-    response = execute_gemini_prompt(args.category, args.date)
+    response = execute_gemini_prompt(args.category, args.date, bypass_cache=args.bypass_cache)
     if not response:
         sys.exit(1)
 
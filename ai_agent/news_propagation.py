@@ -62,7 +62,8 @@ def generate_date_range(start_date: date, end_date: date) -> List[date]:
 
     return dates
 
-def propagate_news_for_dates(start_date: date, end_date: date, categories: List[str] = None) -> Dict[str, int]:
+def propagate_news_for_dates(start_date: date, end_date: date, categories: List[str] = None,
+                             bypass_cache: bool = False) -> Dict[str, int]:
     """
     Propagate news for given date range and categories
 
@@ -70,6 +71,7 @@ def propagate_news_for_dates(start_date: date, end_date: date, categories: List[
         start_date: Start date for news propagation
         end_date: End date for news propagation
         categories: List of categories to propagate (uses all if None)
+        bypass_cache: Call Gemini even for responses in the cache
 
     Returns:
         Dictionary with statistics: {'total': int, 'created': int, 'skipped': int, 'failed': int}
@@ -117,7 +119,7 @@ def propagate_news_for_dates(start_date: date, end_date: date, categories: List[
 
             # Create and send news
             print(f"  -> Creating new news entry...")
-            success = create_news_send_to_api(date_str, category)
+            success = create_news_send_to_api(date_str, category, bypass_cache=bypass_cache)
 
             if success:
                 print(f"  ->  Successfully created")
@@ -131,7 +133,7 @@ def propagate_news_for_dates(start_date: date, end_date: date, categories: List[
 
     return stats
 
-def propagate_last_two_months() -> Dict[str, int]:
+def propagate_last_two_months(bypass_cache: bool = False) -> Dict[str, int]:
     """
     Propagate news for the last 2 months
 
@@ -141,7 +143,7 @@ def propagate_last_two_months() -> Dict[str, int]:
     end_date = date.today()
     start_date = end_date - timedelta(days=60)  # Approximately 2 months
 
-    return propagate_news_for_dates(start_date, end_date)
+    return propagate_news_for_dates(start_date, end_date, bypass_cache=bypass_cache)
 
 def main():
     """Main function with CLI argument parsing"""
@@ -152,6 +154,8 @@ def main():
                        choices=list_all_categories())
     parser.add_argument("--last-two-months", action="store_true",
                        help="Propagate news for the last 2 months")
+    parser.add_argument("--bypass-cache", action="store_true",
+                       help="Call Gemini even for responses in the cache")
 
     args = parser.parse_args()
 
@@ -176,13 +180,13 @@ def main():
     # Determine execution mode
     if args.last_two_months:
         print("Propagating news for the last 2 months...")
-        stats = propagate_last_two_months()
+        stats = propagate_last_two_months(bypass_cache=args.bypass_cache)
     elif args.start_date and args.end_date:
         if start_date > end_date:
             print("Error: Start date cannot be after end date")
             return
         print(f"Propagating news from {args.start_date} to {args.end_date}...")
-        stats = propagate_news_for_dates(start_date, end_date, args.categories)
+        stats = propagate_news_for_dates(start_date, end_date, args.categories, bypass_cache=args.bypass_cache)
     else:
         print("Error: Please specify either --last-two-months or both --start-date and --end-date")
         parser.print_help()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# Response cache for the Gemini CLI calls
+
+"""
+Persistent cache of LLM responses in a local SQLite file (stdlib only, no Django).
+
+Entries are keyed by sha256 of (model, system prompt, rendered user prompt),
+the same key as the backend cache (backend/words/response_cache.py). An entry
+is served for RESPONSE_CACHE_TTL seconds. Once the stored responses exceed
+RESPONSE_CACHE_MAX_BYTES, the least recently used ones are evicted. Hit, miss
+and bypass counts are kept in the same file, so every run adds to them.
+The settings are read from the environment on each call (RESPONSE_CACHE_PATH
+moves the file).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Optional
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "cypher_arena", "ai_agent_responses.sqlite3")
+COUNTERS = ("hits", "misses", "bypassed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used_at ON responses (last_used_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def cache_path() -> str:
+    return os.getenv("RESPONSE_CACHE_PATH", DEFAULT_CACHE_PATH)
+
+
+def cache_ttl() -> float:
+    return float(os.getenv("RESPONSE_CACHE_TTL", 30 * 24 * 60 * 60))
+
+
+def cache_max_bytes() -> int:
+    return int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+def response_cache_key(model: str, system_prompt: str, user_prompt: str) -> str:
+    """sha256 of (model, system prompt, user prompt)"""
+    payload = json.dumps([model, system_prompt or "", user_prompt or ""], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    path = cache_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Autocommit; several processes may share the file
+    connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _count(connection: sqlite3.Connection, counter: str) -> None:
+    connection.execute(
+        "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET value = value + 1",
+        (counter,),
+    )
+
+
+def response_cache_stats() -> Dict[str, int]:
+    """Return hit / miss / bypass counts of the cache file"""
+    connection = _connect()
+    try:
+        stored = dict(connection.execute("SELECT name, value FROM counters"))
+    finally:
+        connection.close()
+    return {counter: stored.get(counter, 0) for counter in COUNTERS}
+
+
+def get_cached_response(key: str, bypass: bool = False) -> Optional[str]:
+    """
+    Get the cached response of a key
+
+    Args:
+        key: Key from response_cache_key
+        bypass: Skip the lookup (counted as bypassed)
+
+    Returns:
+        The response if a fresh one is cached, None otherwise (also when the cache file is unusable)
+    """
+    try:
+        connection = _connect()
+        try:
+            if bypass:
+                _count(connection, "bypassed")
+                return None
+            now = time.time()
+            row = connection.execute(
+                "SELECT response FROM responses WHERE key = ? AND created_at > ?", (key, now - cache_ttl())
+            ).fetchone()
+            if row is None:
+                _count(connection, "misses")
+                return None
+            connection.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+            _count(connection, "hits")
+            return json.loads(row[0])
+        finally:
+            connection.close()
+    except (sqlite3.Error, ValueError) as e:
+        # Locked, corrupt or unwritable file, or a damaged entry: a miss
+        print(f"Response cache unavailable: {e}")
+        return None
+
+
+def store_response(key: str, model: str, response: str) -> None:
+    """Cache a response (replacing an older one), then evict down to the size limit"""
+    data = json.dumps(response, ensure_ascii=False)
+    now = time.time()
+    try:
+        connection = _connect()
+        try:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, data, len(data.encode("utf-8")), now, now),
+            )
+            evict_responses(connection)
+        finally:
+            connection.close()
+    except sqlite3.Error as e:
+        # The response is still returned to the caller, just not cached
+        print(f"Response cache unavailable: {e}")
+
+
+def evict_responses(connection: sqlite3.Connection) -> int:
+    """Delete expired entries, then the least recently used ones over the size limit"""
+    deleted = connection.execute("DELETE FROM responses WHERE created_at <= ?", (time.time() - cache_ttl(),)).rowcount
+    excess = connection.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0] - cache_max_bytes()
+    if excess <= 0:
+        return deleted
+    victims = []
+    for key, size in connection.execute("SELECT key, size FROM responses ORDER BY last_used_at, key"):
+        victims.append((key,))
+        excess -= size
+        if excess <= 0:
+            break
+    connection.executemany("DELETE FROM responses WHERE key = ?", victims)
+    return deleted + len(victims)
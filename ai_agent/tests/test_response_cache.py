@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# Tests for the Gemini CLI response cache (run from ai_agent/: python -m pytest tests/test_response_cache.py)
+
+import sqlite3
+import subprocess
+import time
+
+import pytest
+
+import gemini_execution
+import response_cache
+
+
+@pytest.fixture(autouse=True)
+def cache_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", str(tmp_path / "responses.sqlite3"))
+    monkeypatch.delenv("RESPONSE_CACHE_TTL", raising=False)
+    monkeypatch.delenv("RESPONSE_CACHE_MAX_BYTES", raising=False)
+
+
+@pytest.fixture
+def gemini_cli(monkeypatch):
+    """Replace the gemini CLI: each call pops (returncode, stdout) from `results`"""
+    calls = []
+    results = []
+
+    def run(args, **kwargs):
+        calls.append(args)
+        returncode, stdout = results.pop(0) if results else (0, f"<esej>response {len(calls)}</esej>")
+        return subprocess.CompletedProcess(args, returncode, stdout=stdout, stderr="boom")
+
+    monkeypatch.setattr(gemini_execution.subprocess, "run", run)
+    monkeypatch.chdir(gemini_execution.__file__.rsplit("/", 1)[0])
+    return calls, results
+
+
+def test_key_covers_model_and_prompts():
+    key = response_cache.response_cache_key("gemini-cli", "rules", "prompt")
+    assert len(key) == 64
+    assert key == response_cache.response_cache_key("gemini-cli", "rules", "prompt")
+    assert key != response_cache.response_cache_key("gemini-cli", "rules", "other")
+    assert response_cache.response_cache_key("m", "ab", "c") != response_cache.response_cache_key("m", "a", "bc")
+
+
+def test_execute_gemini_prompt_is_cached(gemini_cli):
+    calls, _ = gemini_cli
+    first = gemini_execution.execute_gemini_prompt("polish_rap", "2025-10-04")
+    second = gemini_execution.execute_gemini_prompt("polish_rap", "2025-10-04")
+    other_date = gemini_execution.execute_gemini_prompt("polish_rap", "2025-10-05")
+
+    assert first == second == "<esej>response 1</esej>"
+    assert other_date == "<esej>response 2</esej>"
+    assert len(calls) == 2
+    assert response_cache.response_cache_stats() == {"hits": 1, "misses": 2, "bypassed": 0}
+
+
+def test_bypass_refreshes_cache(gemini_cli):
+    calls, _ = gemini_cli
+    gemini_execution.execute_gemini_prompt("world_news", "2025-10-04")
+    refreshed = gemini_execution.execute_gemini_prompt("world_news", "2025-10-04", bypass_cache=True)
+
+    assert refreshed == "<esej>response 2</esej>"
+    assert gemini_execution.execute_gemini_prompt("world_news", "2025-10-04") == refreshed
+    assert len(calls) == 2
+    assert response_cache.response_cache_stats()["bypassed"] == 1
+
+
+def test_failures_are_not_cached(gemini_cli):
+    calls, results = gemini_cli
+    results.extend([(1, ""), (0, "  \n")])
+
+    assert gemini_execution.execute_gemini_prompt("polish_general", "2025-10-04") is None
+    assert gemini_execution.execute_gemini_prompt("polish_general", "2025-10-04") == "  \n"
+    assert gemini_execution.execute_gemini_prompt("polish_general", "2025-10-04") == "<esej>response 3</esej>"
+    assert len(calls) == 3
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    key = response_cache.response_cache_key("gemini-cli", "rules", "prompt")
+    response_cache.store_response(key, "gemini-cli", "old")
+    assert response_cache.get_cached_response(key) == "old"
+
+    monkeypatch.setattr(response_cache.time, "time", lambda: time.time_ns() / 1e9 + 31 * 24 * 60 * 60)
+    assert response_cache.get_cached_response(key) is None
+
+
+def test_size_limit_evicts_least_recently_used(monkeypatch):
+    keys = [response_cache.response_cache_key("gemini-cli", "", str(index)) for index in range(3)]
+    for key in keys:
+        response_cache.store_response(key, "gemini-cli", "x" * 100)
+        time.sleep(0.01)
+    # Reading an entry makes it recently used
+    response_cache.get_cached_response(keys[0])
+
+    monkeypatch.setenv("RESPONSE_CACHE_MAX_BYTES", "250")
+    new_key = response_cache.response_cache_key("gemini-cli", "", "3")
+    response_cache.store_response(new_key, "gemini-cli", "x" * 100)
+
+    assert response_cache.get_cached_response(keys[0]) == "x" * 100
+    assert response_cache.get_cached_response(new_key) == "x" * 100
+    assert response_cache.get_cached_response(keys[1]) is None
+    assert response_cache.get_cached_response(keys[2]) is None
+
+
+def test_failures_inside_the_cache_are_misses(monkeypatch):
+    key = response_cache.response_cache_key("gemini-cli", "rules", "prompt")
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(response_cache, "evict_responses", locked)
+    response_cache.store_response(key, "gemini-cli", "text")
+    monkeypatch.setattr(response_cache, "_count", locked)
+    assert response_cache.get_cached_response(key) is None
+    assert response_cache.get_cached_response(key, bypass=True) is None
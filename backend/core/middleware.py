@@ -0,0 +1,61 @@
+"""
+Per-request user agent and fingerprint.
+
+UserAgentMiddleware attaches request.user_agent lazily; the parse itself is
+memoized per raw User-Agent string in a bounded LRU cache, so the ua-parser
+regexes run once per distinct browser and process instead of once per
+request. get_user_fingerprint computes the rating fingerprint at most once
+per request.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.utils.functional import SimpleLazyObject
+from user_agents import parse
+
+USER_AGENT_CACHE_SIZE = 2048
+
+
+@lru_cache(maxsize=USER_AGENT_CACHE_SIZE)
+def parse_user_agent(ua_string):
+    """Parsed user_agents.UserAgent of a raw User-Agent string (shared, treat as read-only)."""
+    return parse(ua_string)
+
+
+@lru_cache(maxsize=USER_AGENT_CACHE_SIZE)
+def _fingerprint_prefix(ua_string):
+    user_agent = parse_user_agent(ua_string)
+    return f"{user_agent.browser.family}-{user_agent.browser.version_string}-{user_agent.os.family}-{user_agent.os.version_string}-"
+
+
+def _user_agent_string(request):
+    return request.META.get('HTTP_USER_AGENT', '')
+
+
+def get_user_agent(request):
+    """request.user_agent when the middleware set it, else the (cached) parse of the header."""
+    user_agent = getattr(request, 'user_agent', None)
+    if user_agent is not None:
+        return user_agent
+    return parse_user_agent(_user_agent_string(request))
+
+
+def get_user_fingerprint(request):
+    """Anonymous rater id: sha256 of browser, OS (with versions) and IP address."""
+    # DRF requests proxy attribute reads to the HttpRequest but keep their own writes
+    request = getattr(request, '_request', request)
+    fingerprint = getattr(request, '_user_fingerprint', None)
+    if fingerprint is None:
+        fingerprint_string = _fingerprint_prefix(_user_agent_string(request)) + request.META.get('REMOTE_ADDR', '')
+        fingerprint = request._user_fingerprint = hashlib.sha256(fingerprint_string.encode('utf-8')).hexdigest()
+    return fingerprint
+
+
+class UserAgentMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        ua_string = _user_agent_string(request)
+        request.user_agent = SimpleLazyObject(lambda: parse_user_agent(ua_string))
+        return self.get_response(request)
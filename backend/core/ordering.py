@@ -0,0 +1,92 @@
+"""
+Seeded pseudo-random ordering for list endpoints.
+
+order_by('?') sorts the whole table on every request and gives every page a
+different shuffle, so paging through "random" results repeats and misses
+rows. Shuffled models instead store a random SHUFFLE_KEY per row (an indexed
+column, filled in by random_shuffle_key when the row is created), and
+shuffle_by_seed walks that index starting at a point derived from the seed:
+rows with key >= pivot by (key, id), then the rows below the pivot. One seed
+gives one fixed order and consecutive pages partition it; every page is an
+ordered range scan of the index (head, then tail) rather than a sort of the
+table by a computed expression. Different seeds start the walk at different
+rows of the same stored shuffle.
+"""
+import hashlib
+import random
+
+from django.db.models import Q
+
+SHUFFLE_BITS = 31
+SHUFFLE_MASK = (1 << SHUFFLE_BITS) - 1
+SHUFFLE_KEY = "shuffle_key"
+
+
+def random_shuffle_key():
+    """Default of the SHUFFLE_KEY columns."""
+    return random.getrandbits(SHUFFLE_BITS)
+
+
+def shuffle_pivot(seed):
+    """Key at which the walk of a seed (of any type) starts."""
+    digest = hashlib.sha256(str(seed).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") & SHUFFLE_MASK
+
+
+class SeededShuffle:
+    """
+    A queryset in seeded order, as a count()-able, sliceable sequence (what
+    Paginator and KeysetPagination need). Slices are served from the head
+    (key >= pivot) and tail (key < pivot) querysets, each ordered by the index.
+    """
+    ordered = True
+
+    def __init__(self, queryset, pivot, head=None, tail=None):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.pivot = pivot
+        ordering = (SHUFFLE_KEY, "id")
+        self.head = queryset.filter(**{f"{SHUFFLE_KEY}__gte": pivot}).order_by(*ordering) if head is None else head
+        self.tail = queryset.filter(**{f"{SHUFFLE_KEY}__lt": pivot}).order_by(*ordering) if tail is None else tail
+        self._head_count = None
+
+    def count(self):
+        return self.queryset.count()
+
+    def __len__(self):
+        return self.count()
+
+    def after(self, key, obj_id):
+        """The rows that come after the row (key, obj_id) in this order."""
+        later = Q(**{f"{SHUFFLE_KEY}__gt": key}) | Q(**{SHUFFLE_KEY: key, "id__gt": obj_id})
+        if key >= self.pivot:
+            return SeededShuffle(self.queryset, self.pivot, head=self.head.filter(later), tail=self.tail)
+        return SeededShuffle(self.queryset, self.pivot, head=self.head.none(), tail=self.tail.filter(later))
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            rows = self[item:item + 1]
+            if not rows:
+                raise IndexError("SeededShuffle index out of range")
+            return rows[0]
+        start, stop = item.start or 0, item.stop
+        if item.step is not None or start < 0 or (stop is not None and stop < 0):
+            raise ValueError("SeededShuffle only supports non-negative slices without a step")
+        rows = list(self.head[start:stop]) if stop is None or start < stop else []
+        if stop is not None and len(rows) == stop - start:
+            return rows
+        # The head ran out inside the slice (its count is only needed then)
+        if rows:
+            head_count = start + len(rows)
+        else:
+            if self._head_count is None:
+                self._head_count = self.head.count()
+            head_count = self._head_count
+        tail_start = max(start - head_count, 0)
+        tail_stop = None if stop is None else stop - head_count
+        return rows + list(self.tail[tail_start:tail_stop])
+
+
+def shuffle_by_seed(queryset, seed):
+    """queryset in the stable random order of seed (see SeededShuffle)."""
+    return SeededShuffle(queryset, shuffle_pivot(seed))
@@ -14,6 +14,7 @@ from pathlib import Path
 import dj_database_url
 import environ
 import os
+import sys
 
 env = environ.Env()
 environ.Env.read_env()
@@ -22,13 +23,30 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+WORD_PACK_DIR = os.path.join(MEDIA_ROOT, "word_packs")
+# Memory-mapped similarity search index (see words/embedding_index.py)
+EMBEDDING_INDEX_DIR = env("EMBEDDING_INDEX_DIR", default=os.path.join(MEDIA_ROOT, "embedding_index"))
+EMBEDDING_INDEX_NPROBE = env.int("EMBEDDING_INDEX_NPROBE", default=8)
+# Change feed (/words/agent/changes/): entries are served once they are this old and kept this long
+CHANGE_FEED_SETTLE_SECONDS = env.int("CHANGE_FEED_SETTLE_SECONDS", default=5)
+CHANGE_LOG_RETENTION_DAYS = env.int("CHANGE_LOG_RETENTION_DAYS", default=30)
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = env("SECRET_KEY")
 PERPLEXITY_API_KEY =  env("PERPLEXITY_API_KEY")
+# Perplexity client (words/perplexity_deep_research.py); point the base URL at a stub server in tests
+PERPLEXITY_BASE_URL = env("PERPLEXITY_BASE_URL", default="https://api.perplexity.ai")
+PERPLEXITY_TIMEOUT = env.float("PERPLEXITY_TIMEOUT", default=300.0)
+PERPLEXITY_MAX_CONCURRENCY = env.int("PERPLEXITY_MAX_CONCURRENCY", default=4)
+PERPLEXITY_MAX_RETRIES = env.int("PERPLEXITY_MAX_RETRIES", default=4)
+# Cache of external LLM / search responses by prompt (words/response_cache.py)
+RESPONSE_CACHE_TTL = env.int("RESPONSE_CACHE_TTL", default=30 * 24 * 60 * 60)
+RESPONSE_CACHE_MAX_BYTES = env.int("RESPONSE_CACHE_MAX_BYTES", default=256 * 1024 * 1024)
 AI_AGENT_SECRET_KEY =  env("AI_AGENT_SECRET_KEY")
+# Rows per query for the agent batch endpoints (bulk upserts/updates)
+AGENT_BULK_BATCH_SIZE = env.int("AGENT_BULK_BATCH_SIZE", default=1000)
 # SECURITY WARNING: don't run with debug turned on in production!
 # DEBUG = False
 DEBUG = True
@@ -61,7 +79,17 @@ INSTALLED_APPS = [
 ]
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
+# Chords (the parallel news searches in words/tasks.py) need a result backend
+CELERY_RESULT_BACKEND = env("CELERY_RESULT_BACKEND", default='redis://localhost:6379/1')
+# Redis for the per-window locks of the news searches (empty: rely on the unique constraint only)
+SEARCH_WINDOW_LOCK_URL = env("SEARCH_WINDOW_LOCK_URL", default=CELERY_BROKER_URL)
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# Shared by every web and Celery process: the in-memory word pool, embedding
+# matrices / indexes and tag index are invalidated through version keys here
+CACHES = {"default": env.cache("CACHE_URL", default="rediscache://localhost:6379/2")}
+if sys.argv[1:2] == ["test"]:
+    # The test run is a single process; keep it independent of a Redis server
+    CACHES = {"default": env.cache_url_config("locmemcache://")}
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     # "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -71,6 +99,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.UserAgentMiddleware",
     # external
     "corsheaders.middleware.CorsMiddleware",
 ]
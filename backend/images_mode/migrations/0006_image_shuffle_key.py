@@ -0,0 +1,29 @@
+# Generated by Django 5.0.1 on 2026-10-17 22:56
+
+import core.ordering
+from django.db import migrations, models
+
+
+def randomize_shuffle_keys(apps, schema_editor):
+    # AddField gives every existing row the same default value
+    Image = apps.get_model('images_mode', 'Image')
+    images = list(Image.objects.only('id'))
+    for image in images:
+        image.shuffle_key = core.ordering.random_shuffle_key()
+    Image.objects.bulk_update(images, ['shuffle_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images_mode', '0005_alter_imagebackup_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='shuffle_key',
+            field=models.IntegerField(db_index=True, default=core.ordering.random_shuffle_key, editable=False),
+        ),
+        migrations.RunPython(randomize_shuffle_keys, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from core.managers import ExcludeFromDumpdataManager
+from core.ordering import random_shuffle_key
 
 class MainCategory(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -17,6 +18,8 @@ class Image(models.Model):
     image_file = models.ImageField(upload_to='images/')
     title = models.CharField(max_length=255, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Random position in the stored shuffle behind seeded ordering (core.ordering)
+    shuffle_key = models.IntegerField(default=random_shuffle_key, db_index=True, editable=False)
 
     def __str__(self):
         return f"{self.title} - {self.category.name}"
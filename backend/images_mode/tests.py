@@ -1,3 +1,21 @@
 from django.test import TestCase
+from rest_framework.test import APIClient
+from .models import Category, Image
 
-# Create your tests here.
+
+class ImageViewSetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="animals")
+        Image.objects.bulk_create([Image(category=category, image_file=f"images/{i}.jpg", title=f"image {i}") for i in range(12)])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_seeded_pages_do_not_repeat(self):
+        titles = []
+        for page in (1, 2, 3):
+            response = self.client.get('/images_mode/images/', {'seed': 'session-1', 'page': page, 'page_size': 4})
+            self.assertEqual(response.status_code, 200)
+            titles.extend(image['title'] for image in response.json()['results'])
+        self.assertEqual(len(set(titles)), 12)
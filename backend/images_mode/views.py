@@ -3,6 +3,7 @@ from django.shortcuts import render
 # Create your views here.
 from rest_framework import viewsets
 from rest_framework.pagination import PageNumberPagination
+from core.ordering import shuffle_by_seed
 from .models import Image
 from .serializers import ImageSerializer
 
@@ -19,10 +20,19 @@ class ImageViewSet(viewsets.ReadOnlyModelViewSet):
     Parameters:
     - page: Integer number of the page to retrieve (default 1).
     - page_size: Integer specifying number of images per page (default 5, max 100).
+    - seed: Optional. The same seed always gives the same order, so pages don't repeat images.
     
     Usage:
     - /images_mode/images/?page=2&page_size=10
+    - /images_mode/images/?seed=42&page=2
     """
     queryset = Image.objects.all().order_by('?')
     serializer_class = ImageSerializer
-    pagination_class = StandardResultsSetPagination
\ No newline at end of file
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        seed = self.request.query_params.get('seed')
+        # retrieve looks the image up by pk, which needs a plain queryset
+        if seed is None or self.action != 'list':
+            return super().get_queryset()
+        return shuffle_by_seed(Image.objects.all(), seed)
\ No newline at end of file
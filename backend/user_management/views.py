@@ -6,7 +6,7 @@ from .models import UserFeedback, UserVisit
 from rest_framework import generics
 from .models import UserFeedback
 from rest_framework.decorators import api_view
-from django_user_agents.utils import get_user_agent
+from core.middleware import get_user_agent
 from rest_framework import status
 from rest_framework.response import Response
 from datetime import datetime
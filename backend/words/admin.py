@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Word, ContrastPair, CypherArenaPerplexityDeepResearch, ContrastPairRating
+from .models import Word, ContrastPair, CypherArenaPerplexityDeepResearch, ContrastPairRating, ExternalResponseCache
 
 # Register your models here.
 class WordsAdmin(admin.ModelAdmin):
@@ -20,14 +20,21 @@ class ContrastPairRatingFilter(admin.SimpleListFilter):
         return queryset
 
 class ContrastPairAdmin(admin.ModelAdmin):
-    list_display = ('item1', 'item2', )
-    list_filter = (ContrastPairRatingFilter,)
+    list_display = ('item1', 'item2', 'rating_count', 'avg_rating', 'min_rating')
+    list_filter = (ContrastPairRatingFilter, 'min_rating')
+    readonly_fields = ('rating_count', 'rating_sum', 'min_rating', 'avg_rating')
 
 
 class CypherArenaPerplexityDeepResearchAdmin(admin.ModelAdmin):
     list_display = ('id', 'start_date', 'end_date', 'news_source')
 
 
+class ExternalResponseCacheAdmin(admin.ModelAdmin):
+    list_display = ('id', 'model', 'size', 'created_at', 'last_used_at')
+    readonly_fields = ('key', 'model', 'response', 'size', 'created_at', 'last_used_at')
+
+
 admin.site.register(ContrastPair, ContrastPairAdmin)
 admin.site.register(CypherArenaPerplexityDeepResearch, CypherArenaPerplexityDeepResearchAdmin)
 admin.site.register(Word, WordsAdmin)
+admin.site.register(ExternalResponseCache, ExternalResponseCacheAdmin)
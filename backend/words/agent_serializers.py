@@ -1,16 +1,69 @@
 from rest_framework import serializers
 from .models import ContrastPair, ContrastPairRating, Temator, CypherArenaPerplexityDeepResearch
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .serializers import DynamicFieldsModelSerializer
+from .embeddings import (
+    EMBEDDING_STORAGE_DTYPES, decode_embedding, encode_embedding, is_typed_embedding, is_usable_embedding, parse_embedding,
+)
 import base64
+import numpy as np
+
+
+def _validate_vector_embedding(data):
+    """
+    Validate an update's base64 vector_embedding and store it as a typed
+    blob (see embeddings.encode_embedding). Typed blobs must have a
+    consistent header and are kept as sent unless embedding_dtype /
+    embedding_model ask for a conversion; raw little-endian float32 values
+    are always converted (to embedding_dtype, float32 by default).
+    """
+    vector_embedding_str = data.get('vector_embedding')
+    embedding_dtype = data.pop('embedding_dtype', None)
+    embedding_model = data.pop('embedding_model', None)
+    if vector_embedding_str is None or vector_embedding_str == "":
+        return data
+    try:
+        blob = base64.b64decode(vector_embedding_str)
+    except (TypeError, base64.binascii.Error):
+        raise serializers.ValidationError({"vector_embedding": "Invalid base64 format."})
+
+    if is_typed_embedding(blob):
+        try:
+            embedding = parse_embedding(blob)
+        except ValueError as error:
+            raise serializers.ValidationError({"vector_embedding": str(error)})
+        vector, model = decode_embedding(blob), embedding.model
+        if not is_usable_embedding(vector):
+            raise serializers.ValidationError({"vector_embedding": "Embedding values must be finite."})
+        if embedding_dtype is None and embedding_model is None:
+            return data
+    else:
+        vector, model = decode_embedding(blob), ''
+        if vector is None:
+            raise serializers.ValidationError({"vector_embedding": "Untyped embeddings must be raw little-endian float32 values."})
+
+    try:
+        blob = encode_embedding(vector, dtype=embedding_dtype or 'float32', model=embedding_model or model)
+    except ValueError as error:
+        raise serializers.ValidationError({"vector_embedding": str(error)})
+    data['vector_embedding'] = base64.b64encode(blob).decode('ascii')
+    return data
 
 # --------------- Contrast Pair Serializers ---------------
 
 class AgentContrastPairInputSerializer(serializers.Serializer):
     item1 = serializers.CharField(max_length=100, required=True)
     item2 = serializers.CharField(max_length=100, required=True)
+    vector_embedding = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    embedding_dtype = serializers.ChoiceField(choices=list(EMBEDDING_STORAGE_DTYPES), required=False)
+    embedding_model = serializers.CharField(max_length=255, required=False)
+
+    def validate(self, data):
+        return _validate_vector_embedding(data)
 
 class AgentContrastPairBatchCreateSerializer(serializers.Serializer):
     pairs = AgentContrastPairInputSerializer(many=True, required=True)
+    dedupe_threshold = serializers.FloatField(min_value=0, max_value=1, required=False) # Skip pairs whose embedding is at least this similar to an existing or earlier one
 
 class AgentContrastPairRatingInputSerializer(serializers.Serializer):
     pair_id = serializers.IntegerField(required=True)
@@ -19,24 +72,25 @@ class AgentContrastPairRatingInputSerializer(serializers.Serializer):
 class AgentContrastPairBatchRatingSerializer(serializers.Serializer):
     ratings = AgentContrastPairRatingInputSerializer(many=True, required=True)
 
+class AgentContrastPairTagAssignmentSerializer(serializers.Serializer):
+    pair_ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, required=True)
+    tags = serializers.ListField(child=serializers.CharField(max_length=50), min_length=1, required=True) # Tag names, created when missing
+
+class AgentContrastPairBatchTagSerializer(serializers.Serializer):
+    assignments = AgentContrastPairTagAssignmentSerializer(many=True, required=True)
+
 class AgentContrastPairUpdateInputSerializer(serializers.Serializer):
     id = serializers.IntegerField(required=True)
     item1 = serializers.CharField(max_length=100, required=False)
     item2 = serializers.CharField(max_length=100, required=False)
     vector_embedding = serializers.CharField(required=False, allow_null=True, allow_blank=True) # Added allow_blank=True
+    embedding_dtype = serializers.ChoiceField(choices=list(EMBEDDING_STORAGE_DTYPES), required=False) # Store vector_embedding quantized to this dtype
+    embedding_model = serializers.CharField(max_length=255, required=False) # Model tag written into the embedding header
 
     def validate(self, data):
         if 'item1' not in data and 'item2' not in data and 'vector_embedding' not in data:
             raise serializers.ValidationError("At least one field ('item1', 'item2', or 'vector_embedding') must be provided for update.")
-        # Basic validation for vector_embedding if needed (e.g., base64 format) could go here
-        # Validate base64 format if provided and not empty string
-        vector_embedding_str = data.get('vector_embedding')
-        if vector_embedding_str is not None and vector_embedding_str != "":
-            try:
-                base64.b64decode(vector_embedding_str)
-            except (TypeError, base64.binascii.Error):
-                raise serializers.ValidationError({"vector_embedding": "Invalid base64 format."})        
-        return data
+        return _validate_vector_embedding(data)
 
 class AgentContrastPairBatchUpdateSerializer(serializers.Serializer):
     updates = AgentContrastPairUpdateInputSerializer(many=True, required=True)
@@ -44,10 +98,10 @@ class AgentContrastPairBatchUpdateSerializer(serializers.Serializer):
 
 # --------------- News Serializer ------------------------
 
-class AgentNewsSerializer(serializers.ModelSerializer):
+class AgentNewsSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = CypherArenaPerplexityDeepResearch
-        fields = ['id', 'data_response', 'start_date', 'end_date', 'search_type', 'news_source']
+        fields = ['id', 'data_response', 'start_date', 'end_date', 'search_type', 'news_source', 'content']
         read_only_fields = fields # News is typically read-only via agent
 
 class AgentNewsInputSerializer(serializers.Serializer):
@@ -63,36 +117,60 @@ class AgentNewsBatchCreateSerializer(serializers.Serializer):
 
 # --------------- Topic Serializers -----------------------
 
-class AgentTematorSerializer(serializers.ModelSerializer):
+class AgentTematorSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Temator
-        fields = ['id', 'name', 'source', 'vector_embedding']
+        fields = ['id', 'name', 'source', 'created_at', 'updated_at', 'vector_embedding']
 
 class AgentTopicInputSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=511, required=True)
     source = serializers.CharField(max_length=100, required=False, default='agent')
+    vector_embedding = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    embedding_dtype = serializers.ChoiceField(choices=list(EMBEDDING_STORAGE_DTYPES), required=False)
+    embedding_model = serializers.CharField(max_length=255, required=False)
+
+    def validate(self, data):
+        return _validate_vector_embedding(data)
 
 class AgentTopicBatchCreateSerializer(serializers.Serializer):
     topics = AgentTopicInputSerializer(many=True, required=True)
+    dedupe_threshold = serializers.FloatField(min_value=0, max_value=1, required=False) # Skip topics whose embedding is at least this similar to an existing or earlier one
 
 class AgentTopicUpdateInputSerializer(serializers.Serializer):
     id = serializers.IntegerField(required=True)
     name = serializers.CharField(max_length=511, required=False)
     source = serializers.CharField(max_length=100, required=False)
     vector_embedding = serializers.CharField(required=False, allow_null=True, allow_blank=True) # Added allow_blank=True
+    embedding_dtype = serializers.ChoiceField(choices=list(EMBEDDING_STORAGE_DTYPES), required=False) # Store vector_embedding quantized to this dtype
+    embedding_model = serializers.CharField(max_length=255, required=False) # Model tag written into the embedding header
 
     def validate(self, data):
         if 'name' not in data and 'source' not in data and 'vector_embedding' not in data:
             raise serializers.ValidationError("At least one field ('name', 'source', or 'vector_embedding') must be provided for update.")
-        # Basic validation for vector_embedding if needed (e.g., base64 format) could go here
-        # Validate base64 format if provided and not empty string
+        return _validate_vector_embedding(data)
+
+class AgentTopicBatchUpdateSerializer(serializers.Serializer):
+    updates = AgentTopicUpdateInputSerializer(many=True, required=True)
+
+
+# --------------- Similarity Search Serializers -----------
+
+class AgentSimilarQuerySerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    vector_embedding = serializers.CharField(required=False) # base64 of little-endian float32 values
+
+    def validate(self, data):
+        if ('id' in data) == ('vector_embedding' in data):
+            raise serializers.ValidationError("Provide exactly one of 'id' or 'vector_embedding'.")
         vector_embedding_str = data.get('vector_embedding')
-        if vector_embedding_str is not None and vector_embedding_str != "":
+        if vector_embedding_str is not None:
             try:
-                base64.b64decode(vector_embedding_str)
+                data['vector_embedding'] = base64.b64decode(vector_embedding_str, validate=True)
             except (TypeError, base64.binascii.Error):
-                raise serializers.ValidationError({"vector_embedding": "Invalid base64 format."})        
+                raise serializers.ValidationError({"vector_embedding": "Invalid base64 format."})
         return data
 
-class AgentTopicBatchUpdateSerializer(serializers.Serializer):
-    updates = AgentTopicUpdateInputSerializer(many=True, required=True)
+class AgentSimilarBatchSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=['topic', 'pair'], required=True)
+    k = serializers.IntegerField(min_value=1, max_value=100, required=False, default=10)
+    queries = AgentSimilarQuerySerializer(many=True, required=True)
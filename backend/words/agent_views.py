@@ -1,54 +1,224 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
 from django.db import transaction
+from django.conf import settings
+from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from .models import ContrastPair, Temator, CypherArenaPerplexityDeepResearch, ContrastPairRating
-from .serializers import ContrastPairSerializer # Re-use for GET response
+from .serializers import ContrastPairSerializer, rating_ids_prefetch # Re-use for GET response
 from .agent_serializers import (
     AgentContrastPairBatchCreateSerializer,
     AgentContrastPairBatchRatingSerializer,
+    AgentContrastPairBatchTagSerializer,
     AgentNewsSerializer,
     AgentTematorSerializer,
     AgentTopicBatchCreateSerializer,
     AgentTopicBatchUpdateSerializer,
     AgentContrastPairBatchUpdateSerializer,
     AgentNewsInputSerializer,
-    AgentNewsBatchCreateSerializer
+    AgentNewsBatchCreateSerializer,
+    AgentSimilarBatchSerializer,
 )
+from .pagination import CustomPagination, KeysetPagination, requested_ordering, wants_cursor_pagination
+from core.ordering import SHUFFLE_KEY, shuffle_by_seed
 from .permissions import AgentTokenPermission
-import hashlib
-from django_user_agents.utils import get_user_agent
-from collections import OrderedDict # Import OrderedDict
+from .change_log import CHANGE_MODELS, ChangeTokenExpired, changes_since, get_head_token, record_changes, record_created
+from .embedding_index import get_embedding_index, record_embedding_changes
+from .embeddings import decode_embedding, find_near_duplicates, is_usable_embedding
+from .export import (
+    EMBEDDING_EXPORT_KINDS,
+    EXPORT_KINDS,
+    NDJSON_EXPORTERS,
+    embedding_export_dimension,
+    export_embeddings,
+)
+from .news_search import search_news
+from .rating_aggregates import bulk_upsert_ratings
+from .tag_index import bulk_tag_pairs, filter_by_tags, parse_tag_filter
+from .utils import chunked
+from core.middleware import get_user_fingerprint
 import base64 # Added for vector embedding handling
 
 
-# Helper function for fingerprinting (copied from views.py)
-def _get_user_fingerprint(request):
-    user_agent = get_user_agent(request)
-    ip_address = request.META.get('REMOTE_ADDR', '')
-    fingerprint_string = f"{user_agent.browser.family}-{user_agent.browser.version_string}-{user_agent.os.family}-{user_agent.os.version_string}-{ip_address}"
-    fingerprint_hash = hashlib.sha256(fingerprint_string.encode('utf-8')).hexdigest()
-    return fingerprint_hash
-
-class CustomPagination(PageNumberPagination):
-    page_size = 10
-    page_size_query_param = 'count' # Items per page
-    max_page_size = 5000 # Increased max page size as requested (using the higher value for now)
-
-    def get_paginated_response(self, data):
-        return Response(OrderedDict([
-            ('total', self.page.paginator.count), # Total items across all pages
-            ('page', self.page.number), # Current page number
-            ('count', self.get_page_size(self.request)), # Items on the current page
-            ('next', self.get_next_link()),
-            ('previous', self.get_previous_link()),
-            ('results', data)
-        ]))
+def _bulk_apply_updates(model, updates_data, label):
+    """
+    Apply agent batch PATCH updates with one in_bulk per chunk and bulk_update
+    writes limited to the fields each row actually touched.
+    Returns (updated_ids, errors) with the same messages as per-row updates.
+    """
+    batch_size = settings.AGENT_BULK_BATCH_SIZE
+    errors = []
+    updated_ids = []
+    objects = {}
+    for chunk in chunked({update_data['id'] for update_data in updates_data}, batch_size):
+        objects.update(model.objects.in_bulk(chunk))
+
+    def field_changes(obj, update_data):
+        # Explicitly pop id, handle embedding separately
+        changes = {k: v for k, v in update_data.items() if k not in ['id', 'vector_embedding']}
+        if isinstance(obj, ContrastPair) and ('item1' in changes or 'item2' in changes):
+            changes['pair_key'] = ContrastPair.make_pair_key(
+                changes.get('item1', obj.item1), changes.get('item2', obj.item2)
+            )
+        return changes
+
+    unique_fields = [field.name for field in model._meta.concrete_fields if field.unique and not field.primary_key]
+    auto_now_fields = [field.name for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+    # Values of unique fields requested in this batch, checked against the DB in one query per field
+    requested = {field_name: set() for field_name in unique_fields}
+    for update_data in updates_data:
+        obj = objects.get(update_data['id'])
+        if obj is not None:
+            for field_name, value in field_changes(obj, update_data).items():
+                if field_name in requested:
+                    requested[field_name].add(value)
+    taken_values = {}
+    for field_name in unique_fields:
+        taken_values[field_name] = {}
+        for chunk in chunked(requested[field_name], batch_size):
+            taken_values[field_name].update(
+                model.objects.filter(**{f'{field_name}__in': chunk}).values_list(field_name, 'pk')
+            )
+
+    touched_fields = {}  # pk -> set of changed field names
+    for update_data in updates_data:
+        obj_id = update_data['id']
+        obj = objects.get(obj_id)
+        if obj is None:
+            errors.append(f"{model.__name__} with id {obj_id} does not exist.")
+            continue
+        update_fields = field_changes(obj, update_data)
+        vector_embedding_str = update_data.get('vector_embedding')
+
+        conflict = next((
+            field_name for field_name in unique_fields
+            if field_name in update_fields and taken_values[field_name].get(update_fields[field_name], obj_id) != obj_id
+        ), None)
+        if conflict:
+            if conflict == 'pair_key':
+                conflict = 'pair'
+                value = f"{update_fields.get('item1', obj.item1)} vs {update_fields.get('item2', obj.item2)}"
+            else:
+                value = update_fields[conflict]
+            errors.append(f"Error updating {label} {obj_id}: {conflict} '{value}' already exists.")
+            continue
+
+        # Handle vector embedding update (decode from base64 if provided)
+        if vector_embedding_str is not None:
+            try:
+                # Handle empty string case for nulling the field
+                embedding = None if vector_embedding_str == "" else base64.b64decode(vector_embedding_str)
+            except (TypeError, base64.binascii.Error) as decode_error:
+                errors.append(f"Error decoding vector_embedding for {label} {obj_id}: {decode_error}")
+                continue # Skip this row if embedding is invalid
+            obj.vector_embedding = embedding
+            update_fields['vector_embedding'] = embedding
+
+        for field, value in update_fields.items():
+            if field in taken_values:
+                # The row releases its old value and claims the new one
+                if taken_values[field].get(getattr(obj, field)) == obj_id:
+                    del taken_values[field][getattr(obj, field)]
+                taken_values[field][value] = obj_id
+            setattr(obj, field, value)
+        touched_fields.setdefault(obj_id, set()).update(update_fields)
+        updated_ids.append(obj_id)
+
+    # Group rows by the exact set of fields they changed so untouched columns are never rewritten
+    groups = {}
+    now = timezone.now()
+    for obj_id, fields in touched_fields.items():
+        obj = objects[obj_id]
+        for field_name in auto_now_fields:
+            setattr(obj, field_name, now)
+        groups.setdefault(frozenset(fields) | frozenset(auto_now_fields), []).append(obj)
+    with transaction.atomic():
+        for fields, objs in groups.items():
+            model.objects.bulk_update(objs, sorted(fields), batch_size=batch_size)
+        record_changes(model, list(touched_fields), 'update')
+    # bulk_update sends no signals, so publish embedding changes to the similarity search here
+    record_embedding_changes(model, {
+        obj_id: objects[obj_id].vector_embedding
+        for obj_id, fields in touched_fields.items() if 'vector_embedding' in fields
+    })
+    return updated_ids, errors
+
+def _input_embedding(item_data):
+    """Decoded vector_embedding of a batch create item (validated by its serializer), or None."""
+    vector_embedding_str = item_data.get('vector_embedding')
+    return base64.b64decode(vector_embedding_str) if vector_embedding_str else None
+
+def _find_near_duplicates(kind, embeddings, threshold):
+    """
+    Semantic duplicate check of a batch create (see embeddings.find_near_duplicates).
+    Items without a usable (finite) embedding, or with one of another dimension, are not checked.
+    Searches the shared index, which every worker refreshes when another one writes embeddings.
+    """
+    matches = [None] * len(embeddings)
+    if threshold is None:
+        return matches
+    searcher = get_embedding_index(kind)
+    vectors = [decode_embedding(blob) if blob else None for blob in embeddings]
+    vectors = [vector if is_usable_embedding(vector) else None for vector in vectors]
+    dimension = searcher.dimension if len(searcher) else next((len(vector) for vector in vectors if vector is not None), 0)
+    vectors = [vector if vector is not None and len(vector) == dimension else None for vector in vectors]
+    return find_near_duplicates(searcher, vectors, threshold)
+
+def _skipped_near_duplicates(matches, created_by_position):
+    skipped = []
+    for position, match in enumerate(matches):
+        if match is None:
+            continue
+        source, target, score = match
+        duplicate_of = target if source == 'id' else created_by_position[target].id
+        skipped.append({
+            "index": position,
+            "duplicate_of": duplicate_of,
+            "score": round(score, 6),
+            "reason": f"near-duplicate of id {duplicate_of}",
+        })
+    return skipped
+
+def _record_created_embeddings(model, created_by_position, embeddings):
+    # bulk_create sends no signals; rows that already existed keep their own embedding
+    record_embedding_changes(model, {
+        obj.id: obj.vector_embedding
+        for position, obj in created_by_position.items()
+        if embeddings[position] is not None and obj.vector_embedding is not None
+        and bytes(obj.vector_embedding) == embeddings[position]
+    })
+
+def _requested_fields(request, serializer_class, include_embedding, default_fields=None):
+    """
+    Fields to return from an agent list endpoint: the comma separated `fields`
+    query param, or default_fields (every serializer field by default), without
+    vector_embedding unless include_embedding. Returns (fields, error message).
+    """
+    available = list(serializer_class.Meta.fields)
+    requested = request.query_params.get('fields')
+    if requested is None:
+        defaults = available if default_fields is None else default_fields
+        return [field for field in defaults if include_embedding or field != 'vector_embedding'], None
+    fields = [field.strip() for field in requested.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown or not fields:
+        return None, f"Unknown fields: {', '.join(unknown) or '(none given)'}. Available fields: {', '.join(available)}."
+    return fields, None
+
+def _project_queryset(queryset, fields, extra_columns=()):
+    """Select only the columns behind fields and prefetch the requested relations (one query each)."""
+    concrete = {field.name for field in queryset.model._meta.concrete_fields}
+    queryset = queryset.only('id', *[field for field in [*extra_columns, *fields] if field in concrete])
+    if 'tags' in fields:
+        queryset = queryset.prefetch_related('tags')
+    if 'ratings' in fields:
+        queryset = queryset.prefetch_related(rating_ids_prefetch())
+    return queryset
 
 # ----------------------
 # Agent: Contrast Pairs
@@ -65,13 +235,31 @@ class AgentContrastPairListCreateAPIView(APIView):
         - `page`: Page number
         - `count`: Items per page (max 2000)
         - `random`: Return results in random order (boolean)
+        - `seed`: With `random`, a stable shuffle per seed so pages don't repeat or miss items
         - `vector_embedding`: Include vector embedding in results (boolean)
+        - `fields`: Comma separated fields to return, e.g. `id,item1,item2` (overrides `vector_embedding`)
+        - `pagination=cursor`: Keyset pagination by creation time; follow `next` / `cursor`, add `total=true` for a count
+        - `order`: `desc` (newest first, default) or `asc`; crawl with `asc` to also get pairs created during the crawl
+        - `rated`: Only rated (true) or only unrated (false) pairs (boolean, optional)
+        - `min_avg_rating` / `max_avg_rating`: Filter by average rating (number, optional)
+        - `tags`: Comma separated tag names; only pairs with any of them (optional)
+        - `tag_match`: `all` to require every tag of `tags` instead of any (default `any`)
         """,
         manual_parameters=[
             openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
             openapi.Parameter('count', openapi.IN_QUERY, description="Items per page (max 2000)", type=openapi.TYPE_INTEGER),
             openapi.Parameter('random', openapi.IN_QUERY, description="Return in random order", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('seed', openapi.IN_QUERY, description="Seed of a stable random order", type=openapi.TYPE_STRING),
             openapi.Parameter('vector_embedding', openapi.IN_QUERY, description="Include vector embedding", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING),
+            openapi.Parameter('pagination', openapi.IN_QUERY, description="'cursor' for keyset pagination", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor of the next page", type=openapi.TYPE_STRING),
+            openapi.Parameter('order', openapi.IN_QUERY, description="'desc' (newest first, default) or 'asc' by creation time", type=openapi.TYPE_STRING),
+            openapi.Parameter('rated', openapi.IN_QUERY, description="Only rated (true) or unrated (false) pairs", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('min_avg_rating', openapi.IN_QUERY, description="Minimum average rating", type=openapi.TYPE_NUMBER),
+            openapi.Parameter('max_avg_rating', openapi.IN_QUERY, description="Maximum average rating", type=openapi.TYPE_NUMBER),
+            openapi.Parameter('tags', openapi.IN_QUERY, description="Comma separated tag names", type=openapi.TYPE_STRING),
+            openapi.Parameter('tag_match', openapi.IN_QUERY, description="'any' (default) or 'all' of the tags", type=openapi.TYPE_STRING),
         ],
         responses={200: ContrastPairSerializer(many=True)}
     )
@@ -80,13 +268,61 @@ class AgentContrastPairListCreateAPIView(APIView):
         # Get query params
         random_order = request.query_params.get('random', 'false').lower() == 'true'
         include_embedding = request.query_params.get('vector_embedding', 'false').lower() == 'true'
+        fields, error = _requested_fields(request, ContrastPairSerializer, include_embedding)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            ordering = requested_ordering(request, ('created_at', 'id'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        seed = request.query_params.get('seed')
+        keyset = None
+        if wants_cursor_pagination(request):
+            if random_order and seed is None:
+                return Response({"error": "random=true needs a seed to be combined with cursor pagination."}, status=status.HTTP_400_BAD_REQUEST)
+            keyset = KeysetPagination(ordering=(SHUFFLE_KEY, 'id') if random_order else ordering, max_page_size=2000)
 
-        queryset = ContrastPair.objects.all()
+        # Unrequested columns (notably vector_embedding) are never selected
+        queryset = _project_queryset(ContrastPair.objects.all(), fields, extra_columns=keyset.columns if keyset else ())
+
+        # Rating filters use the denormalized aggregate columns (no join on ratings)
+        rated = request.query_params.get('rated')
+        if rated is not None:
+            if rated.lower() == 'true':
+                queryset = queryset.filter(rating_count__gt=0)
+            else:
+                queryset = queryset.filter(rating_count=0)
+        try:
+            min_avg_rating = request.query_params.get('min_avg_rating')
+            if min_avg_rating is not None:
+                queryset = queryset.filter(avg_rating__gte=float(min_avg_rating))
+            max_avg_rating = request.query_params.get('max_avg_rating')
+            if max_avg_rating is not None:
+                queryset = queryset.filter(avg_rating__lte=float(max_avg_rating))
+        except ValueError:
+            return Response({"error": "min_avg_rating and max_avg_rating must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tag_names, tag_match = parse_tag_filter(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = filter_by_tags(queryset, tag_names, tag_match)
+
+        serializer_context = {'request': request}
+        if random_order and seed is not None:
+            # One stable shuffle per seed: pages partition it instead of reshuffling the table each time
+            queryset = shuffle_by_seed(queryset, seed)
+        if keyset is not None:
+            page = keyset.paginate_queryset(queryset, request, view=self)
+            serializer = ContrastPairSerializer(page, many=True, context=serializer_context, fields=fields)
+            return keyset.get_paginated_response(serializer.data)
 
         if random_order:
-            queryset = queryset.order_by('?')
+            if seed is None:
+                queryset = queryset.order_by('?')
         else:
-            queryset = queryset.order_by('-created_at')
+            queryset = queryset.order_by(*ordering)
 
         # Adjust max_page_size specifically for this view if needed, otherwise use global CustomPagination
         self.pagination_class.max_page_size = 2000 # Specific max for this endpoint
@@ -94,27 +330,20 @@ class AgentContrastPairListCreateAPIView(APIView):
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request, view=self)
 
-        serializer_context = {'request': request}
         if page is not None:
-            serializer = ContrastPairSerializer(page, many=True, context=serializer_context)
-            data = serializer.data
-            # Conditionally remove embedding if not requested
-            if not include_embedding:
-                for item in data:
-                    item.pop('vector_embedding', None)
-            return paginator.get_paginated_response(data)
-
-        serializer = ContrastPairSerializer(queryset, many=True, context=serializer_context)
-        data = serializer.data
-        # Conditionally remove embedding if not requested
-        if not include_embedding:
-            for item in data:
-                item.pop('vector_embedding', None)
-        return Response(data)
+            serializer = ContrastPairSerializer(page, many=True, context=serializer_context, fields=fields)
+            return paginator.get_paginated_response(serializer.data)
+
+        serializer = ContrastPairSerializer(queryset, many=True, context=serializer_context, fields=fields)
+        return Response(serializer.data)
 
     @swagger_auto_schema(
         operation_summary="Batch create contrast pairs",
-        operation_description="Create multiple contrast pairs in a single request.",
+        operation_description="""
+        Create multiple contrast pairs in a single request. Pairs may carry a base64 `vector_embedding`.
+        With `dedupe_threshold` (cosine similarity, 0-1) pairs whose embedding is that similar to an existing pair
+        or an earlier pair of the batch are not created; the response is then `{"results": [...], "skipped": [...]}`.
+        """,
         request_body=AgentContrastPairBatchCreateSerializer,
         responses={201: ContrastPairSerializer(many=True), 400: 'Bad Request'}
     )
@@ -123,14 +352,42 @@ class AgentContrastPairListCreateAPIView(APIView):
         serializer = AgentContrastPairBatchCreateSerializer(data=request.data)
         if serializer.is_valid():
             pairs_data = serializer.validated_data['pairs']
-            created_pairs = []
+            dedupe_threshold = serializer.validated_data.get('dedupe_threshold')
             try:
+                batch_size = settings.AGENT_BULK_BATCH_SIZE
+                embeddings = [_input_embedding(pair_data) for pair_data in pairs_data]
+                matches = _find_near_duplicates('pair', embeddings, dedupe_threshold)
+                kept = [position for position, match in enumerate(matches) if match is None]
+                keys = {
+                    position: ContrastPair.make_pair_key(pairs_data[position]['item1'], pairs_data[position]['item2'])
+                    for position in kept
+                }
+                started = timezone.now()
                 with transaction.atomic():
-                    for pair_data in pairs_data:
-                        pair = ContrastPair.objects.create(**pair_data)
-                        created_pairs.append(pair)
-                response_serializer = ContrastPairSerializer(created_pairs, many=True)
-                return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+                    # Pairs that already exist (same normalized key) are skipped by the unique constraint
+                    ContrastPair.objects.bulk_create(
+                        [ContrastPair(item1=pairs_data[position]['item1'], item2=pairs_data[position]['item2'],
+                                      pair_key=keys[position], vector_embedding=embeddings[position])
+                         for position in kept],
+                        batch_size=batch_size,
+                        ignore_conflicts=True,
+                    )
+                pairs_by_key = {}
+                for chunk in chunked(set(keys.values()), batch_size):
+                    pairs_by_key.update(
+                        (pair.pair_key, pair)
+                        for pair in ContrastPair.objects.filter(pair_key__in=chunk).prefetch_related('tags', rating_ids_prefetch())
+                    )
+                created_pairs = {position: pairs_by_key[keys[position]] for position in kept}
+                record_created(ContrastPair, created_pairs.values(), started)
+                _record_created_embeddings(ContrastPair, created_pairs, embeddings)
+                response_serializer = ContrastPairSerializer(list(created_pairs.values()), many=True)
+                if dedupe_threshold is None:
+                    return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+                return Response({
+                    "results": response_serializer.data,
+                    "skipped": _skipped_near_duplicates(matches, created_pairs),
+                }, status=status.HTTP_201_CREATED)
             except Exception as e: # Catch potential integrity errors etc.
                  return Response({"error": f"Failed to create pairs: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -148,27 +405,29 @@ class AgentContrastPairBatchRateAPIView(APIView):
         serializer = AgentContrastPairBatchRatingSerializer(data=request.data)
         if serializer.is_valid():
             ratings_data = serializer.validated_data['ratings']
-            user_fingerprint = _get_user_fingerprint(request) # Generate fingerprint
+            user_fingerprint = get_user_fingerprint(request)
             updated_count = 0
             errors = []
 
             try:
-                with transaction.atomic():
-                    for rating_data in ratings_data:
-                        pair_id = rating_data['pair_id']
-                        rating_value = rating_data['rating']
-                        try:
-                            pair = ContrastPair.objects.get(pk=pair_id)
-                            ContrastPairRating.objects.update_or_create(
-                                contrast_pair=pair,
-                                user_fingerprint=user_fingerprint,
-                                defaults={'rating': rating_value}
-                            )
-                            updated_count += 1
-                        except ContrastPair.DoesNotExist:
-                            errors.append(f"ContrastPair with id {pair_id} does not exist.")
-                        except Exception as e:
-                            errors.append(f"Error rating pair {pair_id}: {str(e)}")
+                # One existence check per chunk instead of one query per rating
+                requested_ids = {rating_data['pair_id'] for rating_data in ratings_data}
+                existing_ids = set()
+                for chunk in chunked(requested_ids, settings.AGENT_BULK_BATCH_SIZE):
+                    existing_ids.update(ContrastPair.objects.filter(id__in=chunk).values_list('id', flat=True))
+
+                # Later ratings of the same pair win, as with sequential updates
+                latest_ratings = {}
+                for rating_data in ratings_data:
+                    pair_id = rating_data['pair_id']
+                    if pair_id not in existing_ids:
+                        errors.append(f"ContrastPair with id {pair_id} does not exist.")
+                        continue
+                    latest_ratings[pair_id] = rating_data['rating']
+                    updated_count += 1
+
+                if latest_ratings:
+                    bulk_upsert_ratings(user_fingerprint, latest_ratings, batch_size=settings.AGENT_BULK_BATCH_SIZE)
 
                 if errors:
                     # If any errors occurred, even if some succeeded, return 400
@@ -180,10 +439,55 @@ class AgentContrastPairBatchRateAPIView(APIView):
                  return Response({"error": f"Failed to rate pairs: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class AgentContrastPairBatchTagAPIView(APIView):
+    permission_classes = [AgentTokenPermission]
+    @swagger_auto_schema(
+        operation_summary="Batch tag contrast pairs",
+        operation_description="""
+        Attach tags to many contrast pairs in one transaction. Each assignment attaches all of its
+        `tags` (names, created when missing) to all of its `pair_ids`; links that already exist are kept.
+        """,
+        request_body=AgentContrastPairBatchTagSerializer,
+        responses={200: 'OK', 400: 'Bad Request'}
+    )
+    def post(self, request):
+        """Batch tag contrast pairs."""
+        serializer = AgentContrastPairBatchTagSerializer(data=request.data)
+        if serializer.is_valid():
+            assignments = serializer.validated_data['assignments']
+            errors = []
+            try:
+                batch_size = settings.AGENT_BULK_BATCH_SIZE
+                requested_ids = {pair_id for assignment in assignments for pair_id in assignment['pair_ids']}
+                existing_ids = set()
+                for chunk in chunked(requested_ids, batch_size):
+                    existing_ids.update(ContrastPair.objects.filter(id__in=chunk).values_list('id', flat=True))
+                errors = [f"ContrastPair with id {pair_id} does not exist." for pair_id in sorted(requested_ids - existing_ids)]
+
+                tags_by_pair = {}
+                for assignment in assignments:
+                    names = {name.strip() for name in assignment['tags'] if name.strip()}
+                    for pair_id in assignment['pair_ids']:
+                        if pair_id in existing_ids:
+                            tags_by_pair.setdefault(pair_id, set()).update(names)
+                tagged_count, created_tags = bulk_tag_pairs(tags_by_pair, batch_size=batch_size)
+
+                result = {"tagged_count": tagged_count, "created_tags": created_tags}
+                if errors:
+                    return Response({"errors": errors, **result}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"status": "batch tagging successful", **result}, status=status.HTTP_200_OK)
+            except Exception as e:
+                return Response({"error": f"Failed to tag pairs: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
 # -----------
 # Agent News
 # -----------
 
+# Default response of the news list (content is only returned on request) and of ?summary=true
+NEWS_DEFAULT_FIELDS = ['id', 'data_response', 'start_date', 'end_date', 'search_type', 'news_source']
+NEWS_SUMMARY_FIELDS = ['id', 'start_date', 'end_date', 'news_source', 'content']
+
 class AgentNewsListAPIView(APIView):
     permission_classes = [AgentTokenPermission]
     @swagger_auto_schema(
@@ -194,11 +498,20 @@ class AgentNewsListAPIView(APIView):
         - `end_time`: End datetime (ISO8601)
         - `news_type`: News category (e.g., general_news, polish_showbiznes, sport, tech, science, politics)
         If start_time and end_time are not provided, returns all news ordered by latest start_date.
+        - `pagination=cursor`: Return pages (`count`, max 500) instead of everything; follow `next` / `cursor`
+        - `order`: `desc` (latest start_date first, default) or `asc`; crawl with `asc` to also get windows added during the crawl
+        - `summary`: Return only `id`, `start_date`, `end_date`, `news_source` and `content` (the assistant message text) without the raw `data_response` (boolean)
+        - `fields`: Comma separated fields to return, e.g. `id,start_date,content` (overrides `summary`)
         """,
         manual_parameters=[
             openapi.Parameter('start_time', openapi.IN_QUERY, description="Start datetime (ISO8601, optional)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, required=False),
             openapi.Parameter('end_time', openapi.IN_QUERY, description="End datetime (ISO8601, optional)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, required=False),
             openapi.Parameter('news_type', openapi.IN_QUERY, description="News category (optional)", type=openapi.TYPE_STRING),
+            openapi.Parameter('pagination', openapi.IN_QUERY, description="'cursor' for keyset pagination", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor of the next page", type=openapi.TYPE_STRING),
+            openapi.Parameter('order', openapi.IN_QUERY, description="'desc' (latest first, default) or 'asc' by start_date", type=openapi.TYPE_STRING),
+            openapi.Parameter('summary', openapi.IN_QUERY, description="Only ids, dates, source and extracted content", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING),
         ],
         responses={200: AgentNewsSerializer(many=True), 400: 'Bad Request'}
     )
@@ -207,8 +520,21 @@ class AgentNewsListAPIView(APIView):
         start_time_str = request.query_params.get('start_time')
         end_time_str = request.query_params.get('end_time')
         news_type = request.query_params.get('news_type')
+        summary = request.query_params.get('summary', 'false').lower() == 'true'
+        fields, error = _requested_fields(request, AgentNewsSerializer, include_embedding=False,
+                                          default_fields=NEWS_SUMMARY_FIELDS if summary else NEWS_DEFAULT_FIELDS)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = CypherArenaPerplexityDeepResearch.objects.all().order_by('-start_date')
+        try:
+            ordering = requested_ordering(request, ('start_date', 'id'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        keyset = KeysetPagination(ordering=ordering, max_page_size=500) if wants_cursor_pagination(request) else None
+        # data_response is only loaded when it is returned
+        queryset = _project_queryset(CypherArenaPerplexityDeepResearch.objects.all(), fields,
+                                     extra_columns=keyset.columns if keyset else ()).order_by(*ordering)
 
         # Filter by date only if both start and end times are provided
         if start_time_str and end_time_str:
@@ -232,7 +558,11 @@ class AgentNewsListAPIView(APIView):
         if news_type:
             queryset = queryset.filter(news_source=news_type)
 
-        serializer = AgentNewsSerializer(queryset, many=True)
+        if keyset is not None:
+            page = keyset.paginate_queryset(queryset, request, view=self)
+            return keyset.get_paginated_response(AgentNewsSerializer(page, many=True, fields=fields).data)
+
+        serializer = AgentNewsSerializer(queryset, many=True, fields=fields)
         return Response(serializer.data)
 
     @swagger_auto_schema(
@@ -252,12 +582,60 @@ class AgentNewsListAPIView(APIView):
                     for item_data in news_data:
                         news_item = CypherArenaPerplexityDeepResearch.objects.create(**item_data)
                         created_news.append(news_item)
-                response_serializer = AgentNewsSerializer(created_news, many=True)
+                response_serializer = AgentNewsSerializer(created_news, many=True, fields=NEWS_DEFAULT_FIELDS)
                 return Response(response_serializer.data, status=status.HTTP_201_CREATED)
             except Exception as e:
                  return Response({"error": f"Failed to create news items: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class AgentNewsSearchAPIView(APIView):
+    """Ranked full-text search over the news text (see news_search.py)."""
+    permission_classes = [AgentTokenPermission]
+    MAX_LIMIT = 100
+
+    @swagger_auto_schema(
+        operation_summary="Search news",
+        operation_description="""
+        Full-text search of the news content, best matches first. Every word of `q` must occur
+        (case and diacritics insensitive on SQLite).
+        - `q`: Search text, e.g. a rapper's name or an event
+        - `start_time` / `end_time`: Only news with start_date >= start_time / end_date <= end_time (ISO8601, optional)
+        - `news_type`: News category (optional)
+        - `limit`: Number of results (default 20, max 100)
+        Each result has `id`, `start_date`, `end_date`, `news_source`, `rank` and a `snippet` with the matches in [brackets].
+        """,
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Search text", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('start_time', openapi.IN_QUERY, description="Start datetime (ISO8601, optional)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+            openapi.Parameter('end_time', openapi.IN_QUERY, description="End datetime (ISO8601, optional)", type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+            openapi.Parameter('news_type', openapi.IN_QUERY, description="News category (optional)", type=openapi.TYPE_STRING),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Number of results (max 100)", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: 'OK', 400: 'Bad Request'}
+    )
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        if not query.strip():
+            return Response({"error": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+        except ValueError:
+            return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return Response({"error": f"limit must be between 1 and {self.MAX_LIMIT}."}, status=status.HTTP_400_BAD_REQUEST)
+        dates = {}
+        for name in ('start_time', 'end_time'):
+            value = request.query_params.get(name)
+            if value:
+                dates[name] = parse_datetime(value)
+                if dates[name] is None:
+                    return Response({"error": "Invalid datetime format. Please use ISO 8601 format (e.g., YYYY-MM-DDTHH:MM:SSZ)."}, status=status.HTTP_400_BAD_REQUEST)
+                if settings.USE_TZ and timezone.is_naive(dates[name]):
+                    dates[name] = timezone.make_aware(dates[name])
+
+        results = search_news(query, news_source=request.query_params.get('news_type'), limit=limit, **dates)
+        return Response({"query": query, "results": results}, status=status.HTTP_200_OK)
+
 # -------------
 # Agent Topics
 # -------------
@@ -274,13 +652,20 @@ class AgentTopicListCreateUpdateAPIView(APIView):
         - `count`: Items per page (max 5000)
         - `source`: Filter by topic source (optional)
         - `random`: Return results in random order (boolean)
+        - `seed`: With `random`, a stable shuffle per seed so pages don't repeat or miss items
         - `vector_embedding`: Include vector embedding in results (boolean)
+        - `fields`: Comma separated fields to return, e.g. `id,name` (overrides `vector_embedding`)
+        - `pagination=cursor`: Keyset pagination by name; follow `next` / `cursor`, add `total=true` for a count
         """,
         manual_parameters=[
             openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
             openapi.Parameter('count', openapi.IN_QUERY, description="Items per page (max 5000)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return", type=openapi.TYPE_STRING),
+            openapi.Parameter('pagination', openapi.IN_QUERY, description="'cursor' for keyset pagination", type=openapi.TYPE_STRING),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor of the next page", type=openapi.TYPE_STRING),
             openapi.Parameter('source', openapi.IN_QUERY, description="Topic source", type=openapi.TYPE_STRING),
             openapi.Parameter('random', openapi.IN_QUERY, description="Return in random order", type=openapi.TYPE_BOOLEAN),
+            openapi.Parameter('seed', openapi.IN_QUERY, description="Seed of a stable random order", type=openapi.TYPE_STRING),
             openapi.Parameter('vector_embedding', openapi.IN_QUERY, description="Include vector embedding", type=openapi.TYPE_BOOLEAN),
         ],
         responses={200: AgentTematorSerializer(many=True), 400: 'Bad Request'}
@@ -290,14 +675,34 @@ class AgentTopicListCreateUpdateAPIView(APIView):
         source = request.query_params.get('source')
         random_order = request.query_params.get('random', 'false').lower() == 'true'
         include_embedding = request.query_params.get('vector_embedding', 'true').lower() == 'true' # Default to true for topics
+        fields, error = _requested_fields(request, AgentTematorSerializer, include_embedding)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        seed = request.query_params.get('seed')
+        keyset = None
+        if wants_cursor_pagination(request):
+            if random_order and seed is None:
+                return Response({"error": "random=true needs a seed to be combined with cursor pagination."}, status=status.HTTP_400_BAD_REQUEST)
+            keyset = KeysetPagination(ordering=(SHUFFLE_KEY, 'id') if random_order else ('name', 'id'), max_page_size=5000)
 
-        queryset = Temator.objects.all()
+        queryset = _project_queryset(Temator.objects.all(), fields, extra_columns=keyset.columns if keyset else ())
 
         if source:
             queryset = queryset.filter(source=source)
 
+        serializer_context = {'request': request}
+        if random_order and seed is not None:
+            # One stable shuffle per seed: pages partition it instead of reshuffling the table each time
+            queryset = shuffle_by_seed(queryset, seed)
+        if keyset is not None:
+            page = keyset.paginate_queryset(queryset, request, view=self)
+            serializer = AgentTematorSerializer(page, many=True, context=serializer_context, fields=fields)
+            return keyset.get_paginated_response(serializer.data)
+
         if random_order:
-            queryset = queryset.order_by('?')
+            if seed is None:
+                queryset = queryset.order_by('?')
         else:
             queryset = queryset.order_by('name')
 
@@ -307,27 +712,20 @@ class AgentTopicListCreateUpdateAPIView(APIView):
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request, view=self)
 
-        serializer_context = {'request': request}
         if page is not None:
-            serializer = AgentTematorSerializer(page, many=True, context=serializer_context)
-            data = serializer.data
-            # Conditionally remove embedding if not requested
-            if not include_embedding:
-                for item in data:
-                    item.pop('vector_embedding', None)
-            return paginator.get_paginated_response(data)
-
-        serializer = AgentTematorSerializer(queryset, many=True, context=serializer_context)
-        data = serializer.data
-        # Conditionally remove embedding if not requested
-        if not include_embedding:
-            for item in data:
-                item.pop('vector_embedding', None)
-        return Response(data)
+            serializer = AgentTematorSerializer(page, many=True, context=serializer_context, fields=fields)
+            return paginator.get_paginated_response(serializer.data)
+
+        serializer = AgentTematorSerializer(queryset, many=True, context=serializer_context, fields=fields)
+        return Response(serializer.data)
 
     @swagger_auto_schema(
         operation_summary="Batch insert topics",
-        operation_description="Insert multiple topics in a single request.",
+        operation_description="""
+        Insert multiple topics in a single request. Topics may carry a base64 `vector_embedding`.
+        With `dedupe_threshold` (cosine similarity, 0-1) topics whose embedding is that similar to an existing topic
+        or an earlier topic of the batch are not created; the response is then `{"results": [...], "skipped": [...]}`.
+        """,
         request_body=AgentTopicBatchCreateSerializer,
         responses={201: AgentTematorSerializer(many=True), 400: 'Bad Request'}
     )
@@ -336,20 +734,39 @@ class AgentTopicListCreateUpdateAPIView(APIView):
         serializer = AgentTopicBatchCreateSerializer(data=request.data)
         if serializer.is_valid():
             topics_data = serializer.validated_data['topics']
-            created_topics = []
+            dedupe_threshold = serializer.validated_data.get('dedupe_threshold')
             try:
+                batch_size = settings.AGENT_BULK_BATCH_SIZE
+                embeddings = [_input_embedding(topic_data) for topic_data in topics_data]
+                matches = _find_near_duplicates('topic', embeddings, dedupe_threshold)
+                kept = [position for position, match in enumerate(matches) if match is None]
+                started = timezone.now()
                 with transaction.atomic():
-                    for topic_data in topics_data:
-                        # Use get_or_create to avoid duplicates based on name
-                        topic, created = Temator.objects.get_or_create(
-                            name=topic_data['name'],
-                            defaults={'source': topic_data.get('source', 'agent')} # Use provided source or default
-                        )
-                        # Only add newly created or existing ones to the response for clarity
-                        created_topics.append(topic)
-
-                response_serializer = AgentTematorSerializer(created_topics, many=True)
-                return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+                    # Existing names are skipped by the unique constraint (no per-row get_or_create)
+                    Temator.objects.bulk_create(
+                        [Temator(name=topics_data[position]['name'],
+                                 source=topics_data[position].get('source', 'agent'), # Use provided source or default
+                                 vector_embedding=embeddings[position])
+                         for position in kept],
+                        batch_size=batch_size,
+                        ignore_conflicts=True,
+                    )
+                names = {position: topics_data[position]['name'] for position in kept}
+                topics_by_name = {}
+                for chunk in chunked(set(names.values()), batch_size):
+                    topics_by_name.update((topic.name, topic) for topic in Temator.objects.filter(name__in=chunk))
+                # Return newly created or existing ones, in request order
+                created_topics = {position: topics_by_name[name] for position, name in names.items()}
+                record_created(Temator, created_topics.values(), started)
+                _record_created_embeddings(Temator, created_topics, embeddings)
+
+                response_serializer = AgentTematorSerializer(list(created_topics.values()), many=True)
+                if dedupe_threshold is None:
+                    return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+                return Response({
+                    "results": response_serializer.data,
+                    "skipped": _skipped_near_duplicates(matches, created_topics),
+                }, status=status.HTTP_201_CREATED)
             except Exception as e:
                  return Response({"error": f"Failed to create topics: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -365,43 +782,9 @@ class AgentTopicListCreateUpdateAPIView(APIView):
         serializer = AgentTopicBatchUpdateSerializer(data=request.data)
         if serializer.is_valid():
             updates_data = serializer.validated_data['updates']
-            updated_count = 0
-            errors = []
-            updated_ids = []
-
             try:
-                with transaction.atomic():
-                    for update_data in updates_data:
-                        topic_id = update_data['id']
-                        # Explicitly pop id, handle embedding separately
-                        update_fields = {k: v for k, v in update_data.items() if k not in ['id', 'vector_embedding']}
-                        vector_embedding_str = update_data.get('vector_embedding')
-
-                        try:
-                            topic = Temator.objects.get(pk=topic_id)
-                            # Update standard fields
-                            for field, value in update_fields.items():
-                                setattr(topic, field, value)
-
-                            # Handle vector embedding update (decode from base64 if provided)
-                            if vector_embedding_str is not None:
-                                try:
-                                    # Handle empty string case for nulling the field
-                                    if vector_embedding_str == "":
-                                        topic.vector_embedding = None
-                                    else:
-                                        topic.vector_embedding = base64.b64decode(vector_embedding_str)
-                                except (TypeError, base64.binascii.Error) as decode_error:
-                                    errors.append(f"Error decoding vector_embedding for topic {topic_id}: {decode_error}")
-                                    continue # Skip saving this topic if embedding is invalid
-
-                            topic.save()
-                            updated_count += 1
-                            updated_ids.append(topic_id)
-                        except Temator.DoesNotExist:
-                            errors.append(f"Temator with id {topic_id} does not exist.")
-                        except Exception as e:
-                            errors.append(f"Error updating topic {topic_id}: {str(e)}")
+                updated_ids, errors = _bulk_apply_updates(Temator, updates_data, 'topic')
+                updated_count = len(updated_ids)
 
                 if errors:
                     # If any errors occurred, return 400
@@ -429,43 +812,9 @@ class AgentContrastPairBatchUpdateAPIView(APIView):
         serializer = AgentContrastPairBatchUpdateSerializer(data=request.data)
         if serializer.is_valid():
             updates_data = serializer.validated_data['updates']
-            updated_count = 0
-            errors = []
-            updated_ids = []
-
             try:
-                with transaction.atomic():
-                    for update_data in updates_data:
-                        pair_id = update_data['id']
-                        # Explicitly pop id, handle embedding separately
-                        update_fields = {k: v for k, v in update_data.items() if k not in ['id', 'vector_embedding']}
-                        vector_embedding_str = update_data.get('vector_embedding')
-
-                        try:
-                            pair = ContrastPair.objects.get(pk=pair_id)
-                            # Update standard fields
-                            for field, value in update_fields.items():
-                                setattr(pair, field, value)
-
-                            # Handle vector embedding update (decode from base64 if provided)
-                            if vector_embedding_str is not None:
-                                try:
-                                    # Handle empty string case for nulling the field
-                                    if vector_embedding_str == "":
-                                        pair.vector_embedding = None
-                                    else:
-                                        pair.vector_embedding = base64.b64decode(vector_embedding_str)
-                                except (TypeError, base64.binascii.Error) as decode_error:
-                                    errors.append(f"Error decoding vector_embedding for pair {pair_id}: {decode_error}")
-                                    continue # Skip saving this pair if embedding is invalid
-
-                            pair.save()
-                            updated_count += 1
-                            updated_ids.append(pair_id)
-                        except ContrastPair.DoesNotExist:
-                            errors.append(f"ContrastPair with id {pair_id} does not exist.")
-                        except Exception as e:
-                            errors.append(f"Error updating pair {pair_id}: {str(e)}")
+                updated_ids, errors = _bulk_apply_updates(ContrastPair, updates_data, 'pair')
+                updated_count = len(updated_ids)
 
                 if errors:
                     # If any errors occurred, return 400
@@ -475,3 +824,221 @@ class AgentContrastPairBatchUpdateAPIView(APIView):
             except Exception as e:
                 return Response({"error": f"Failed to update pairs: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# --------------------
+# Agent: Similarity
+# --------------------
+
+class AgentSimilarAPIView(APIView):
+    """
+    Nearest topics or contrast pairs by cosine similarity of vector_embedding,
+    answered from the embedding index (see embedding_index.py).
+    """
+    permission_classes = [AgentTokenPermission]
+    MAX_K = 100
+
+    @staticmethod
+    def _describe(kind, ids):
+        if kind == 'topic':
+            return {row['id']: {'name': row['name']} for row in Temator.objects.filter(id__in=ids).values('id', 'name')}
+        return {
+            row['id']: {'item1': row['item1'], 'item2': row['item2']}
+            for row in ContrastPair.objects.filter(id__in=ids).values('id', 'item1', 'item2')
+        }
+
+    def _search(self, kind, queries, k):
+        """
+        Run all queries ({'id': ...} or {'vector_embedding': bytes}) with one
+        matrix product. Returns (results, errors); results has one list per query.
+        """
+        index = get_embedding_index(kind)
+        errors = []
+        vectors, exclude_ids, positions = [], [], []
+        for position, query in enumerate(queries):
+            if 'id' in query:
+                vector = index.vector_of(query['id'])
+                if vector is None:
+                    errors.append(f"{kind} {query['id']} does not exist or has no usable vector_embedding.")
+                    continue
+                vectors.append(vector)
+                exclude_ids.append(query['id'])
+            else:
+                vector = decode_embedding(query['vector_embedding'])
+                if vector is None or len(vector) != index.dimension:
+                    errors.append(f"Query {position}: vector_embedding must hold {index.dimension} float32 values.")
+                    continue
+                vectors.append(vector)
+                exclude_ids.append(None)
+            positions.append(position)
+
+        results = [None] * len(queries)
+        if vectors:
+            matches = index.search(vectors, k, exclude_ids=exclude_ids)
+            details = self._describe(kind, {obj_id for query_matches in matches for obj_id, _ in query_matches})
+            for position, query_matches in zip(positions, matches):
+                results[position] = [
+                    {'id': obj_id, 'score': round(score, 6), **details.get(obj_id, {})}
+                    for obj_id, score in query_matches
+                ]
+        return results, errors
+
+    @swagger_auto_schema(
+        operation_summary="Find similar topics or contrast pairs",
+        operation_description="""
+        Return the k items nearest to an existing item by cosine similarity of their embeddings.
+        - `kind`: `topic` or `pair`
+        - `id`: Id of the item to search around (it is excluded from the results)
+        - `k`: Number of results (default 10, max 100)
+        """,
+        manual_parameters=[
+            openapi.Parameter('kind', openapi.IN_QUERY, description="topic or pair", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('id', openapi.IN_QUERY, description="Item id", type=openapi.TYPE_INTEGER, required=True),
+            openapi.Parameter('k', openapi.IN_QUERY, description="Number of results (max 100)", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: 'OK', 400: 'Bad Request', 404: 'Not Found'}
+    )
+    def get(self, request):
+        """Nearest neighbours of one item."""
+        kind = request.query_params.get('kind')
+        if kind not in ('topic', 'pair'):
+            return Response({"error": "kind must be 'topic' or 'pair'."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            obj_id = int(request.query_params['id'])
+            k = int(request.query_params.get('k', 10))
+        except (KeyError, ValueError):
+            return Response({"error": "id is required and id and k must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= k <= self.MAX_K:
+            return Response({"error": f"k must be between 1 and {self.MAX_K}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results, errors = self._search(kind, [{'id': obj_id}], k)
+        if errors:
+            return Response({"error": errors[0]}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"kind": kind, "id": obj_id, "results": results[0]}, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(
+        operation_summary="Batch similarity search",
+        operation_description="Answer many queries at once. Each query is either an item `id` or a base64 `vector_embedding` (float32, same dimension as the stored embeddings).",
+        request_body=AgentSimilarBatchSerializer,
+        responses={200: 'OK', 400: 'Bad Request'}
+    )
+    def post(self, request):
+        """Nearest neighbours for a batch of ids and/or raw vectors."""
+        serializer = AgentSimilarBatchSerializer(data=request.data)
+        if serializer.is_valid():
+            kind = serializer.validated_data['kind']
+            results, errors = self._search(kind, serializer.validated_data['queries'], serializer.validated_data['k'])
+            if errors:
+                return Response({"errors": errors, "results": results}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"kind": kind, "results": results}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AgentExportAPIView(APIView):
+    """
+    Streaming bulk export of the corpus (see export.py). The body is produced
+    chunk by chunk while the rows are read, so memory stays flat and the whole
+    table comes out in one request instead of thousands of pages.
+    """
+    permission_classes = [AgentTokenPermission]
+    # ?format= is DRF's renderer override, hence ?output= for the export format
+
+    @swagger_auto_schema(
+        operation_summary="Export the corpus",
+        operation_description="""
+        Stream a whole table in one response.
+        - `kind`: `topics`, `pairs` (with rating aggregates and tag ids), `ratings` or `tags`
+        - `output`: `ndjson` (default, one JSON object per line) or `f32` (embeddings of `topics` or `pairs` only)
+        - `vector_embedding`: `true` to include base64 embeddings in ndjson (default false)
+
+        `f32` is a packed array of records, a little-endian int64 id followed by
+        `X-Embedding-Dimension` float32 values; embeddings of another dimension are skipped.
+        """,
+        manual_parameters=[
+            openapi.Parameter('kind', openapi.IN_QUERY, description="topics, pairs, ratings or tags", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('output', openapi.IN_QUERY, description="ndjson or f32", type=openapi.TYPE_STRING),
+            openapi.Parameter('vector_embedding', openapi.IN_QUERY, description="Include base64 embeddings in ndjson", type=openapi.TYPE_BOOLEAN),
+        ],
+        responses={200: 'OK', 400: 'Bad Request'}
+    )
+    def get(self, request):
+        kind = request.query_params.get('kind')
+        export_format = request.query_params.get('output', 'ndjson')
+        if kind not in EXPORT_KINDS:
+            return Response({"error": f"kind must be one of: {', '.join(EXPORT_KINDS)}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if export_format == 'ndjson':
+            include_embedding = request.query_params.get('vector_embedding', 'false').lower() == 'true'
+            response = StreamingHttpResponse(NDJSON_EXPORTERS[kind](include_embedding=include_embedding),
+                                             content_type='application/x-ndjson')
+            response['Content-Disposition'] = f'attachment; filename="{kind}.ndjson"'
+            return response
+
+        if export_format == 'f32':
+            if kind not in EMBEDDING_EXPORT_KINDS:
+                return Response({"error": "output f32 is only available for topics and pairs."}, status=status.HTTP_400_BAD_REQUEST)
+            dimension = embedding_export_dimension(kind)
+            response = StreamingHttpResponse(export_embeddings(kind, dimension) if dimension else iter(()),
+                                             content_type='application/octet-stream')
+            response['X-Embedding-Dimension'] = str(dimension)
+            response['Content-Disposition'] = f'attachment; filename="{kind}-embeddings.f32"'
+            return response
+
+        return Response({"error": "output must be 'ndjson' or 'f32'."}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AgentChangesAPIView(APIView):
+    """
+    Incremental sync: inserts, updates and deletes of topics, pairs, ratings
+    and tags after a token, in commit order (see change_log.py).
+    """
+    permission_classes = [AgentTokenPermission]
+    DEFAULT_LIMIT = 500
+    MAX_LIMIT = 5000
+
+    @swagger_auto_schema(
+        operation_summary="Change feed",
+        operation_description="""
+        Return the changes made after `since`, oldest first. Each change has the
+        `kind` (`topic`, `pair`, `rating` or `tag`), the row `id`, the `action`
+        (`insert`, `update` or `delete`) and, unless deleted, the current row `data`.
+        Several changes of one row within a page are merged into one.
+
+        Pass the returned `next` as `since` of the following request until `has_more` is false.
+        Without `since` only the current token is returned: take it before a full
+        export (`/words/agent/export/`) and follow the feed from there.
+        A token whose changes were already pruned gets 410 Gone; resync from an export.
+        - `since`: Token of the last change seen
+        - `limit`: Max number of log entries read (default 500, max 5000)
+        - `kinds`: Comma separated kinds to return (default all)
+        """,
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, description="Token of the last change seen", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('limit', openapi.IN_QUERY, description="Max log entries (max 5000)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('kinds', openapi.IN_QUERY, description="Comma separated: topic, pair, rating, tag", type=openapi.TYPE_STRING),
+        ],
+        responses={200: 'OK', 400: 'Bad Request', 410: 'Gone'}
+    )
+    def get(self, request):
+        if 'since' not in request.query_params:
+            return Response({"changes": [], "next": get_head_token(), "has_more": False}, status=status.HTTP_200_OK)
+        try:
+            since = int(request.query_params['since'])
+            limit = int(request.query_params.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"error": "since and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return Response({"error": f"limit must be between 1 and {self.MAX_LIMIT}."}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = None
+        if request.query_params.get('kinds'):
+            kinds = {kind.strip() for kind in request.query_params['kinds'].split(',')}
+            unknown = kinds - set(CHANGE_MODELS)
+            if unknown:
+                return Response({"error": f"Unknown kinds: {', '.join(sorted(unknown))}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            changes, next_token, has_more = changes_since(since, limit, kinds=kinds)
+        except ChangeTokenExpired:
+            return Response({"error": "Changes after this token were pruned; resync from /words/agent/export/."},
+                            status=status.HTTP_410_GONE)
+        return Response({"changes": changes, "next": next_token, "has_more": has_more}, status=status.HTTP_200_OK)
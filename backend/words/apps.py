@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class WordsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'words'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(create_news_search_index, sender=self)
+
+
+def create_news_search_index(using, **kwargs):
+    # Raw DDL the models don't describe (see news_search.py)
+    from .news_search import ensure_news_search_index
+    ensure_news_search_index(using)
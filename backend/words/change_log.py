@@ -0,0 +1,157 @@
+"""
+Change log behind the agent change feed (/words/agent/changes/).
+
+Every insert, update and delete of a topic, contrast pair, rating or tag
+appends a ChangeLogEntry: signals cover single-row saves and deletes (in the
+same transaction), the bulk paths (bulk_create / bulk_update, which send no
+signals) call record_changes / record_created themselves. An entry's id is
+the feed token, so a client that remembers its last token only reads what
+changed since.
+
+Entries younger than CHANGE_FEED_SETTLE_SECONDS are held back: ids are taken
+at insert time, so a transaction still open when a later id is handed out
+would otherwise be skipped (only transactions longer than the settle time
+can still be). Rating aggregate updates on pairs are not logged; they follow
+from the rating entries.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import DateTimeField, F, Value
+from django.utils import timezone
+
+from .export import PAIR_COLUMNS, RATING_COLUMNS, TAG_COLUMNS, TOPIC_COLUMNS, pair_tag_ids, row_dicts
+from .models import ChangeLogEntry, ContrastPair, ContrastPairRating, ContrastTag, Temator
+from .utils import chunked
+
+CHANGE_MODELS = {"topic": Temator, "pair": ContrastPair, "rating": ContrastPairRating, "tag": ContrastTag}
+CHANGE_KINDS = {model: kind for kind, model in CHANGE_MODELS.items()}
+CHANGE_COLUMNS = {"topic": TOPIC_COLUMNS, "pair": PAIR_COLUMNS, "rating": RATING_COLUMNS, "tag": TAG_COLUMNS}
+RECORD_BATCH_SIZE = 1000
+
+
+class ChangeTokenExpired(Exception):
+    """The entries after the token were pruned; the client has to resync from an export."""
+
+
+def record_changes(model, ids, action):
+    """Append one `action` entry per id of `model` (no-op for an empty ids)."""
+    kind = CHANGE_KINDS[model]
+    for chunk in chunked(ids, RECORD_BATCH_SIZE):
+        ChangeLogEntry.objects.bulk_create(
+            [ChangeLogEntry(kind=kind, object_id=obj_id, action=action) for obj_id in chunk]
+        )
+
+
+def record_query_changes(queryset, action):
+    """
+    Append one entry per row of `queryset` with a single INSERT ... SELECT,
+    for bulk writes whose ids are not at hand. `action` may be an expression.
+    """
+    model = queryset.model
+    if isinstance(action, str):
+        action = Value(action)
+    rows = queryset.order_by("id").annotate(
+        change_kind=Value(CHANGE_KINDS[model]),
+        change_object_id=F("id"),
+        change_action=action,
+        change_created_at=Value(timezone.now(), output_field=DateTimeField()),
+    ).values_list("change_kind", "change_object_id", "change_action", "change_created_at")
+    sql, params = rows.query.sql_with_params()
+    columns = ", ".join(
+        connection.ops.quote_name(ChangeLogEntry._meta.get_field(name).column)
+        for name in ("kind", "object_id", "action", "created_at")
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {connection.ops.quote_name(ChangeLogEntry._meta.db_table)} ({columns}) {sql}", params)
+
+
+def record_created(model, objs, since):
+    """
+    Log the rows a bulk_create(ignore_conflicts=True) really inserted: of the
+    refetched objs, those created at or after `since` (the others already existed).
+    """
+    record_changes(model, sorted({obj.id for obj in objs if obj.created_at is not None and obj.created_at >= since}), "insert")
+
+
+def get_head_token():
+    """Token of the latest entry; a client starting from a fresh export follows the feed from here."""
+    return ChangeLogEntry.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def _collapse(entries):
+    """One change per row: the latest action, except that an insert followed by updates stays an insert."""
+    changes = {}
+    for entry in entries:
+        key = (entry.kind, entry.object_id)
+        previous = changes.pop(key, None)
+        action = entry.action
+        if previous is not None and previous["action"] == "insert" and action == "update":
+            action = "insert"
+        # Re-inserted so that the dict order follows the latest entry of each row
+        changes[key] = {"token": entry.id, "kind": entry.kind, "id": entry.object_id, "action": action}
+    return list(changes.values())
+
+
+def _attach_data(changes):
+    """Current row data of inserted / updated rows; rows gone by now are reported as deletes."""
+    by_kind = {}
+    for change in changes:
+        if change["action"] != "delete":
+            by_kind.setdefault(change["kind"], []).append(change["id"])
+    data = {}
+    for kind, ids in by_kind.items():
+        columns = CHANGE_COLUMNS[kind]
+        rows = row_dicts(columns, CHANGE_MODELS[kind].objects.filter(id__in=ids).values_list(*columns))
+        if kind == "pair":
+            tags = pair_tag_ids(ids)
+            for row in rows:
+                row["tags"] = tags.get(row["id"], [])
+        data.update(((kind, row["id"]), row) for row in rows)
+    for change in changes:
+        if change["action"] == "delete":
+            continue
+        row = data.get((change["kind"], change["id"]))
+        if row is None:
+            change["action"] = "delete"
+        else:
+            change["data"] = row
+    return changes
+
+
+def changes_since(token, limit, kinds=None):
+    """
+    Changes after `token`, oldest first, at most `limit` log entries.
+    Returns (changes, next_token, has_more); raises ChangeTokenExpired.
+    """
+    first_id = ChangeLogEntry.objects.order_by("id").values_list("id", flat=True).first()
+    if first_id is not None and token < first_id - 1:
+        raise ChangeTokenExpired(token)
+
+    settled = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+    queryset = ChangeLogEntry.objects.filter(id__gt=token, created_at__lte=settled).order_by("id")
+    entries = list(queryset[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_token = entries[-1].id if entries else token
+    if kinds:
+        entries = [entry for entry in entries if entry.kind in kinds]
+    return _attach_data(_collapse(entries)), next_token, has_more
+
+
+def prune_change_log(retention_days=None):
+    """
+    Delete entries older than CHANGE_LOG_RETENTION_DAYS. The newest of them is
+    kept as the lower bound of the valid tokens, so tokens of clients that
+    synced before it can be told apart (410) from tokens that are still good.
+    Returns the number of deleted entries.
+    """
+    if retention_days is None:
+        retention_days = settings.CHANGE_LOG_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    anchor = ChangeLogEntry.objects.filter(created_at__lt=cutoff).order_by("-id").values_list("id", flat=True).first()
+    if anchor is None:
+        return 0
+    deleted, _ = ChangeLogEntry.objects.filter(id__lt=anchor).delete()
+    return deleted
@@ -0,0 +1,394 @@
+"""
+Persistent IVF (inverted file) index over the topic and contrast pair
+embeddings, stored as .npy files that every worker memory-maps, so the vectors
+live once in the page cache instead of once per process.
+
+Layout under EMBEDDING_INDEX_DIR/<kind>/:
+    current.json            manifest naming the published build
+    <build>/centroids.npy   nlist x dim float32, L2-normalized
+    <build>/offsets.npy     nlist + 1 int64, rows of list i are offsets[i]:offsets[i+1]
+    <build>/ids.npy         int64 id of every row (rows grouped by list)
+    <build>/vectors.npy     n x dim float32, L2-normalized, same row order
+    <build>/sorted_ids.npy, <build>/sorted_rows.npy   id -> row lookup
+    delta-*.npz             changes made after the build (ids, vectors, removed)
+
+A search probes the nprobe lists whose centroids are closest to the query,
+scores their rows exactly and merges in the delta segment, which overrides the
+base rows of the same ids. Committed embedding writes append a delta file;
+every worker notices it from the embedding version or the mtime of the index
+directory, and reopening the same build reads only the delta files it has not
+seen.
+The merge_embedding_index Celery task rebuilds the base from the database and
+drops the delta files it absorbed. Kinds without a published build fall back
+to the exact in-memory EmbeddingMatrix.
+"""
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .embeddings import (
+    EMBEDDING_MODELS,
+    EmbeddingMatrix,
+    bump_embedding_version,
+    decode_embedding,
+    get_embedding_matrix,
+    get_embedding_version,
+    normalize_rows,
+)
+
+MANIFEST_NAME = "current.json"
+DELTA_PATTERN = "delta-*.npz"
+# Previous builds kept on disk for workers that still have them mapped
+KEEP_BUILDS = 2
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_BATCH_SIZE = 16384
+DEFAULT_NPROBE = 8
+
+
+def get_index_dir(kind):
+    base_dir = getattr(settings, "EMBEDDING_INDEX_DIR", os.path.join(settings.MEDIA_ROOT, "embedding_index"))
+    return os.path.join(base_dir, kind)
+
+
+def get_current_manifest(kind):
+    """Return the manifest of the published build of kind or None."""
+    try:
+        with open(os.path.join(get_index_dir(kind), MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _save_npy(path, array):
+    np.save(path, np.ascontiguousarray(array), allow_pickle=False)
+
+
+# ---------------------------------------------------------------------------
+# Building
+# ---------------------------------------------------------------------------
+
+def _assign(vectors, centroids):
+    """Index of the most similar centroid for every row, computed in batches."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_BATCH_SIZE):
+        batch = vectors[start:start + ASSIGN_BATCH_SIZE]
+        assignment[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(vectors, nlist, seed=0):
+    """Spherical k-means on a sample of the (normalized) rows."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * KMEANS_SAMPLE_PER_LIST)
+    sample = vectors[np.sort(rng.choice(len(vectors), size=sample_size, replace=False))]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~sums.any(axis=1)
+        # Reseed empty lists with random sample rows
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+def build_embedding_index(kind, nlist=None):
+    """
+    Build the IVF index of kind from the database, publish it and drop the
+    delta files written before the build started. Returns the manifest.
+    """
+    index_dir = get_index_dir(kind)
+    os.makedirs(index_dir, exist_ok=True)
+    # Changes written after this listing stay in the delta segment of the new build
+    absorbed_deltas = sorted(glob.glob(os.path.join(index_dir, DELTA_PATTERN)))
+
+    matrix = EmbeddingMatrix.build(EMBEDDING_MODELS[kind])
+    count = len(matrix)
+    if nlist is None:
+        nlist = int(np.sqrt(count))
+    nlist = max(1, min(nlist, count))
+
+    if count:
+        centroids = train_centroids(matrix.vectors, nlist)
+        assignment = _assign(matrix.vectors, centroids)
+    else:
+        centroids = np.empty((0, 0), dtype=np.float32)
+        assignment = np.empty(0, dtype=np.int64)
+        nlist = 0
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=nlist), out=offsets[1:])
+    ids = matrix.ids[order]
+    sorted_rows = np.argsort(ids, kind="stable")
+
+    build = f"{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    tmp_dir = tempfile.mkdtemp(dir=index_dir, prefix=".tmp-")
+    try:
+        _save_npy(os.path.join(tmp_dir, "centroids.npy"), centroids)
+        _save_npy(os.path.join(tmp_dir, "offsets.npy"), offsets)
+        _save_npy(os.path.join(tmp_dir, "ids.npy"), ids)
+        _save_npy(os.path.join(tmp_dir, "vectors.npy"), matrix.vectors[order])
+        _save_npy(os.path.join(tmp_dir, "sorted_ids.npy"), ids[sorted_rows])
+        _save_npy(os.path.join(tmp_dir, "sorted_rows.npy"), sorted_rows)
+        os.replace(tmp_dir, os.path.join(index_dir, build))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    manifest = {
+        "build": build,
+        "count": count,
+        "dimension": matrix.dimension if count else None,
+        "nlist": nlist,
+        "created_at": timezone.now().isoformat(),
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle)
+    os.replace(tmp_path, os.path.join(index_dir, MANIFEST_NAME))
+
+    for path in absorbed_deltas:
+        os.remove(path)
+    _prune_old_builds(index_dir, keep_build=build)
+    bump_embedding_version(kind)
+    return manifest
+
+
+def _prune_old_builds(index_dir, keep_build):
+    builds = [
+        name for name in os.listdir(index_dir)
+        if name != keep_build and not name.startswith(".") and os.path.isdir(os.path.join(index_dir, name))
+    ]
+    builds.sort(reverse=True)  # names start with the build timestamp
+    for name in builds[KEEP_BUILDS - 1:]:
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Delta segment
+# ---------------------------------------------------------------------------
+
+def record_embedding_changes(model, changes):
+    """
+    Make {id: vector_embedding blob or None} changes of a Temator/ContrastPair
+    visible to every process once the current transaction commits: append
+    them to the delta segment of a published index and bump the embedding
+    version. Rolled back changes are never written.
+    """
+    kind = next((kind for kind, kind_model in EMBEDDING_MODELS.items() if kind_model is model), None)
+    if kind is None or not changes:
+        return
+    changes = dict(changes)
+    transaction.on_commit(lambda: _write_delta(kind, changes))
+
+
+def _write_delta(kind, changes):
+    index_dir = get_index_dir(kind)
+    if os.path.isdir(index_dir):
+        ids = np.fromiter(changes.keys(), dtype=np.int64, count=len(changes))
+        vectors = [decode_embedding(blob) for blob in changes.values()]
+        dimensions = {len(vector) for vector in vectors if vector is not None}
+        dimension = dimensions.pop() if len(dimensions) == 1 else 0
+        removed = np.array([vector is None or len(vector) != dimension for vector in vectors], dtype=bool)
+        stacked = np.zeros((len(vectors), dimension), dtype=np.float32)
+        for row, vector in enumerate(vectors):
+            if not removed[row]:
+                stacked[row] = vector
+        # Timestamped names keep the files in write order; the tmp file is invisible to readers
+        name = f"delta-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.npz"
+        fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix=".tmp-", suffix=".npz")
+        with os.fdopen(fd, "wb") as handle:
+            np.savez(handle, ids=ids, vectors=stacked, removed=removed)
+        os.replace(tmp_path, os.path.join(index_dir, name))
+    bump_embedding_version(kind)
+
+
+def _directory_mtime(index_dir):
+    try:
+        return os.stat(index_dir).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _delta_names(index_dir):
+    return sorted(os.path.basename(path) for path in glob.glob(os.path.join(index_dir, DELTA_PATTERN)))
+
+
+def _load_delta(index_dir, names, dimension, latest):
+    """Apply the delta files `names` (oldest first) to {id: vector or None} in place."""
+    for name in names:
+        try:
+            with np.load(os.path.join(index_dir, name), allow_pickle=False) as delta:
+                ids, vectors, removed = delta["ids"], delta["vectors"], delta["removed"]
+        except FileNotFoundError:  # absorbed by a concurrent merge
+            continue
+        usable = vectors.shape[1] == dimension
+        for row, obj_id in enumerate(ids.tolist()):
+            latest[obj_id] = vectors[row] if usable and not removed[row] else None
+    return latest
+
+
+# ---------------------------------------------------------------------------
+# Searching
+# ---------------------------------------------------------------------------
+
+class IVFIndex:
+    """
+    A published build (memory-mapped) plus the current delta segment.
+
+    Given the index it replaces (`previous`) of the same build, the base
+    arrays are shared and only the delta files written since are read.
+    """
+
+    def __init__(self, kind, manifest, version=None, nprobe=None, previous=None):
+        self.kind = kind
+        self.manifest = manifest
+        self.version = version
+        self.nprobe = nprobe or getattr(settings, "EMBEDDING_INDEX_NPROBE", DEFAULT_NPROBE)
+        index_dir = get_index_dir(kind)
+        # Before reading anything: a file published meanwhile makes this index stale
+        self.directory_mtime = _directory_mtime(index_dir)
+        build_dir = os.path.join(index_dir, manifest["build"])
+
+        def load(name, mmap_mode="r"):
+            return np.load(os.path.join(build_dir, name), mmap_mode=mmap_mode, allow_pickle=False)
+
+        if previous is not None and previous.manifest["build"] == manifest["build"]:
+            for name in ("centroids", "offsets", "ids", "vectors", "sorted_ids", "sorted_rows"):
+                setattr(self, name, getattr(previous, name))
+        else:
+            previous = None
+            self.centroids = load("centroids.npy", mmap_mode=None)
+            self.offsets = load("offsets.npy", mmap_mode=None)
+            self.ids = load("ids.npy")
+            self.vectors = load("vectors.npy")
+            self.sorted_ids = load("sorted_ids.npy")
+            self.sorted_rows = load("sorted_rows.npy")
+
+        self.delta_names = _delta_names(index_dir)
+        if previous is not None:
+            seen = set(previous.delta_names)
+            new_names = [name for name in self.delta_names if name not in seen]
+            # A new file sorting before applied ones (clock skew between writers) needs a full replay
+            if new_names and previous.delta_names and new_names[0] < previous.delta_names[-1]:
+                previous = None
+        if previous is not None:
+            delta = _load_delta(index_dir, new_names, self.dimension, dict(previous.delta))
+        else:
+            delta = _load_delta(index_dir, self.delta_names, self.dimension, {})
+        self.delta = delta
+        self.delta_ids = np.fromiter(delta.keys(), dtype=np.int64, count=len(delta))
+        live = [obj_id for obj_id, vector in delta.items() if vector is not None]
+        self.live_delta_ids = np.array(live, dtype=np.int64)
+        self.delta_vectors = np.zeros((len(live), self.dimension), dtype=np.float32)
+        for row, obj_id in enumerate(live):
+            self.delta_vectors[row] = delta[obj_id]
+        normalize_rows(self.delta_vectors)
+        self._delta_rows = {obj_id: row for row, obj_id in enumerate(live)}
+
+    def __len__(self):
+        return len(self.ids) + len(self.live_delta_ids) - int(np.isin(self.delta_ids, self.sorted_ids).sum())
+
+    @property
+    def dimension(self):
+        return self.manifest["dimension"] or 0
+
+    def is_stale(self, version):
+        # Delta files and manifests are renamed into the directory, which bumps its mtime
+        return version != self.version or _directory_mtime(get_index_dir(self.kind)) != self.directory_mtime
+
+    def vector_of(self, obj_id):
+        """Normalized vector of obj_id, or None if it has no usable embedding."""
+        if obj_id in self._delta_rows:
+            return self.delta_vectors[self._delta_rows[obj_id]]
+        if obj_id in self.delta_ids:
+            return None
+        position = int(np.searchsorted(self.sorted_ids, obj_id))
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == obj_id:
+            return np.asarray(self.vectors[self.sorted_rows[position]])
+        return None
+
+    def vectors_of(self, obj_ids):
+        """Same contract as EmbeddingMatrix.vectors_of."""
+        vectors = [self.vector_of(obj_id) for obj_id in obj_ids]
+        found = np.array([vector is not None for vector in vectors], dtype=bool)
+        stacked = np.zeros((int(found.sum()), self.dimension), dtype=np.float32)
+        for row, vector in enumerate(vector for vector in vectors if vector is not None):
+            stacked[row] = vector
+        return found, stacked
+
+    def search(self, queries, k, exclude_ids=None):
+        """Same contract as EmbeddingMatrix.search, approximate over the base build."""
+        queries = normalize_rows(np.array(queries, dtype=np.float32, ndmin=2))
+        if k <= 0 or not self.dimension:
+            return [[] for _ in range(len(queries))]
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        delta_scores = queries @ self.delta_vectors.T
+
+        results = []
+        for query_row, query in enumerate(queries):
+            spans = [(self.offsets[probe], self.offsets[probe + 1]) for probe in probes[query_row]]
+            candidate_ids = np.concatenate([self.ids[start:end] for start, end in spans] + [self.live_delta_ids])
+            scores = np.concatenate([self.vectors[start:end] @ query for start, end in spans] + [delta_scores[query_row]])
+            # Rows replaced or removed by the delta segment, and the query item itself
+            base_count = len(candidate_ids) - len(self.live_delta_ids)
+            scores[:base_count][np.isin(candidate_ids[:base_count], self.delta_ids)] = -np.inf
+            if exclude_ids is not None and exclude_ids[query_row] is not None:
+                scores[candidate_ids == exclude_ids[query_row]] = -np.inf
+
+            top_count = min(k, len(scores))
+            if not top_count:
+                results.append([])
+                continue
+            top = np.argpartition(-scores, top_count - 1)[:top_count]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            results.append([
+                (int(candidate_ids[row]), float(scores[row]))
+                for row in top
+                if np.isfinite(scores[row])
+            ])
+        return results
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_embedding_index(kind):
+    """
+    Return the process-wide searcher for kind: the published IVF index with
+    its delta segment, or the exact EmbeddingMatrix when nothing is published.
+    """
+    version = get_embedding_version(kind)
+    index = _indexes.get(kind)
+    if index is not None and not index.is_stale(version):
+        return index
+    with _indexes_lock:
+        index = _indexes.get(kind)
+        if index is None or index.is_stale(version):
+            manifest = get_current_manifest(kind)
+            if manifest is None:
+                _indexes.pop(kind, None)
+                return get_embedding_matrix(kind)
+            index = _indexes[kind] = IVFIndex(kind, manifest, version=version, previous=index)
+        return index
+
+
+def reset_embedding_indexes():
+    """Drop the opened indexes so the next search reopens them."""
+    with _indexes_lock:
+        _indexes.clear()
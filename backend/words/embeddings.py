@@ -0,0 +1,350 @@
+"""
+Process-level embedding matrices for similarity search over topics (Temator)
+and contrast pairs.
+
+Every stored vector_embedding blob (see decode_embedding) of a model is
+loaded once into a single L2-normalized float32 matrix, so a query is one
+matrix-vector product (cosine similarity) and a batch of queries is one
+matrix-matrix product. Saves and deletes bump a shared per-kind version in the
+cache; every process rebuilds its matrix when it notices the new version.
+Large corpora are served from the persistent IVF index in embedding_index.py,
+which falls back to this matrix while no index is published.
+"""
+import struct
+import threading
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+from .models import ContrastPair, Temator
+from .utils import bump_cache_version, get_cache_version
+
+EMBEDDING_MODELS = {
+    "topic": Temator,
+    "pair": ContrastPair,
+}
+
+EMBEDDING_VERSION_KEY = "words:embedding_version:{kind}"
+# Dimension of the random projection used by diverse_subset
+DIVERSITY_PROJECTION_DIMENSION = 64
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+# Typed embedding blob (little endian):
+#     b"CAEV", u8 format version, u8 dtype code, u16 dimension, f32 scale,
+#     u8 model tag length, model tag (UTF-8), dimension values of dtype
+# Quantized values are stored / scale. Blobs without the magic are legacy raw float32.
+EMBEDDING_MAGIC = b"CAEV"
+EMBEDDING_FORMAT_VERSION = 1
+EMBEDDING_STORAGE_DTYPES = {
+    "float32": (0, np.dtype("<f4")),
+    "float16": (1, np.dtype("<f2")),
+    "int8": (2, np.dtype("i1")),
+}
+_DTYPES_BY_CODE = {code: (name, dtype) for name, (code, dtype) in EMBEDDING_STORAGE_DTYPES.items()}
+_EMBEDDING_HEADER = struct.Struct("<4sBBHfB")
+
+TypedEmbedding = namedtuple("TypedEmbedding", "values dtype scale model")
+
+
+def is_typed_embedding(blob):
+    return blob is not None and len(blob) >= len(EMBEDDING_MAGIC) and bytes(blob[:len(EMBEDDING_MAGIC)]) == EMBEDDING_MAGIC
+
+
+def encode_embedding(vector, dtype="float32", model=""):
+    """Serialize a vector as a typed blob, quantizing it to dtype ("float32", "float16" or "int8")."""
+    if dtype not in EMBEDDING_STORAGE_DTYPES:
+        raise ValueError(f"Unknown embedding dtype '{dtype}'.")
+    code, storage_dtype = EMBEDDING_STORAGE_DTYPES[dtype]
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if not np.isfinite(vector).all():
+        raise ValueError("Embedding values must be finite.")
+    model_tag = model.encode("utf-8")
+    if len(model_tag) > 255:
+        raise ValueError("Embedding model tag must be at most 255 bytes.")
+    if len(vector) > 0xFFFF:
+        raise ValueError("Embedding dimension must be at most 65535.")
+
+    scale = 1.0
+    if dtype == "int8":
+        peak = float(np.abs(vector).max()) if len(vector) else 0.0
+        scale = peak / 127 if peak else 1.0
+        values = np.clip(np.rint(vector / scale), -127, 127).astype(storage_dtype)
+    else:
+        values = vector.astype(storage_dtype)
+    header = _EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_FORMAT_VERSION, code, len(vector), scale, len(model_tag))
+    return header + model_tag + values.tobytes()
+
+
+def parse_embedding(blob):
+    """
+    Parse a typed blob into TypedEmbedding; values is a zero-copy view of the
+    stored (possibly quantized) values. Raises ValueError for malformed blobs.
+    """
+    if len(blob) < _EMBEDDING_HEADER.size:
+        raise ValueError("Embedding header is truncated.")
+    magic, format_version, code, dimension, scale, tag_length = _EMBEDDING_HEADER.unpack_from(blob)
+    if magic != EMBEDDING_MAGIC:
+        raise ValueError("Embedding has no type header.")
+    if format_version != EMBEDDING_FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version {format_version}.")
+    if code not in _DTYPES_BY_CODE:
+        raise ValueError(f"Unknown embedding dtype code {code}.")
+    if not np.isfinite(scale) or scale <= 0:
+        raise ValueError("Embedding scale must be a positive number.")
+    dtype_name, dtype = _DTYPES_BY_CODE[code]
+    offset = _EMBEDDING_HEADER.size + tag_length
+    if len(blob) != offset + dimension * dtype.itemsize:
+        raise ValueError(f"Embedding payload does not hold {dimension} {dtype_name} values.")
+    try:
+        model = bytes(blob[_EMBEDDING_HEADER.size:offset]).decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError("Embedding model tag is not valid UTF-8.")
+    values = np.frombuffer(blob, dtype=dtype, count=dimension, offset=offset)
+    return TypedEmbedding(values, dtype_name, scale, model)
+
+
+def decode_embedding(blob):
+    """
+    Return a stored blob as a float32 vector, or None if it isn't one.
+    Legacy raw float32 and typed float32 blobs are returned without copying;
+    quantized values are widened and rescaled.
+    """
+    if not blob:
+        return None
+    if is_typed_embedding(blob):
+        try:
+            embedding = parse_embedding(blob)
+        except ValueError:
+            return None
+        if embedding.dtype == "float32":
+            return embedding.values
+        values = embedding.values.astype(np.float32)
+        if embedding.scale != 1.0:
+            values *= np.float32(embedding.scale)
+        return values
+    if len(blob) % EMBEDDING_DTYPE.itemsize:
+        return None
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+
+def is_usable_embedding(vector):
+    """Decoded (not None) and free of NaN / inf."""
+    return vector is not None and bool(np.isfinite(vector).all())
+
+
+def most_common_dimension(vectors):
+    """
+    Most common length among usable vectors (the first one seen on ties), 0
+    if there are none. Rows of any other length are left out of the matrix
+    and the f32 export.
+    """
+    counts = Counter(len(vector) for vector in vectors).most_common(1)
+    return counts[0][0] if counts else 0
+
+
+def normalize_rows(vectors):
+    """L2-normalize each row in place; all-zero rows are left as zeros."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class EmbeddingMatrix:
+    """
+    Normalized embeddings of one model with their ids sorted ascending.
+    Rows whose dimension differs from the most common one are left out.
+    """
+
+    def __init__(self, ids, vectors, version=None):
+        self.ids = ids
+        self.vectors = vectors
+        self.version = version
+
+    @classmethod
+    def build(cls, model, version=None):
+        rows = (
+            model.objects.exclude(vector_embedding=None)
+            .order_by("id")
+            .values_list("id", "vector_embedding")
+            .iterator(chunk_size=2000)
+        )
+        decoded = []
+        for obj_id, blob in rows:
+            vector = decode_embedding(blob)
+            if is_usable_embedding(vector):
+                decoded.append((obj_id, vector))
+
+        dimension = most_common_dimension(vector for _, vector in decoded)
+        if not dimension:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32), version)
+        decoded = [(obj_id, vector) for obj_id, vector in decoded if len(vector) == dimension]
+
+        ids = np.fromiter((obj_id for obj_id, _ in decoded), dtype=np.int64, count=len(decoded))
+        vectors = np.empty((len(decoded), dimension), dtype=np.float32)
+        for row, (_, vector) in enumerate(decoded):
+            vectors[row] = vector
+        return cls(ids, normalize_rows(vectors), version)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dimension(self):
+        return self.vectors.shape[1]
+
+    def is_stale(self, version):
+        return version != self.version
+
+    def row_of(self, obj_id):
+        """Row index of obj_id, or None if it has no usable embedding."""
+        row = int(np.searchsorted(self.ids, obj_id))
+        if row < len(self.ids) and self.ids[row] == obj_id:
+            return row
+        return None
+
+    def vector_of(self, obj_id):
+        """Normalized vector of obj_id, or None if it has no usable embedding."""
+        row = self.row_of(obj_id)
+        return None if row is None else self.vectors[row]
+
+    def vectors_of(self, obj_ids):
+        """
+        Vectorized lookup: (found mask, vectors of the found ids) for a list of
+        ids, the vectors in the order of the ids.
+        """
+        obj_ids = np.asarray(obj_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, obj_ids), max(len(self.ids) - 1, 0))
+        found = self.ids[rows] == obj_ids if len(self.ids) else np.zeros(len(obj_ids), dtype=bool)
+        return found, self.vectors[rows[found]]
+
+    def search(self, queries, k, exclude_ids=None):
+        """
+        Top-k rows by cosine similarity for each query vector (q x dimension).
+        exclude_ids optionally holds one id per query to leave out of its
+        results (the query item itself). Returns one [(id, score), ...] list
+        per query, best first.
+        """
+        queries = normalize_rows(np.array(queries, dtype=np.float32, ndmin=2))
+        if not len(self) or k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = queries @ self.vectors.T
+        if exclude_ids is not None:
+            for query_row, obj_id in enumerate(exclude_ids):
+                row = None if obj_id is None else self.row_of(obj_id)
+                if row is not None:
+                    scores[query_row, row] = -np.inf
+
+        k = min(k, len(self))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        results = []
+        for rows, row_scores in zip(top, top_scores):
+            results.append([
+                (int(self.ids[row]), float(score))
+                for row, score in zip(rows, row_scores)
+                if np.isfinite(score)
+            ])
+        return results
+
+
+def find_near_duplicates(searcher, vectors, threshold):
+    """
+    Check a batch of new vectors against the stored ones (searcher is an
+    EmbeddingMatrix or IVFIndex) and against each other, earlier items winning.
+    Returns one entry per vector: None, ("id", id, score) for a stored item or
+    ("item", position, score) for an earlier vector of the batch.
+    Vectors that are None are not checked and never match.
+    """
+    usable = [position for position, vector in enumerate(vectors) if vector is not None]
+    matches = [None] * len(vectors)
+    if not usable:
+        return matches
+    batch = normalize_rows(np.array([vectors[position] for position in usable], dtype=np.float32))
+
+    if len(searcher):
+        for position, nearest in zip(usable, searcher.search(batch, 1)):
+            if nearest and nearest[0][1] >= threshold:
+                matches[position] = ("id", nearest[0][0], nearest[0][1])
+
+    similarities = batch @ batch.T
+    kept = np.zeros(len(usable), dtype=bool)
+    for row, position in enumerate(usable):
+        if matches[position] is None:
+            earlier = np.flatnonzero(kept[:row] & (similarities[row, :row] >= threshold))
+            if len(earlier):
+                best = earlier[np.argmax(similarities[row, earlier])]
+                matches[position] = ("item", usable[best], float(similarities[row, best]))
+            else:
+                kept[row] = True
+    return matches
+
+
+@lru_cache(maxsize=4)
+def _projection(dimension):
+    # Fixed seed: the same projection in every process
+    rng = np.random.default_rng(dimension)
+    return rng.standard_normal((dimension, DIVERSITY_PROJECTION_DIMENSION)).astype(np.float32)
+
+
+def diverse_subset(vectors, count, first=0):
+    """
+    Greedy farthest-point selection: positions of count rows of vectors
+    (normalized, n x dimension), each next one the least similar to everything
+    picked so far, starting at first. Vectors are randomly projected to
+    DIVERSITY_PROJECTION_DIMENSION dimensions first, so the cost is
+    O(count * n * 64) whatever the embedding size.
+    """
+    total = len(vectors)
+    count = min(count, total)
+    if count <= 0:
+        return []
+    if vectors.shape[1] > DIVERSITY_PROJECTION_DIMENSION:
+        vectors = normalize_rows(vectors @ _projection(vectors.shape[1]))
+    picked = [first]
+    # Highest similarity of every row to the picked set
+    closest = vectors @ vectors[first]
+    closest[first] = np.inf
+    for _ in range(count - 1):
+        position = int(np.argmin(closest))
+        picked.append(position)
+        np.maximum(closest, vectors @ vectors[position], out=closest)
+        closest[position] = np.inf
+    return picked
+
+
+_matrices = {}
+_matrices_lock = threading.Lock()
+
+
+def get_embedding_version(kind):
+    return get_cache_version(EMBEDDING_VERSION_KEY.format(kind=kind))
+
+
+def bump_embedding_version(kind):
+    """Mark the embedding matrix of kind as outdated in every process."""
+    return bump_cache_version(EMBEDDING_VERSION_KEY.format(kind=kind))
+
+
+def get_embedding_matrix(kind):
+    """Return the process-wide EmbeddingMatrix for kind ("topic" or "pair")."""
+    version = get_embedding_version(kind)
+    matrix = _matrices.get(kind)
+    if matrix is not None and not matrix.is_stale(version):
+        return matrix
+    with _matrices_lock:
+        matrix = _matrices.get(kind)
+        if matrix is None or matrix.is_stale(version):
+            matrix = _matrices[kind] = EmbeddingMatrix.build(EMBEDDING_MODELS[kind], version=version)
+        return matrix
+
+
+def reset_embedding_matrices():
+    """Drop the cached matrices so the next search rebuilds them."""
+    with _matrices_lock:
+        _matrices.clear()
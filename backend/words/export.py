@@ -0,0 +1,140 @@
+"""
+Streaming export of the topic / contrast pair corpus.
+
+Every exporter is a generator of byte chunks that reads its table with
+.iterator(chunk_size=...) and encodes one chunk of rows at a time, so memory
+stays flat whatever the table size. Used by the agent export endpoint
+(StreamingHttpResponse) and the export_corpus management command.
+
+Formats:
+    ndjson  one JSON object per line
+    f32     embeddings only: packed records of EMBEDDING_RECORD_DTYPE(dimension),
+            i.e. little-endian int64 id followed by dimension float32 values
+            (np.frombuffer(data, dtype=embedding_record_dtype(dimension)))
+"""
+import base64
+import json
+from datetime import datetime
+
+import numpy as np
+
+from .embeddings import decode_embedding, is_usable_embedding, most_common_dimension
+from .models import ContrastPair, ContrastPairRating, ContrastTag, Temator
+from .utils import chunked
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_KINDS = ("topics", "pairs", "ratings", "tags")
+EMBEDDING_EXPORT_KINDS = {"topics": Temator, "pairs": ContrastPair}
+
+# Exported columns per model, shared with the change feed (change_log.py)
+TOPIC_COLUMNS = ["id", "name", "source", "created_at", "updated_at"]
+PAIR_COLUMNS = [
+    "id", "item1", "item2", "created_at", "updated_at",
+    "rating_count", "rating_sum", "min_rating", "avg_rating",
+]
+RATING_COLUMNS = ["id", "contrast_pair_id", "user_fingerprint", "rating", "created_at", "updated_at"]
+TAG_COLUMNS = ["id", "name"]
+
+
+def embedding_record_dtype(dimension):
+    return np.dtype([("id", "<i8"), ("vector", "<f4", (dimension,))])
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    return value
+
+
+def row_dicts(columns, rows):
+    """values_list rows as JSON-ready dicts (ISO datetimes, base64 embeddings)."""
+    return [{column: _export_value(value) for column, value in zip(columns, row)} for row in rows]
+
+
+def pair_tag_ids(pair_ids):
+    """{pair_id: [tag ids]} for the given pairs, in one query."""
+    tags = {}
+    links = ContrastPair.tags.through.objects.filter(contrastpair_id__in=list(pair_ids))
+    for pair_id, tag_id in links.order_by("contrasttag_id").values_list("contrastpair_id", "contrasttag_id"):
+        tags.setdefault(pair_id, []).append(tag_id)
+    return tags
+
+
+def _ndjson(rows):
+    return "".join(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows).encode("utf-8")
+
+
+def _export_table(model, columns, include_embedding, chunk_size):
+    columns = columns + (["vector_embedding"] if include_embedding else [])
+    rows = model.objects.order_by("id").values_list(*columns).iterator(chunk_size=chunk_size)
+    for chunk in chunked(rows, chunk_size):
+        yield row_dicts(columns, chunk)
+
+
+def export_topics(include_embedding=False, chunk_size=EXPORT_CHUNK_SIZE):
+    for lines in _export_table(Temator, TOPIC_COLUMNS, include_embedding, chunk_size):
+        yield _ndjson(lines)
+
+
+def export_pairs(include_embedding=False, chunk_size=EXPORT_CHUNK_SIZE):
+    for lines in _export_table(ContrastPair, PAIR_COLUMNS, include_embedding, chunk_size):
+        # Tags of the whole chunk in one query
+        tags = pair_tag_ids(line["id"] for line in lines)
+        for line in lines:
+            line["tags"] = tags.get(line["id"], [])
+        yield _ndjson(lines)
+
+
+def export_ratings(include_embedding=False, chunk_size=EXPORT_CHUNK_SIZE):
+    for lines in _export_table(ContrastPairRating, RATING_COLUMNS, False, chunk_size):
+        yield _ndjson(lines)
+
+
+def export_tags(include_embedding=False, chunk_size=EXPORT_CHUNK_SIZE):
+    for lines in _export_table(ContrastTag, TAG_COLUMNS, False, chunk_size):
+        yield _ndjson(lines)
+
+
+NDJSON_EXPORTERS = {
+    "topics": export_topics,
+    "pairs": export_pairs,
+    "ratings": export_ratings,
+    "tags": export_tags,
+}
+
+
+def embedding_export_dimension(kind):
+    """
+    Dimension of the exported embeddings of kind: the most common one, as in
+    EmbeddingMatrix.build (0 if none). Blobs are decoded one chunk at a time.
+    """
+    model = EMBEDDING_EXPORT_KINDS[kind]
+    blobs = model.objects.exclude(vector_embedding=None).order_by("id").values_list("vector_embedding", flat=True)
+    vectors = (decode_embedding(blob) for blob in blobs.iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    return most_common_dimension(vector for vector in vectors if is_usable_embedding(vector))
+
+
+def export_embeddings(kind, dimension, chunk_size=EXPORT_CHUNK_SIZE):
+    """Packed (id, vector) records of every embedding of kind with the given dimension; others are skipped."""
+    model = EMBEDDING_EXPORT_KINDS[kind]
+    record_dtype = embedding_record_dtype(dimension)
+    rows = (
+        model.objects.exclude(vector_embedding=None)
+        .order_by("id")
+        .values_list("id", "vector_embedding")
+        .iterator(chunk_size=chunk_size)
+    )
+    for chunk in chunked(rows, chunk_size):
+        records = np.empty(len(chunk), dtype=record_dtype)
+        count = 0
+        for obj_id, blob in chunk:
+            vector = decode_embedding(blob)
+            if vector is None or len(vector) != dimension:
+                continue
+            records[count]["id"] = obj_id
+            records[count]["vector"] = vector
+            count += 1
+        if count:
+            yield records[:count].tobytes()
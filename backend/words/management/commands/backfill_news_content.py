@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from words.models import CypherArenaPerplexityDeepResearch
+
+
+class Command(BaseCommand):
+    help = 'Fills CypherArenaPerplexityDeepResearch.content for records saved before it existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Records loaded and updated per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pending = []
+        updated = 0
+        records = CypherArenaPerplexityDeepResearch.objects.filter(content=None).order_by('id').only('id', 'data_response')
+        for record in records.iterator(chunk_size=batch_size):
+            record.content = CypherArenaPerplexityDeepResearch.extract_content(record.data_response)
+            pending.append(record)
+            if len(pending) >= batch_size:
+                CypherArenaPerplexityDeepResearch.objects.bulk_update(pending, ['content'], batch_size=batch_size)
+                updated += len(pending)
+                pending = []
+        CypherArenaPerplexityDeepResearch.objects.bulk_update(pending, ['content'], batch_size=batch_size)
+        updated += len(pending)
+        self.stdout.write(self.style.SUCCESS(f'Set content on {updated} news records'))
@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from words.perplexity_deep_research import SEARCH_TYPES, date_windows
+from words.tasks import NEWS_SEARCH_WINDOW_DAYS, run_news_searches
+
+
+class Command(BaseCommand):
+    help = 'Queues parallel Perplexity news searches over a date range; windows that already have a record are skipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('start', type=date.fromisoformat, help='First day (YYYY-MM-DD)')
+        parser.add_argument('end', type=date.fromisoformat, help='Last day (YYYY-MM-DD)')
+        parser.add_argument('--window-days', type=int, default=NEWS_SEARCH_WINDOW_DAYS, help='Days between the start and end of a window')
+        parser.add_argument('--category', action='append', choices=list(SEARCH_TYPES), help='Search type (repeatable, default all)')
+        parser.add_argument('--model', default='sonar-pro', help='Perplexity model')
+        parser.add_argument('--bypass-cache', action='store_true', help='Call Perplexity even for prompts in the response cache')
+
+    def handle(self, *args, **options):
+        if options['start'] > options['end']:
+            raise CommandError('start must not be after end')
+        if options['window_days'] < 0:
+            raise CommandError('--window-days must not be negative')
+        windows = date_windows(options['start'], options['end'], options['window_days'])
+        names = options['category'] or list(SEARCH_TYPES)
+        result = run_news_searches(windows, names=names, search_model=options['model'],
+                                   bypass_cache=options['bypass_cache'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Queued {len(windows) * len(names)} searches ({len(windows)} windows x {len(names)} categories), chord {result.id}'
+        ))
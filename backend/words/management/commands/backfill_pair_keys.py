@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from words.change_log import record_changes
+from words.models import ContrastPair, ContrastPairRating
+from words.rating_aggregates import refresh_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Fills ContrastPair.pair_key for pairs created before it existed and reports (or merges) duplicates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Pairs updated per query')
+        parser.add_argument('--merge', action='store_true',
+                            help='Move the ratings and tags of duplicates to the oldest pair and delete them')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        taken = dict(ContrastPair.objects.exclude(pair_key=None).values_list('pair_key', 'id'))
+        pending = []
+        duplicates = []
+        for pair in ContrastPair.objects.filter(pair_key=None).order_by('id').only('id', 'item1', 'item2').iterator(chunk_size=batch_size):
+            key = ContrastPair.make_pair_key(pair.item1, pair.item2)
+            if key in taken:
+                # Keep the oldest pair; later copies stay without a key until merged or removed
+                duplicates.append((pair.id, taken[key]))
+                self.stdout.write(self.style.WARNING(f'Pair {pair.id} "{pair}" duplicates pair {taken[key]}'))
+                continue
+            taken[key] = pair.id
+            pair.pair_key = key
+            pending.append(pair)
+        ContrastPair.objects.bulk_update(pending, ['pair_key'], batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Set pair_key on {len(pending)} pairs'))
+
+        if not duplicates:
+            return
+        if not options['merge']:
+            self.stdout.write(self.style.WARNING(
+                f'{len(duplicates)} duplicates left without a key; rerun with --merge to merge them'
+            ))
+            return
+        for duplicate_id, kept_id in duplicates:
+            self.merge(duplicate_id, kept_id)
+        self.stdout.write(self.style.SUCCESS(f'Merged {len(duplicates)} duplicates'))
+
+    @transaction.atomic
+    def merge(self, duplicate_id, kept_id):
+        """Move the ratings and tags of pair duplicate_id to kept_id, then delete it."""
+        kept = ContrastPair.objects.get(pk=kept_id)
+        duplicate = ContrastPair.objects.get(pk=duplicate_id)
+        # A user who rated both keeps the rating of the kept pair; the other one goes with the duplicate
+        rated = kept.ratings.values('user_fingerprint')
+        moved = list(duplicate.ratings.exclude(user_fingerprint__in=rated).values_list('id', flat=True))
+        ContrastPairRating.objects.filter(id__in=moved).update(contrast_pair=kept)
+        kept.tags.add(*duplicate.tags.all())
+        duplicate.delete()
+        # Bulk updates send no signals
+        refresh_rating_aggregates([kept_id])
+        record_changes(ContrastPairRating, moved, 'update')
+        record_changes(ContrastPair, [kept_id], 'update')
@@ -0,0 +1,19 @@
+from core.ordering import random_shuffle_key
+from django.core.management.base import BaseCommand
+from words.models import ContrastPair, Temator
+
+
+class Command(BaseCommand):
+    help = 'Gives every pair and topic a new random shuffle_key (run once after the column was added: it starts equal on all rows)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows updated per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (ContrastPair, Temator):
+            rows = list(model.objects.only('id').order_by('id'))
+            for row in rows:
+                row.shuffle_key = random_shuffle_key()
+            model.objects.bulk_update(rows, ['shuffle_key'], batch_size=batch_size)
+            self.stdout.write(self.style.SUCCESS(f'Set shuffle_key on {len(rows)} {model._meta.verbose_name_plural}'))
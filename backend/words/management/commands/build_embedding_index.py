@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from words.embedding_index import build_embedding_index
+from words.embeddings import EMBEDDING_MODELS
+
+
+class Command(BaseCommand):
+    help = 'Builds the memory-mapped IVF index used by /words/agent/similar/ and merges pending delta segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=sorted(EMBEDDING_MODELS), help='Only build the index of this kind')
+        parser.add_argument('--nlist', type=int, help='Number of inverted lists (default: sqrt of the row count)')
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else list(EMBEDDING_MODELS)
+        for kind in kinds:
+            manifest = build_embedding_index(kind, nlist=options['nlist'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Published {kind} index {manifest["build"]} ({manifest["count"]} vectors, {manifest["nlist"]} lists)'
+            ))
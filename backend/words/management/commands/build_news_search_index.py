@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from words.news_search import ensure_news_search_index
+
+
+class Command(BaseCommand):
+    help = 'Creates the full-text search index over news content (FTS5 table and triggers on SQLite, GIN index on PostgreSQL)'
+
+    def handle(self, *args, **options):
+        if ensure_news_search_index():
+            self.stdout.write(self.style.SUCCESS(f'Created the news search index ({connection.vendor})'))
+        else:
+            self.stdout.write(f'The news search index already exists or is not supported on {connection.vendor}')
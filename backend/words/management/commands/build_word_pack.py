@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from words.word_pack import DEFAULT_OCCURRENCE_THRESHOLD, publish_word_pack
+
+
+class Command(BaseCommand):
+    help = 'Builds and publishes the compressed word pack served at /words/word_pack/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--occurrence-threshold', type=int, default=DEFAULT_OCCURRENCE_THRESHOLD,
+                            help='Only include words with occurrence greater than this')
+        parser.add_argument('--force', action='store_true', help='Publish even if the content did not change')
+
+    def handle(self, *args, **options):
+        manifest, published = publish_word_pack(
+            occurrence_threshold=options['occurrence_threshold'],
+            force=options['force'],
+        )
+        if published:
+            self.stdout.write(self.style.SUCCESS(
+                f'Published word pack {manifest["version"]} ({manifest["count"]} words, {manifest["size"]} bytes)'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(f'Word pack {manifest["version"]} is already up to date'))
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from words.change_log import record_changes
+from words.embeddings import (
+    EMBEDDING_MODELS,
+    EMBEDDING_STORAGE_DTYPES,
+    bump_embedding_version,
+    decode_embedding,
+    encode_embedding,
+    is_typed_embedding,
+    parse_embedding,
+)
+
+
+class Command(BaseCommand):
+    help = 'Converts stored vector_embedding blobs (legacy raw float32 or typed) to the typed, optionally quantized format'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dtype', choices=list(EMBEDDING_STORAGE_DTYPES), default='float16', help='Storage dtype')
+        parser.add_argument('--model', default='', help='Model tag for blobs that do not carry one yet')
+        parser.add_argument('--kind', choices=sorted(EMBEDDING_MODELS), help='Only convert this kind')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows updated per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        kinds = [options['kind']] if options['kind'] else list(EMBEDDING_MODELS)
+        for kind in kinds:
+            self.convert(kind, EMBEDDING_MODELS[kind], options)
+
+    @staticmethod
+    def save(model, objs, batch_size):
+        with transaction.atomic():
+            model.objects.bulk_update(objs, ['vector_embedding'], batch_size=batch_size)
+            record_changes(model, [obj.id for obj in objs], 'update')
+
+    def convert(self, kind, model, options):
+        batch_size = options['batch_size']
+        converted = skipped = bytes_before = bytes_after = 0
+        pending = []
+        rows = model.objects.exclude(vector_embedding=None).order_by('id').values_list('id', 'vector_embedding')
+        for obj_id, blob in rows.iterator(chunk_size=batch_size):
+            model_tag = options['model']
+            if is_typed_embedding(blob):
+                try:
+                    embedding = parse_embedding(blob)
+                except ValueError:
+                    embedding = None
+                if embedding is not None and embedding.dtype == options['dtype']:
+                    continue
+                if embedding is not None and embedding.model:
+                    model_tag = embedding.model
+            vector = decode_embedding(blob)
+            if vector is None:
+                skipped += 1
+                self.stdout.write(self.style.WARNING(f'{kind} {obj_id}: vector_embedding is not a float32 vector, left unchanged'))
+                continue
+            new_blob = encode_embedding(vector, dtype=options['dtype'], model=model_tag)
+            converted += 1
+            bytes_before += len(blob)
+            bytes_after += len(new_blob)
+            if options['dry_run']:
+                continue  # counted only, so memory stays flat however many rows would change
+            pending.append(model(id=obj_id, vector_embedding=new_blob))
+            if len(pending) >= batch_size:
+                self.save(model, pending, batch_size)
+                pending = []
+        if pending:
+            self.save(model, pending, batch_size)
+        if converted and not options['dry_run']:
+            bump_embedding_version(kind)
+
+        verb = 'Would convert' if options['dry_run'] else 'Converted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {converted} {kind} embeddings to {options["dtype"]} '
+            f'({bytes_before} -> {bytes_after} bytes), {skipped} skipped'
+        ))
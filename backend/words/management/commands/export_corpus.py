@@ -0,0 +1,49 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from words.export import (
+    EMBEDDING_EXPORT_KINDS,
+    EXPORT_CHUNK_SIZE,
+    EXPORT_KINDS,
+    NDJSON_EXPORTERS,
+    embedding_export_dimension,
+    export_embeddings,
+)
+
+
+class Command(BaseCommand):
+    help = 'Streams topics, contrast pairs, ratings or tags as NDJSON, or embeddings as packed float32 records, to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=EXPORT_KINDS, help='Table to export')
+        parser.add_argument('--format', choices=['ndjson', 'f32'], default='ndjson', help='Output format')
+        parser.add_argument('--output', default='-', help='Output file ("-" for stdout)')
+        parser.add_argument('--vector-embedding', action='store_true', help='Include base64 embeddings in ndjson')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Rows read per database round trip')
+
+    def handle(self, *args, **options):
+        kind = options['kind']
+        if options['format'] == 'f32':
+            if kind not in EMBEDDING_EXPORT_KINDS:
+                raise CommandError('--format f32 is only available for topics and pairs')
+            dimension = embedding_export_dimension(kind)
+            chunks = export_embeddings(kind, dimension, chunk_size=options['chunk_size']) if dimension else iter(())
+        else:
+            dimension = None
+            chunks = NDJSON_EXPORTERS[kind](include_embedding=options['vector_embedding'], chunk_size=options['chunk_size'])
+
+        written = 0
+        if options['output'] == '-':
+            stream = sys.stdout.buffer
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+            stream.flush()
+            return
+        with open(options['output'], 'wb') as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+
+        details = f', dimension {dimension}' if dimension is not None else ''
+        self.stdout.write(self.style.SUCCESS(f'Exported {kind} to {options["output"]} ({written} bytes{details})'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from words.rating_aggregates import REFRESH_BATCH_SIZE, refresh_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recomputes rating_count, rating_sum, min_rating and avg_rating of every contrast pair'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REFRESH_BATCH_SIZE, help='Pairs updated per query')
+
+    def handle(self, *args, **options):
+        updated = refresh_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} contrast pairs'))
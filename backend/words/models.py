@@ -1,3 +1,6 @@
+import hashlib
+from core.ordering import random_shuffle_key
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -15,16 +18,54 @@ class Temator(models.Model):
     name = models.CharField(max_length=511, unique=True)
     source = models.CharField(max_length=100, default='standard')
     vector_embedding = models.BinaryField(null=True, blank=True)
+    # Random position in the stored shuffle behind seeded ordering (core.ordering)
+    shuffle_key = models.IntegerField(default=random_shuffle_key, db_index=True, editable=False)
+    # Nullable: topics loaded before the columns existed have no timestamps
+    created_at = models.DateTimeField(auto_now_add=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True, null=True)
 
 class ContrastPair(models.Model):
     item1 = models.CharField(max_length=100)
     item2 = models.CharField(max_length=100)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Normalized, order-independent hash of (item1, item2); see make_pair_key
+    pair_key = models.CharField(max_length=40, unique=True, null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     vector_embedding = models.BinaryField(null=True, blank=True)
+    # Random position in the stored shuffle behind seeded ordering (core.ordering)
+    shuffle_key = models.IntegerField(default=random_shuffle_key, db_index=True, editable=False)
+    # Denormalized rating aggregates, maintained by words.rating_aggregates
+    rating_count = models.PositiveIntegerField(default=0, db_index=True)
+    rating_sum = models.PositiveIntegerField(default=0)
+    min_rating = models.PositiveSmallIntegerField(null=True, blank=True, db_index=True)
+    avg_rating = models.FloatField(null=True, blank=True, db_index=True)
+
     def __str__(self):
         return f"{self.item1} vs {self.item2}"
 
+    @staticmethod
+    def make_pair_key(item1, item2):
+        """Case, whitespace and order insensitive key: 'Ogień vs woda' == 'WODA  vs ogień'."""
+        items = sorted(" ".join(item.split()).casefold() for item in (item1, item2))
+        return hashlib.sha1("\x1f".join(items).encode("utf-8")).hexdigest()
+
+    def duplicates(self):
+        """Other pairs with the same items (compared by pair_key)."""
+        return ContrastPair.objects.filter(pair_key=self.make_pair_key(self.item1, self.item2)).exclude(pk=self.pk)
+
+    def validate_unique(self, exclude=None):
+        # pair_key is computed in save(), so forms (admin included) can't check its constraint themselves
+        super().validate_unique(exclude)
+        if self.duplicates().exists():
+            raise ValidationError({NON_FIELD_ERRORS: ["This contrast pair already exists."]})
+
+    def save(self, *args, **kwargs):
+        self.pair_key = self.make_pair_key(self.item1, self.item2)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and ("item1" in update_fields or "item2" in update_fields):
+            kwargs["update_fields"] = set(update_fields) | {"pair_key"}
+        super().save(*args, **kwargs)
+
 class ContrastPairRating(models.Model):
     contrast_pair = models.ForeignKey(ContrastPair, on_delete=models.CASCADE, related_name='ratings')
     user_fingerprint = models.CharField(max_length=255)
@@ -46,18 +87,84 @@ class ContrastTag(models.Model):
         return self.name
 
 
+class ChangeLogEntry(models.Model):
+    """
+    One insert / update / delete of a synced row (see words.change_log). The id is the change
+    feed token; old entries are pruned by the prune_change_log task.
+    """
+    KIND_CHOICES = [('topic', 'Topic'), ('pair', 'Contrast pair'), ('rating', 'Rating'), ('tag', 'Tag')]
+    ACTION_CHOICES = [('insert', 'Insert'), ('update', 'Update'), ('delete', 'Delete')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.action} {self.kind} {self.object_id}"
 
 
 class CypherArenaPerplexityDeepResearch(models.Model):
     data_response = models.JSONField(default=dict)
-    start_date = models.DateTimeField()
+    start_date = models.DateTimeField(db_index=True)
     end_date = models.DateTimeField()
     search_type = models.CharField(null=True, blank=True, max_length=255)  ##deep_research, normal_search
     news_source = models.CharField(null=True, blank=True, max_length=255)  ##news, showbiznes, sport, tech, science, politics
+    # Assistant message text of data_response, extracted on save (see extract_content) so that
+    # summary reads don't load the JSON; NULL on rows saved before it existed (backfill_news_content)
+    content = models.TextField(null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = "Perplexity Deep Research Records"
         verbose_name_plural = "Perplexity Deep Research Records"
+        constraints = [
+            # One record per search window (see perplexity_deep_research.search_window)
+            models.UniqueConstraint(fields=['news_source', 'start_date', 'end_date'], name='unique_news_window'),
+        ]
+
+    @staticmethod
+    def extract_content(data_response):
+        """Text of a chat completion response (choices[0].message.content), or a top level "content" string."""
+        if not isinstance(data_response, dict):
+            return ""
+        choices = data_response.get("choices")
+        if isinstance(choices, list) and choices and isinstance(choices[0], dict):
+            message = choices[0].get("message")
+            if isinstance(message, dict) and isinstance(message.get("content"), str):
+                return message["content"]
+        content = data_response.get("content")
+        return content if isinstance(content, str) else ""
+
+    def save(self, *args, **kwargs):
+        self.content = self.extract_content(self.data_response)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "data_response" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | {"content"}
+        super().save(*args, **kwargs)
+
+
+class ExternalResponseCache(models.Model):
+    """Cached response of an external LLM / search call (see words/response_cache.py)."""
+    # sha256 of (model, system prompt, user prompt)
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=255)
+    response = models.JSONField()
+    # Bytes of the serialized response, for the size bound
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(db_index=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.key[:12]}"
+
+
+class ExternalResponseCacheCounter(models.Model):
+    """Hit / miss / bypass count of the response cache, shared by all processes."""
+    name = models.CharField(max_length=20, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
 
 
 ##### scraped models
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Full-text search over the extracted news text (CypherArenaPerplexityDeepResearch.content).
+
+SQLite: an external content FTS5 table (words_news_fts) kept in sync by
+triggers on the news table, ranked with bm25(). PostgreSQL: a GIN index on
+to_tsvector('simple', content), ranked with ts_rank(). The index is plain DDL
+the ORM does not model: it is created after migrate (post_migrate) or by the
+build_news_search_index command, never by a search. Other backends, and a
+database whose index is missing, fall back to a case-insensitive scan ordered
+by date (rank None).
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import CypherArenaPerplexityDeepResearch
+
+NEWS_TABLE = CypherArenaPerplexityDeepResearch._meta.db_table
+NEWS_FTS_TABLE = "words_news_fts"
+NEWS_FTS_INDEX = "words_news_content_fts"
+SNIPPET_TOKENS = 16
+
+_SQLITE_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE {NEWS_FTS_TABLE} USING fts5(
+        content, content='{NEWS_TABLE}', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER {NEWS_FTS_TABLE}_insert AFTER INSERT ON {NEWS_TABLE} BEGIN
+        INSERT INTO {NEWS_FTS_TABLE}(rowid, content) VALUES (new.id, coalesce(new.content, ''));
+    END""",
+    f"""CREATE TRIGGER {NEWS_FTS_TABLE}_delete AFTER DELETE ON {NEWS_TABLE} BEGIN
+        INSERT INTO {NEWS_FTS_TABLE}({NEWS_FTS_TABLE}, rowid, content) VALUES ('delete', old.id, coalesce(old.content, ''));
+    END""",
+    f"""CREATE TRIGGER {NEWS_FTS_TABLE}_update AFTER UPDATE OF content ON {NEWS_TABLE} BEGIN
+        INSERT INTO {NEWS_FTS_TABLE}({NEWS_FTS_TABLE}, rowid, content) VALUES ('delete', old.id, coalesce(old.content, ''));
+        INSERT INTO {NEWS_FTS_TABLE}(rowid, content) VALUES (new.id, coalesce(new.content, ''));
+    END""",
+    # Index the rows written before the table existed
+    f"INSERT INTO {NEWS_FTS_TABLE}({NEWS_FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def _sqlite_index_exists(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [NEWS_FTS_TABLE])
+    return cursor.fetchone() is not None
+
+
+def _postgresql_index_exists(cursor):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [NEWS_FTS_INDEX])
+    return cursor.fetchone()[0]
+
+
+def news_search_index_exists(using=DEFAULT_DB_ALIAS):
+    """True if the full-text index of this database exists (always False on other backends)."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            return _sqlite_index_exists(cursor)
+        if connection.vendor == "postgresql":
+            return _postgresql_index_exists(cursor)
+    return False
+
+
+def _news_table_ready(connection):
+    """True once migrations created the news table with its content column."""
+    with connection.cursor() as cursor:
+        if NEWS_TABLE not in connection.introspection.table_names(cursor):
+            return False
+        columns = connection.introspection.get_table_description(cursor, NEWS_TABLE)
+    return any(column.name == "content" for column in columns)
+
+
+def ensure_news_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Create the full-text index if it is missing. Returns True when it was
+    created. Does nothing before migrations have added the news content column
+    (post_migrate also runs after partial migrates and on a fresh database).
+    """
+    connection = connections[using]
+    if connection.vendor not in ("sqlite", "postgresql") or not _news_table_ready(connection) \
+            or news_search_index_exists(using):
+        return False
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            for statement in _SQLITE_SCHEMA:
+                cursor.execute(statement)
+            return True
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {NEWS_FTS_INDEX} ON {NEWS_TABLE} "
+                f"USING GIN (to_tsvector('simple', coalesce(content, '')))"
+            )
+            return True
+    return False
+
+
+def _fts5_query(query):
+    """User text as an FTS5 query: every word quoted (no operator injection), all required."""
+    terms = query.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _filters(connection, start_time, end_time, news_source, alias):
+    conditions, params = [], []
+    # Raw SQL bypasses the ORM's datetime handling (time zones, SQLite text format)
+    if start_time is not None:
+        conditions.append(f"{alias}.start_date >= %s")
+        params.append(connection.ops.adapt_datetimefield_value(start_time))
+    if end_time is not None:
+        conditions.append(f"{alias}.end_date <= %s")
+        params.append(connection.ops.adapt_datetimefield_value(end_time))
+    if news_source:
+        conditions.append(f"{alias}.news_source = %s")
+        params.append(news_source)
+    return "".join(f" AND {condition}" for condition in conditions), params
+
+
+def _scan_news(query, start_time, end_time, news_source, limit, using):
+    """Case-insensitive substring match of every word, newest first (no index needed)."""
+    queryset = CypherArenaPerplexityDeepResearch.objects.using(using)
+    for term in query.split():
+        queryset = queryset.filter(content__icontains=term)
+    if start_time is not None:
+        queryset = queryset.filter(start_date__gte=start_time)
+    if end_time is not None:
+        queryset = queryset.filter(end_date__lte=end_time)
+    if news_source:
+        queryset = queryset.filter(news_source=news_source)
+    rows = queryset.order_by("-start_date").values_list("id", "start_date", "end_date", "news_source", "content")[:limit]
+    return [
+        {"id": row[0], "start_date": row[1], "end_date": row[2], "news_source": row[3],
+         "rank": None, "snippet": (row[4] or "")[:200]}
+        for row in rows
+    ]
+
+
+def search_news(query, start_time=None, end_time=None, news_source=None, limit=20, using=DEFAULT_DB_ALIAS):
+    """
+    Best matches of `query` in the news text, as dicts with id, start_date,
+    end_date, news_source, rank (higher is better) and a snippet.
+    """
+    if not query.split():
+        return []
+    connection = connections[using]
+    if not news_search_index_exists(using):
+        return _scan_news(query, start_time, end_time, news_source, limit, using)
+
+    where, params = _filters(connection, start_time, end_time, news_source, "news")
+    if connection.vendor == "sqlite":
+        sql = f"""
+            SELECT news.id, -bm25({NEWS_FTS_TABLE}) AS rank,
+                   snippet({NEWS_FTS_TABLE}, 0, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet
+            FROM {NEWS_FTS_TABLE} JOIN {NEWS_TABLE} AS news ON news.id = {NEWS_FTS_TABLE}.rowid
+            WHERE {NEWS_FTS_TABLE} MATCH %s{where}
+            ORDER BY bm25({NEWS_FTS_TABLE}), news.start_date DESC
+            LIMIT %s
+        """
+        params = [_fts5_query(query), *params, limit]
+    else:
+        sql = f"""
+            SELECT news.id, ts_rank(to_tsvector('simple', coalesce(news.content, '')), query) AS rank,
+                   ts_headline('simple', coalesce(news.content, ''), query,
+                               'StartSel=[, StopSel=], MaxWords={SNIPPET_TOKENS}, MinWords=5') AS snippet
+            FROM {NEWS_TABLE} AS news, plainto_tsquery('simple', %s) AS query
+            WHERE to_tsvector('simple', coalesce(news.content, '')) @@ query{where}
+            ORDER BY rank DESC, news.start_date DESC
+            LIMIT %s
+        """
+        params = [query, *params, limit]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        matches = cursor.fetchall()
+    records = CypherArenaPerplexityDeepResearch.objects.using(using).only(
+        "id", "start_date", "end_date", "news_source"
+    ).in_bulk([obj_id for obj_id, _, _ in matches])
+    return [
+        {"id": obj_id, "start_date": records[obj_id].start_date, "end_date": records[obj_id].end_date,
+         "news_source": records[obj_id].news_source, "rank": rank, "snippet": snippet}
+        for obj_id, rank, snippet in matches if obj_id in records
+    ]
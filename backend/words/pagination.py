@@ -0,0 +1,158 @@
+import base64
+import json
+from collections import OrderedDict
+
+from core.ordering import SeededShuffle
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CustomPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'count' # Items per page
+    max_page_size = 5000 # Increased max page size as requested (using the higher value for now)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('total', self.page.paginator.count), # Total items across all pages
+            ('page', self.page.number), # Current page number
+            ('count', self.get_page_size(self.request)), # Items on the current page
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+def wants_cursor_pagination(request):
+    """Keyset pagination is opt-in with ?pagination=cursor (next links also carry ?cursor=)."""
+    return (request.query_params.get('pagination') == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params)
+
+
+def requested_ordering(request, fields):
+    """
+    `fields` ascending with ?order=asc, descending with ?order=desc (the default).
+    Raises ValueError for any other value.
+
+    Crawl with order=asc: rows inserted during the crawl sort after the cursor
+    and are reached, while a descending crawl has already passed them.
+    """
+    order = request.query_params.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'.")
+    return tuple(fields) if order == 'asc' else tuple(f'-{name}' for name in fields)
+
+
+class KeysetPagination:
+    """
+    Cursor (keyset) pagination over a fixed ordering that ends with a unique
+    column, e.g. ('-created_at', '-id') or ('name', 'id'). Keys that are not
+    model fields are integer annotations. A core.ordering.SeededShuffle is
+    paged in its own order, with the ordering (SHUFFLE_KEY, 'id').
+
+    Every page is one range query continuing after the last row of the
+    previous page (no OFFSET), so crawling the whole table is linear and rows
+    inserted meanwhile can't make pages skip or repeat. COUNT(*) only runs
+    with ?total=true.
+    """
+    page_size = 10
+    page_size_query_param = 'count'
+    max_page_size = 5000
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+
+    def __init__(self, ordering, max_page_size=None):
+        self.ordering = tuple(ordering)
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+        if max_page_size is not None:
+            self.max_page_size = max_page_size
+
+    @property
+    def columns(self):
+        """Columns the queryset has to load to build the next cursor."""
+        return [name for name, _ in self.keys]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    @staticmethod
+    def _model_field(model, name):
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def encode_cursor(self, obj):
+        values = []
+        for name, _ in self.keys:
+            field = self._model_field(type(obj), name)
+            values.append(field.value_to_string(obj) if field else int(getattr(obj, name)))
+        return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor, model):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if not isinstance(values, list) or len(values) != len(self.keys):
+                raise ValueError
+            decoded = []
+            for (name, _), value in zip(self.keys, values):
+                field = self._model_field(model, name)
+                decoded.append(field.to_python(value) if field else int(value))
+            return decoded
+        except Exception:
+            raise ValidationError({self.cursor_query_param: 'Invalid cursor.'})
+
+    def _after(self, values):
+        """Rows strictly after the key `values` in this ordering."""
+        condition = Q()
+        for position, (name, descending) in enumerate(self.keys):
+            equal = {prefix: values[index] for index, (prefix, _) in enumerate(self.keys[:position])}
+            condition |= Q(**equal, **{f'{name}__{"lt" if descending else "gt"}': values[position]})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        self.total = None
+        if request.query_params.get(self.total_query_param, 'false').lower() == 'true':
+            self.total = queryset.count()
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if isinstance(queryset, SeededShuffle):
+            # Already in its (SHUFFLE_KEY, id) order
+            if cursor:
+                queryset = queryset.after(*self.decode_cursor(cursor, queryset.model))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+            if cursor:
+                queryset = queryset.filter(self._after(self.decode_cursor(cursor, queryset.model)))
+
+        rows = list(queryset[:page_size + 1])
+        self.page_size_used = page_size
+        self.next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'pagination')
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.total is not None:
+            response['total'] = self.total
+        response['count'] = self.page_size_used
+        response['next'] = self.get_next_link()
+        response['next_cursor'] = self.next_cursor
+        response['results'] = data
+        return Response(response)
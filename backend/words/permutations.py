@@ -0,0 +1,52 @@
+"""
+Seeded pseudo-random permutations of [0, size) evaluated one index at a time.
+
+Used to walk a table in shuffled order while only storing (seed, offset) per
+client instead of the list of everything already returned.
+"""
+
+_MASK64 = (1 << 64) - 1
+
+
+def mix64(value):
+    """splitmix64 finalizer: cheap, well-distributed 64-bit integer hash."""
+    value = (value + 0x9E3779B97F4A7C15) & _MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return value ^ (value >> 31)
+
+
+class FeistelPermutation:
+    """
+    Bijection on [0, size) built from a balanced Feistel network over the
+    smallest even-bit power of two >= size, with cycle walking to stay inside
+    the range. Each lookup is O(1) on average (at most ~4 network passes).
+    """
+    ROUNDS = 4
+
+    def __init__(self, size, seed):
+        if size < 0:
+            raise ValueError("size must be non-negative")
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self._half_bits = bits // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._keys = [mix64(seed * self.ROUNDS + round_number) for round_number in range(self.ROUNDS)]
+
+    def __len__(self):
+        return self.size
+
+    def _encrypt(self, value):
+        left, right = value >> self._half_bits, value & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ (mix64(right ^ key) & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("permutation index out of range")
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
@@ -1,66 +1,313 @@
+"""
+Perplexity news searches, saved as CypherArenaPerplexityDeepResearch records.
+
+Requests go through an asyncio client: one aiohttp session (a shared
+connection pool) per batch, at most PERPLEXITY_MAX_CONCURRENCY requests in
+flight, a PERPLEXITY_TIMEOUT per call and up to PERPLEXITY_MAX_RETRIES
+retries with exponential backoff and full jitter on 429 / 5xx responses and
+connection errors (a Retry-After header is honoured). search_many fetches all
+(date window, category) searches of a batch in parallel and saves the
+responses from the calling thread, since the ORM is synchronous.
+
+Responses are cached by prompt (words/response_cache.py): a search whose
+rendered prompt was fetched before is answered without a remote call unless
+bypass_cache is set.
+
+search_window is the idempotent unit of the scheduled searches (see
+words.tasks): a (category, start day, end day) window that already has a
+record is skipped, so a rerun only fetches what is missing. A Redis lock per
+window (SEARCH_WINDOW_LOCK_URL) keeps concurrent workers from paying for the
+same window twice, and the unique (news_source, start_date, end_date)
+constraint keeps them from saving it twice.
+"""
+import asyncio
 import os
-import requests
+import random
+from datetime import datetime, time, timedelta
+
+import aiohttp
+import redis
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
 from .models import CypherArenaPerplexityDeepResearch
-from core import settings
+from .response_cache import get_cached_response, response_cache_key, store_response
+
 # Configuration
 SEARCH_TYPES = {
     "general_news": "general_news_search.md",
     "polish_showbiznes": "polish_showbiznes_search.md",
 }
 
+BASE_PATH = os.path.join(os.path.dirname(__file__), "prompts", "perplexity_deep_research")
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
 
-PERPLEXITY_API_KEY = settings.PERPLEXITY_API_KEY
-BASE_PATH = "/home/wojtek/It_Projects/freestyle_app_project/backend/words/prompts/perplexity_deep_research"
 
-def search_internet(start_date, end_date, search_model="sonar-pro", name="general_news"):
-    """Search the internet for news in a given date range and save results to database"""
+class PerplexityError(Exception):
+    """
+    Some searches of a batch failed; `errors` maps (start_date, end_date, name)
+    to the exception, `records` is what search_many returns, None for failures.
+    """
+
+    def __init__(self, errors, records=None):
+        self.errors = errors
+        self.records = records
+        super().__init__(f"{len(errors)} Perplexity search(es) failed: " + "; ".join(
+            f"{name} {start:%Y-%m-%d}..{end:%Y-%m-%d}: {error!r}" for (start, end, name), error in errors.items()
+        ))
+
+
+def build_messages(start_date, end_date, name):
+    """Chat messages of the `name` search over [start_date, end_date]."""
     start_date_str = start_date.strftime("%Y-%m-%d")
     end_date_str = end_date.strftime("%Y-%m-%d")
-    print(f"Searching: {name} from {start_date_str} to {end_date_str} using {search_model}")
-    
+
     # Get prompt template
     template_file = SEARCH_TYPES.get(name)
     if not template_file:
         raise ValueError(f"Unknown search type: {name}")
-    
-    with open(f"{BASE_PATH}/{template_file}", "r", encoding="utf-8") as file:
+
+    with open(os.path.join(BASE_PATH, template_file), "r", encoding="utf-8") as file:
         user_prompt = file.read().replace("{{start_date_str}}", start_date_str).replace("{{end_date_str}}", end_date_str)
-    
+
     # Create system prompt with date placeholders replaced
     system_prompt = f"Jesteś specjalistycznym asystentem przeprowadzającym przegląd wydarzeń z okresu od {start_date_str} do {end_date_str}."
-    
-    # Make API request
-    try:
-        response = requests.post(
-            "https://api.perplexity.ai/chat/completions",
-            headers={"Authorization": f"Bearer {PERPLEXITY_API_KEY}"},
-            json={
-                "model": search_model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-            },
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Seconds to wait before retry `attempt` (0-based): Retry-After if given, else full jitter."""
+    if retry_after is not None:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass  # an HTTP date; fall back to the computed delay
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+async def _post_chat_completion(session, semaphore, url, payload, timeout, max_retries):
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        # The slot is released while backing off
+        async with semaphore:
+            try:
+                async with session.post(url, json=payload, timeout=timeout) as response:
+                    if response.status in RETRY_STATUSES and attempt < max_retries:
+                        retry_after = response.headers.get("Retry-After")
+                    else:
+                        response.raise_for_status()
+                        return await response.json()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == max_retries:
+                    raise
+        await asyncio.sleep(backoff_delay(attempt, retry_after))
+
+
+def build_payload(start_date, end_date, name, search_model="sonar-pro"):
+    """Chat completions request body of the `name` search over [start_date, end_date]."""
+    return {"model": search_model, "messages": build_messages(start_date, end_date, name)}
+
+
+def payload_cache_key(payload):
+    system_prompt, user_prompt = (message["content"] for message in payload["messages"])
+    return response_cache_key(payload["model"], system_prompt, user_prompt)
+
+
+async def fetch_searches(payloads, max_concurrency=None, timeout=None, max_retries=None):
+    """
+    Post the chat completion requests `payloads` concurrently. Returns one
+    item per payload, in order: the response JSON or the exception raised.
+    """
+    max_concurrency = max_concurrency or settings.PERPLEXITY_MAX_CONCURRENCY
+    timeout = aiohttp.ClientTimeout(total=timeout or settings.PERPLEXITY_TIMEOUT)
+    max_retries = settings.PERPLEXITY_MAX_RETRIES if max_retries is None else max_retries
+    url = settings.PERPLEXITY_BASE_URL.rstrip("/") + "/chat/completions"
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers={"Authorization": f"Bearer {settings.PERPLEXITY_API_KEY}"},
+    ) as session:
+        return await asyncio.gather(
+            *(_post_chat_completion(session, semaphore, url, payload, timeout, max_retries) for payload in payloads),
+            return_exceptions=True,
         )
-        response.raise_for_status()
-        response_data = response.json()
-        
+
+
+def search_many(jobs, search_model="sonar-pro", bypass_cache=False, **client_options):
+    """
+    Fetch the searches `jobs` ((start_date, end_date, name) tuples) in parallel
+    and save each response. Searches whose prompt is in the response cache are
+    not fetched again unless `bypass_cache`. Successful searches are saved even
+    when others fail; PerplexityError is raised afterwards listing the failures.
+    Returns one item per job: the created record, or None when the window
+    was saved meanwhile (unique constraint).
+    """
+    jobs = list(jobs)
+    # Built before any request, so an unknown search type fails the whole batch early
+    payloads = [build_payload(start_date, end_date, name, search_model) for start_date, end_date, name in jobs]
+    keys = [payload_cache_key(payload) for payload in payloads]
+    responses = [get_cached_response(key, bypass=bypass_cache) for key in keys]
+
+    missing = [index for index, response_data in enumerate(responses) if response_data is None]
+    for index in missing:
+        start_date, end_date, name = jobs[index]
+        print(f"Searching: {name} from {start_date:%Y-%m-%d} to {end_date:%Y-%m-%d} using {search_model}")
+    if missing:
+        fetched = asyncio.run(fetch_searches([payloads[index] for index in missing], **client_options))
+        for index, response_data in zip(missing, fetched):
+            if not isinstance(response_data, BaseException):
+                store_response(keys[index], search_model, response_data)
+            responses[index] = response_data
+
+    records, errors = [], {}
+    for (start_date, end_date, name), response_data in zip(jobs, responses):
+        if isinstance(response_data, BaseException):
+            print(f"Error during search: {name}: {response_data!r}")
+            errors[(start_date, end_date, name)] = response_data
+            records.append(None)
+            continue
         # Save to database
-        search_record = CypherArenaPerplexityDeepResearch.objects.create(
-            start_date=start_date,
-            end_date=end_date,
-            data_response=response_data,
-            search_type=search_model,
-            news_source=name
-        )
-        
+        try:
+            with transaction.atomic():
+                search_record = CypherArenaPerplexityDeepResearch.objects.create(
+                    start_date=start_date,
+                    end_date=end_date,
+                    data_response=response_data,
+                    search_type=search_model,
+                    news_source=name
+                )
+        except IntegrityError:
+            print(f"Search record already exists: {name} from {start_date:%Y-%m-%d} to {end_date:%Y-%m-%d}")
+            records.append(None)
+            continue
         print(f"Search record created with ID: {search_record.id}")
-        return response_data
-        
-    except Exception as e:
-        print(f"Error during search: {e}")
-        raise
+        records.append(search_record)
+    if errors:
+        raise PerplexityError(errors, records)
+    return records
+
+
+def search_internet(start_date, end_date, search_model="sonar-pro", name="general_news", bypass_cache=False):
+    """Search the internet for news in a given date range and save results to database"""
+    try:
+        record, = search_many([(start_date, end_date, name)], search_model=search_model, bypass_cache=bypass_cache)
+    except PerplexityError as e:
+        # Single search: surface the underlying error as before
+        raise e.errors[(start_date, end_date, name)]
+    if record is None:
+        record = CypherArenaPerplexityDeepResearch.objects.get(news_source=name, start_date=start_date, end_date=end_date)
+    return record.data_response
+
+
+def date_windows(start_day, end_day, window_days):
+    """
+    Non-overlapping (start_day, end_day) windows covering the days
+    [start_day, end_day], each ending `window_days` days after it starts
+    (the last one may be shorter).
+    """
+    windows = []
+    while start_day <= end_day:
+        windows.append((start_day, min(start_day + timedelta(days=window_days), end_day)))
+        start_day += timedelta(days=window_days + 1)
+    return windows
 
 
+def search_window_key(name, start_day, end_day):
+    """Idempotency key of the `name` search over the days [start_day, end_day]."""
+    return f"perplexity:{name}:{start_day:%Y-%m-%d}:{end_day:%Y-%m-%d}"
+
+
+def search_window_exists(name, start_day, end_day):
+    return CypherArenaPerplexityDeepResearch.objects.filter(
+        news_source=name, start_date__date=start_day, end_date__date=end_day
+    ).exists()
+
+
+def search_window_lock(key, timeout):
+    """Non-blocking Redis lock of a window, or None when SEARCH_WINDOW_LOCK_URL is empty."""
+    if not settings.SEARCH_WINDOW_LOCK_URL:
+        return None
+    client = redis.Redis.from_url(settings.SEARCH_WINDOW_LOCK_URL, socket_connect_timeout=5)
+    return client.lock(key, timeout=timeout, blocking=False)
+
+
+def search_window(name, start_day, end_day, search_model="sonar-pro", bypass_cache=False):
+    """
+    Search and save the `name` news of the days [start_day, end_day], unless
+    that window already has a record (or is being fetched by another worker).
+    Returns {"key", "status": created / skipped / running / failed, ...}.
+    """
+    result, = search_windows([(name, start_day, end_day)], search_model=search_model, bypass_cache=bypass_cache)
+    return result
+
+
+def _acquire_window_lock(key):
+    """(acquired, lock): the lock to release later, None when there is no lock server."""
+    # Held for the longest a search can take, retries included
+    lock_timeout = int(settings.PERPLEXITY_TIMEOUT * (settings.PERPLEXITY_MAX_RETRIES + 1) + BACKOFF_MAX * settings.PERPLEXITY_MAX_RETRIES)
+    lock = search_window_lock(key, lock_timeout)
+    try:
+        if lock is not None and not lock.acquire():
+            return False, None
+    except redis.RedisError as e:
+        # The unique constraint still prevents a second record
+        print(f"Search window lock unavailable, searching unlocked: {e!r}")
+        lock = None
+    return True, lock
+
+
+def search_windows(windows, search_model="sonar-pro", bypass_cache=False):
+    """
+    search_window for several (name, start_day, end_day) windows: the ones
+    not skipped are fetched together by one search_many call, so they share
+    the concurrent client. Returns one result per window, in order.
+    """
+    results = [None] * len(windows)
+    jobs, pending, locks = [], [], []
+    try:
+        for position, (name, start_day, end_day) in enumerate(windows):
+            key = search_window_key(name, start_day, end_day)
+            if search_window_exists(name, start_day, end_day):
+                results[position] = {"key": key, "status": "skipped"}
+                continue
+            acquired, lock = _acquire_window_lock(key)
+            if not acquired:
+                results[position] = {"key": key, "status": "running"}
+                continue
+            if lock is not None:
+                locks.append(lock)
+            if search_window_exists(name, start_day, end_day):
+                results[position] = {"key": key, "status": "skipped"}
+                continue
+            start_date = timezone.make_aware(datetime.combine(start_day, time.min))
+            end_date = timezone.make_aware(datetime.combine(end_day, time.min))
+            jobs.append((start_date, end_date, name))
+            pending.append((position, key))
 
-## example usage
\ No newline at end of file
+        errors = {}
+        try:
+            records = search_many(jobs, search_model=search_model, bypass_cache=bypass_cache) if jobs else []
+        except PerplexityError as e:
+            records, errors = e.records, e.errors
+        for job, (position, key), record in zip(jobs, pending, records):
+            if job in errors:
+                results[position] = {"key": key, "status": "failed", "error": repr(errors[job])}
+            elif record is None:
+                results[position] = {"key": key, "status": "skipped"}
+            else:
+                results[position] = {"key": key, "status": "created", "id": record.id}
+        return results
+    finally:
+        for lock in locks:
+            try:
+                lock.release()
+            except redis.RedisError:
+                pass  # expired (a very slow search) or Redis went away
@@ -0,0 +1,132 @@
+"""
+Maintenance of the denormalized rating aggregates stored on ContrastPair
+(rating_count, rating_sum, min_rating, avg_rating).
+
+Single rating writes adjust the aggregates with F-expressions in one UPDATE,
+so concurrent raters never lose increments. Bulk paths recompute the
+aggregates of the touched pairs set-based from ContrastPairRating.
+"""
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, Min, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Least, NullIf
+from django.utils import timezone
+
+from .change_log import record_query_changes
+from .models import ContrastPair, ContrastPairRating
+from .utils import chunked
+
+REFRESH_BATCH_SIZE = 1000
+
+
+def _avg_expression(sum_delta, count_delta):
+    return Cast(F('rating_sum') + sum_delta, FloatField()) / NullIf(F('rating_count') + count_delta, 0)
+
+
+def _min_rating_subquery():
+    return Subquery(
+        ContrastPairRating.objects.filter(contrast_pair=OuterRef('pk'))
+        .order_by()
+        .values('contrast_pair')
+        .annotate(value=Min('rating'))
+        .values('value')[:1]
+    )
+
+
+def apply_rating_added(pair_id, value):
+    ContrastPair.objects.filter(pk=pair_id).update(
+        rating_count=F('rating_count') + 1,
+        rating_sum=F('rating_sum') + value,
+        min_rating=Least(Coalesce(F('min_rating'), Value(value)), Value(value)),
+        avg_rating=_avg_expression(value, 1),
+    )
+
+
+def apply_rating_changed(pair_id, old_value, new_value):
+    if old_value == new_value:
+        return
+    ContrastPair.objects.filter(pk=pair_id).update(
+        rating_sum=F('rating_sum') + (new_value - old_value),
+        # Lowering a rating can only lower the minimum; raising it may need a rescan
+        min_rating=Least(Coalesce(F('min_rating'), Value(new_value)), Value(new_value))
+        if new_value < old_value else _min_rating_subquery(),
+        avg_rating=_avg_expression(new_value - old_value, 0),
+    )
+
+
+def apply_rating_removed(pair_id, value):
+    """Call after the rating row is deleted."""
+    ContrastPair.objects.filter(pk=pair_id).update(
+        rating_count=F('rating_count') - 1,
+        rating_sum=F('rating_sum') - value,
+        min_rating=_min_rating_subquery(),
+        avg_rating=_avg_expression(-value, -1),
+    )
+
+
+def upsert_rating(pair_id, user_fingerprint, value):
+    """Create or change one user's rating of a pair and keep the aggregates in sync."""
+    with transaction.atomic():
+        previous = (
+            ContrastPairRating.objects.select_for_update()
+            .filter(contrast_pair_id=pair_id, user_fingerprint=user_fingerprint)
+            .values_list('rating', flat=True)
+            .first()
+        )
+        ContrastPairRating.objects.update_or_create(
+            contrast_pair_id=pair_id,
+            user_fingerprint=user_fingerprint,
+            defaults={'rating': value},
+        )
+        if previous is None:
+            apply_rating_added(pair_id, value)
+        else:
+            apply_rating_changed(pair_id, previous, value)
+
+
+def bulk_upsert_ratings(user_fingerprint, ratings, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Upsert {pair_id: rating} for one user with INSERT ... ON CONFLICT UPDATE
+    in batches, then recompute the aggregates of the touched pairs.
+    """
+    objs = [
+        ContrastPairRating(contrast_pair_id=pair_id, user_fingerprint=user_fingerprint, rating=value)
+        for pair_id, value in ratings.items()
+    ]
+    started = timezone.now()
+    with transaction.atomic():
+        ContrastPairRating.objects.bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['contrast_pair', 'user_fingerprint'],
+            update_fields=['rating', 'updated_at'],
+        )
+        refresh_rating_aggregates(ratings.keys(), batch_size=batch_size)
+        # bulk_create sends no signals; every upserted row has a fresh updated_at,
+        # and created_at tells inserted rows from updated ones
+        record_query_changes(
+            ContrastPairRating.objects.filter(user_fingerprint=user_fingerprint, updated_at__gte=started),
+            Case(When(created_at__gte=started, then=Value('insert')), default=Value('update')),
+        )
+
+
+def refresh_rating_aggregates(pair_ids=None, batch_size=REFRESH_BATCH_SIZE):
+    """
+    Recompute the aggregates from ContrastPairRating for the given pairs
+    (all pairs when pair_ids is None), one UPDATE per batch.
+    Returns the number of updated pairs.
+    """
+    ratings = ContrastPairRating.objects.filter(contrast_pair=OuterRef('pk')).order_by().values('contrast_pair')
+    aggregates = {
+        'rating_count': Coalesce(Subquery(ratings.annotate(value=Count('id')).values('value')[:1]), 0),
+        'rating_sum': Coalesce(Subquery(ratings.annotate(value=Sum('rating')).values('value')[:1]), 0),
+        'min_rating': Subquery(ratings.annotate(value=Min('rating')).values('value')[:1]),
+        'avg_rating': Subquery(ratings.annotate(value=Avg('rating')).values('value')[:1]),
+    }
+
+    if pair_ids is None:
+        pair_ids = list(ContrastPair.objects.order_by('pk').values_list('pk', flat=True))
+    updated = 0
+    for batch in chunked(pair_ids, batch_size):
+        updated += ContrastPair.objects.filter(pk__in=batch).update(**aggregates)
+    return updated
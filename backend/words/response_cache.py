@@ -0,0 +1,155 @@
+"""
+Persistent cache of external LLM / search responses, keyed by the sha256 of
+(model, system prompt, rendered user prompt).
+
+Entries live in the ExternalResponseCache table, so every web and Celery
+process shares them. An entry is served for RESPONSE_CACHE_TTL seconds after
+it was fetched. When the stored responses exceed RESPONSE_CACHE_MAX_BYTES,
+the least recently used entries are evicted. Callers pass bypass=True to
+force a remote call; the fresh response still replaces the cached one. Hit,
+miss and bypass counts are ExternalResponseCacheCounter rows, incremented in
+the database, so they add up across processes (response_cache_stats).
+
+The total size of the stored responses is one more counter row (adjusted by
+every store), so a store only scans the table when the bound is exceeded;
+eviction then recomputes the total, which also corrects any drift. Expired
+entries are never served and are deleted by eviction (the
+prune_response_cache task runs it periodically).
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ExternalResponseCache, ExternalResponseCacheCounter
+from .utils import chunked
+
+RESPONSE_CACHE_COUNTERS = ("hits", "misses", "bypassed")
+STORED_BYTES_COUNTER = "stored_bytes"
+
+
+def response_cache_key(model, system_prompt, user_prompt):
+    payload = json.dumps([model, system_prompt or "", user_prompt or ""], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _count(counter):
+    counters = ExternalResponseCacheCounter.objects.filter(name=counter)
+    if counters.update(value=F("value") + 1):
+        return
+    try:
+        with transaction.atomic():
+            ExternalResponseCacheCounter.objects.create(name=counter, value=1)
+    except IntegrityError:
+        # Created concurrently by another process
+        counters.update(value=F("value") + 1)
+
+
+def _stored_bytes_in_table():
+    return ExternalResponseCache.objects.aggregate(total=Sum("size"))["total"] or 0
+
+
+def _set_stored_bytes(total):
+    ExternalResponseCacheCounter.objects.update_or_create(name=STORED_BYTES_COUNTER, defaults={"value": total})
+
+
+def _add_stored_bytes(delta):
+    """Adjust the stored size counter by `delta` bytes and return the new total."""
+    counters = ExternalResponseCacheCounter.objects.filter(name=STORED_BYTES_COUNTER)
+    # Never below zero: concurrent replacements of one key can make it drift
+    if not counters.update(value=Greatest(F("value") + delta, 0)):
+        # No counter yet (e.g. entries stored before it existed): start from the real total
+        try:
+            with transaction.atomic():
+                _set_stored_bytes(_stored_bytes_in_table())
+        except IntegrityError:
+            pass  # created concurrently by another process
+    return counters.values_list("value", flat=True).first() or 0
+
+
+def response_cache_stats():
+    """Hit / miss / bypass counts of all processes."""
+    stored = dict(ExternalResponseCacheCounter.objects.values_list("name", "value"))
+    return {counter: stored.get(counter, 0) for counter in RESPONSE_CACHE_COUNTERS}
+
+
+def get_cached_response(key, bypass=False):
+    """The cached response of `key` if there is a fresh one (counted as hit / miss / bypass), else None."""
+    if bypass:
+        _count("bypassed")
+        return None
+    now = timezone.now()
+    fresh = ExternalResponseCache.objects.filter(key=key, created_at__gt=now - timedelta(seconds=settings.RESPONSE_CACHE_TTL))
+    response = fresh.values_list("response", flat=True).first()
+    if response is None:
+        _count("misses")
+        return None
+    fresh.update(last_used_at=now)
+    _count("hits")
+    return response
+
+
+def store_response(key, model, response):
+    """Cache `response` under `key` (replacing an older entry), then enforce the size bound."""
+    now = timezone.now()
+    values = {
+        "model": model,
+        "response": response,
+        "size": len(json.dumps(response, ensure_ascii=False).encode("utf-8")),
+        "created_at": now,
+        "last_used_at": now,
+    }
+    try:
+        with transaction.atomic():
+            previous = ExternalResponseCache.objects.select_for_update().filter(key=key).values_list("size", flat=True).first()
+            ExternalResponseCache.objects.update_or_create(key=key, defaults=values)
+    except IntegrityError:
+        return  # stored concurrently by another process
+    if _add_stored_bytes(values["size"] - (previous or 0)) > settings.RESPONSE_CACHE_MAX_BYTES:
+        evict_responses()
+
+
+def evict_responses(max_bytes=None):
+    """
+    Delete expired entries, then the least recently used ones until the
+    responses fit in `max_bytes` (RESPONSE_CACHE_MAX_BYTES by default).
+    Returns the number of deleted entries.
+    """
+    if max_bytes is None:
+        max_bytes = settings.RESPONSE_CACHE_MAX_BYTES
+    expired = timezone.now() - timedelta(seconds=settings.RESPONSE_CACHE_TTL)
+    deleted, _ = ExternalResponseCache.objects.filter(created_at__lte=expired).delete()
+
+    total = _stored_bytes_in_table()
+    victims = []
+    if total > max_bytes:
+        for entry_id, size in ExternalResponseCache.objects.order_by("last_used_at", "id").values_list("id", "size").iterator():
+            victims.append(entry_id)
+            total -= size
+            if total <= max_bytes:
+                break
+    for chunk in chunked(victims, 1000):
+        deleted += ExternalResponseCache.objects.filter(id__in=chunk).delete()[0]
+    _set_stored_bytes(total)
+    return deleted
+
+
+def cached_response(model, system_prompt, user_prompt, fetch, bypass=False, cacheable=None):
+    """
+    Response of the call `fetch()` for this (model, prompts), served from the
+    cache when possible. A fetched response is stored unless
+    `cacheable(response)` is false (e.g. an error payload).
+    """
+    key = response_cache_key(model, system_prompt, user_prompt)
+    response = get_cached_response(key, bypass=bypass)
+    if response is not None:
+        return response
+    response = fetch()
+    if cacheable is None or cacheable(response):
+        store_response(key, model, response)
+    return response
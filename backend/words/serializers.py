@@ -1,5 +1,11 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import ContrastPair, ContrastTag
+from .models import ContrastPair, ContrastPairRating, ContrastTag
+
+
+def rating_ids_prefetch():
+    """Prefetch for the `ratings` primary key list: one query, ids only."""
+    return Prefetch("ratings", queryset=ContrastPairRating.objects.only("id", "contrast_pair_id"))
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -8,12 +14,26 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ["id", "name"]
 
 
-class ContrastPairSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer taking an optional `fields` argument that limits the emitted fields."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop("fields", None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class ContrastPairSerializer(DynamicFieldsModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
 
+    # Querysets should prefetch "ratings" (see rating_ids_prefetch), it is one query per row otherwise
     class Meta:
         model = ContrastPair
-        fields = ["id", "item1", "item2", "tags", "ratings", "vector_embedding"]
+        fields = ["id", "item1", "item2", "tags", "ratings", "vector_embedding",
+                  "rating_count", "min_rating", "avg_rating"]
+        read_only_fields = ["rating_count", "min_rating", "avg_rating"]
 
 
 class ContrastPairSerializer2(serializers.ModelSerializer):
@@ -21,4 +41,15 @@ class ContrastPairSerializer2(serializers.ModelSerializer):
 
     class Meta:
         model = ContrastPair
-        fields = ["id", "item1", "item2", "tags", "ratings"]
\ No newline at end of file
+        fields = ["id", "item1", "item2", "tags", "ratings", "rating_count", "avg_rating"]
+        read_only_fields = ["rating_count", "avg_rating"]
+
+    def validate(self, data):
+        pair = ContrastPair(
+            pk=getattr(self.instance, "pk", None),
+            item1=data.get("item1", getattr(self.instance, "item1", "")),
+            item2=data.get("item2", getattr(self.instance, "item2", "")),
+        )
+        if pair.duplicates().exists():
+            raise serializers.ValidationError("This contrast pair already exists.")
+        return data
\ No newline at end of file
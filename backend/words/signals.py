@@ -0,0 +1,90 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .change_log import record_changes
+from .embedding_index import record_embedding_changes
+from .models import ContrastPair, ContrastPairRating, ContrastTag, Temator, Word
+from .rating_aggregates import apply_rating_removed
+from .tag_index import invalidate_tag_index
+from .word_pool import word_deleted, word_saved
+
+
+@receiver(post_save, sender=Word)
+def word_post_save(sender, instance, **kwargs):
+    # Keep the in-memory word pool used by RandomWordAPIView up to date
+    word_saved(instance)
+
+
+@receiver(post_delete, sender=Word)
+def word_post_delete(sender, instance, **kwargs):
+    word_deleted(instance.pk)
+
+
+@receiver(post_delete, sender=ContrastPairRating)
+def rating_post_delete(sender, instance, **kwargs):
+    # Creates and changes go through rating_aggregates.upsert_rating;
+    # deletes can come from anywhere (admin, cascades), so they are handled here
+    apply_rating_removed(instance.contrast_pair_id, instance.rating)
+
+
+@receiver(post_save, sender=Temator)
+@receiver(post_save, sender=ContrastPair)
+def embedding_owner_post_save(sender, instance, created, update_fields=None, **kwargs):
+    # Rows created without an embedding and saves that skip the column can't change search results
+    if created and instance.vector_embedding is None:
+        return
+    if update_fields is not None and 'vector_embedding' not in update_fields:
+        return
+    record_embedding_changes(sender, {instance.pk: instance.vector_embedding})
+
+
+@receiver(post_delete, sender=Temator)
+@receiver(post_delete, sender=ContrastPair)
+def embedding_owner_post_delete(sender, instance, **kwargs):
+    if instance.vector_embedding is not None:
+        record_embedding_changes(sender, {instance.pk: None})
+
+
+@receiver(post_save, sender=Temator)
+@receiver(post_save, sender=ContrastPair)
+@receiver(post_save, sender=ContrastPairRating)
+@receiver(post_save, sender=ContrastTag)
+def change_log_post_save(sender, instance, created, raw=False, **kwargs):
+    # Feeds /words/agent/changes/; bulk paths record their changes themselves
+    if not raw:
+        record_changes(sender, [instance.pk], 'insert' if created else 'update')
+
+
+@receiver(post_delete, sender=Temator)
+@receiver(post_delete, sender=ContrastPair)
+@receiver(post_delete, sender=ContrastPairRating)
+@receiver(post_delete, sender=ContrastTag)
+def change_log_post_delete(sender, instance, **kwargs):
+    record_changes(sender, [instance.pk], 'delete')
+
+
+@receiver(m2m_changed, sender=ContrastTag.pairs.through)
+def tag_links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_tag_index()
+    # Tag ids are part of the pair rows in the change feed
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            record_changes(ContrastPair, [instance.pk], 'update')
+    elif action in ('post_add', 'post_remove'):
+        record_changes(ContrastPair, pk_set, 'update')
+    elif action == 'pre_clear':
+        record_changes(ContrastPair, list(instance.pairs.values_list('pk', flat=True)), 'update')
+
+
+@receiver(pre_delete, sender=ContrastTag)
+def tag_pre_delete(sender, instance, **kwargs):
+    # The links go away with the tag without an m2m_changed signal
+    record_changes(ContrastPair, list(instance.pairs.values_list('pk', flat=True)), 'update')
+
+
+@receiver(post_save, sender=ContrastTag)
+@receiver(post_delete, sender=ContrastTag)
+def tag_saved_or_deleted(sender, instance, **kwargs):
+    # New, renamed and deleted tags change the name -> id map of the tag filters
+    invalidate_tag_index()
@@ -0,0 +1,169 @@
+"""
+Process-level cache of contrast pair ids per tag, used by the tag filters of
+the public and agent pair lists.
+
+The id set of a tag is read once from the through table (the unique
+(contrasttag_id, contrastpair_id) index covers the lookup) and kept until a
+tag link changes anywhere: signals and the bulk tagging endpoint bump a
+version in the shared cache, and every process drops its sets when it sees a
+new version. AND / OR of several tags is then a set intersection / union in
+memory. Matches larger than TAG_FILTER_MAX_IDS are filtered with a subquery
+on the through table instead of a long IN list.
+"""
+import threading
+from collections import OrderedDict
+
+from django.db import transaction
+from django.db.models import Count
+
+from .change_log import record_changes
+from .models import ContrastPair, ContrastTag
+from .utils import bump_cache_version, chunked, get_cache_version
+
+TAG_INDEX_VERSION_KEY = "words:tag_index_version"
+# Tags whose id sets are kept (least recently used ones are dropped)
+MAX_CACHED_TAGS = 256
+TAG_FILTER_MAX_IDS = 5000
+TAG_MATCH_MODES = ("any", "all")
+
+
+def get_tag_index_version():
+    return get_cache_version(TAG_INDEX_VERSION_KEY)
+
+
+def bump_tag_index_version():
+    """Mark the cached tag id sets as outdated in every process."""
+    return bump_cache_version(TAG_INDEX_VERSION_KEY)
+
+
+def invalidate_tag_index():
+    """Call when tags or tag links change."""
+    bump_tag_index_version()
+    # Again after commit: a process that reloaded in between read the old links
+    transaction.on_commit(bump_tag_index_version)
+
+
+class TagIndex:
+    """Tag name -> id map and lazily loaded, LRU bounded pair id sets per tag."""
+
+    def __init__(self, version):
+        self.version = version
+        self.tag_ids = dict(ContrastTag.objects.values_list("name", "id"))
+        self._pair_ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_stale(self, version):
+        return version != self.version
+
+    def pair_ids(self, tag_id):
+        with self._lock:
+            ids = self._pair_ids.get(tag_id)
+            if ids is not None:
+                self._pair_ids.move_to_end(tag_id)
+                return ids
+        links = ContrastTag.pairs.through.objects.filter(contrasttag_id=tag_id)
+        ids = frozenset(links.values_list("contrastpair_id", flat=True))
+        with self._lock:
+            self._pair_ids[tag_id] = ids
+            while len(self._pair_ids) > MAX_CACHED_TAGS:
+                self._pair_ids.popitem(last=False)
+        return ids
+
+    def match(self, names, mode="any"):
+        """Ids of the pairs having any / all of the tags `names`; unknown tags match nothing."""
+        tag_ids = [self.tag_ids.get(name) for name in names]
+        if mode == "all":
+            if None in tag_ids:
+                return frozenset()
+            # Smallest set first keeps the intersections small
+            sets = sorted((self.pair_ids(tag_id) for tag_id in tag_ids), key=len)
+            return frozenset.intersection(*sets) if sets else frozenset()
+        return frozenset().union(*(self.pair_ids(tag_id) for tag_id in tag_ids if tag_id is not None))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_tag_index():
+    """Return the process-wide TagIndex, rebuilt when a tag link changed."""
+    global _index
+    version = get_tag_index_version()
+    index = _index
+    if index is not None and not index.is_stale(version):
+        return index
+    with _index_lock:
+        if _index is None or _index.is_stale(version):
+            _index = TagIndex(version)
+        return _index
+
+
+def reset_tag_index():
+    """Drop the cached id sets so the next filter reloads them."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def parse_tag_filter(query_params):
+    """
+    (names, mode) from the `tags` (comma separated names) and `tag_match`
+    (any / all) query parameters; names is empty when no filter is given.
+    Raises ValueError for an unknown mode.
+    """
+    names = [name.strip() for name in query_params.get("tags", "").split(",") if name.strip()]
+    mode = query_params.get("tag_match", "any").lower()
+    if mode not in TAG_MATCH_MODES:
+        raise ValueError("tag_match must be 'any' or 'all'.")
+    return names, mode
+
+
+def filter_by_tags(queryset, names, mode="any"):
+    """Restrict a ContrastPair queryset to the pairs tagged with any / all of `names`."""
+    if not names:
+        return queryset
+    ids = get_tag_index().match(names, mode)
+    if len(ids) <= TAG_FILTER_MAX_IDS:
+        return queryset.filter(id__in=ids)
+    links = ContrastTag.pairs.through.objects.filter(contrasttag__name__in=names).values("contrastpair_id")
+    if mode == "all":
+        links = links.annotate(tag_count=Count("contrasttag_id")).filter(tag_count=len(set(names)))
+    return queryset.filter(id__in=links.values("contrastpair_id"))
+
+
+def bulk_tag_pairs(tags_by_pair, batch_size=1000):
+    """
+    Attach tags to pairs ({pair_id: {tag names}}) in one transaction: missing
+    tags and links are created with bulk_create on ContrastTag and the through
+    model, links that already exist are left alone.
+    Returns (number of new links, names of the created tags).
+    """
+    through = ContrastTag.pairs.through
+    names = set().union(*tags_by_pair.values()) if tags_by_pair else set()
+    with transaction.atomic():
+        tag_ids = {}
+        for chunk in chunked(names, batch_size):
+            tag_ids.update(ContrastTag.objects.filter(name__in=chunk).values_list("name", "id"))
+        missing = sorted(names - set(tag_ids))
+        ContrastTag.objects.bulk_create([ContrastTag(name=name) for name in missing], batch_size=batch_size, ignore_conflicts=True)
+        for chunk in chunked(missing, batch_size):
+            tag_ids.update(ContrastTag.objects.filter(name__in=chunk).values_list("name", "id"))
+
+        wanted = {(pair_id, tag_ids[name]) for pair_id, pair_names in tags_by_pair.items() for name in pair_names}
+        existing = set()
+        for chunk in chunked(list(tags_by_pair), batch_size):
+            links = through.objects.filter(contrastpair_id__in=chunk, contrasttag_id__in=list(tag_ids.values()))
+            existing.update(links.values_list("contrastpair_id", "contrasttag_id"))
+        new_links = sorted(wanted - existing)
+        through.objects.bulk_create(
+            [through(contrastpair_id=pair_id, contrasttag_id=tag_id) for pair_id, tag_id in new_links],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+        # bulk_create sends neither post_save nor m2m_changed
+        record_changes(ContrastTag, sorted(tag_ids[name] for name in missing), "insert")
+        record_changes(ContrastPair, sorted({pair_id for pair_id, _ in new_links}), "update")
+        if new_links or missing:
+            invalidate_tag_index()
+    return len(new_links), missing
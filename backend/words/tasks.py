@@ -1,12 +1,91 @@
-from .perplexity_deep_research import search_internet
-from celery import shared_task
-from datetime import datetime, timedelta
+from .perplexity_deep_research import SEARCH_TYPES, date_windows, search_windows
+from .word_pack import publish_word_pack
+from .change_log import prune_change_log as prune_change_log_entries
+from .embedding_index import build_embedding_index
+from .embeddings import EMBEDDING_MODELS
+from .response_cache import evict_responses
+from .utils import chunked
+from celery import chord, shared_task
+from datetime import date, timedelta
+from django.conf import settings
+from django.utils import timezone
+from itertools import chain
+
+NEWS_SEARCH_WINDOW_DAYS = 2
+
+
+@shared_task
+def search_news_windows(windows, search_model="sonar-pro", bypass_cache=False):
+    """A batch of (category, start day, end day) searches, fetched concurrently; already saved windows are skipped."""
+    windows = [(name, date.fromisoformat(start_day), date.fromisoformat(end_day)) for name, start_day, end_day in windows]
+    return search_windows(windows, search_model=search_model, bypass_cache=bypass_cache)
+
+
+@shared_task
+def summarize_news_searches(batches):
+    """Chord callback: idempotency keys of the windows per status, failures with their error."""
+    summary = {"created": [], "skipped": [], "running": [], "failed": {}}
+    for result in chain.from_iterable(batches):
+        if result["status"] == "failed":
+            summary["failed"][result["key"]] = result["error"]
+        else:
+            summary[result["status"]].append(result["key"])
+    print(f"News searches: {len(summary['created'])} created, {len(summary['skipped'])} skipped, "
+          f"{len(summary['running'])} running elsewhere, {len(summary['failed'])} failed")
+    return summary
+
+
+def run_news_searches(windows, names=None, search_model="sonar-pro", bypass_cache=False):
+    """
+    Start the (category, window) searches as a chord of search_news_windows
+    tasks; returns its AsyncResult. Each task gets PERPLEXITY_MAX_CONCURRENCY
+    searches, as many as the client has in flight at once.
+    """
+    names = names or list(SEARCH_TYPES)
+    searches = [(name, start_day.isoformat(), end_day.isoformat()) for start_day, end_day in windows for name in names]
+    header = [
+        search_news_windows.s(batch, search_model, bypass_cache)
+        for batch in chunked(searches, settings.PERPLEXITY_MAX_CONCURRENCY)
+    ]
+    return chord(header)(summarize_news_searches.s())
 
 
 @shared_task
 def daily_search():
-    end_date = datetime.now()- timedelta(days=1)
-    start_date = end_date - timedelta(days=2)
+    # Whole days (stored at midnight) so a rerun finds the window; the prompt only ever had the dates
+    end_day = timezone.localdate() - timedelta(days=1)
+    start_day = end_day - timedelta(days=NEWS_SEARCH_WINDOW_DAYS)
+    return run_news_searches([(start_day, end_day)]).id
+
+
+@shared_task
+def backfill_news_search(start_day, end_day, window_days=NEWS_SEARCH_WINDOW_DAYS, names=None, search_model="sonar-pro",
+                         bypass_cache=False):
+    """Search every window of the days [start_day, end_day] (ISO dates) that has no record yet, in parallel."""
+    windows = date_windows(date.fromisoformat(start_day), date.fromisoformat(end_day), window_days)
+    return run_news_searches(windows, names=names, search_model=search_model, bypass_cache=bypass_cache).id
 
-    for name in ["general_news", "polish_showbiznes"]:
-        search_internet(start_date, end_date, search_model="sonar-pro", name=name)
+
+@shared_task
+def build_word_pack():
+    """Republish the word pack; a no-op when the Word data did not change (safe to schedule often)."""
+    manifest, published = publish_word_pack()
+    return {"version": manifest["version"], "published": published}
+
+
+@shared_task
+def merge_embedding_index():
+    """Rebuild the similarity search indexes, folding the delta segments into the base (schedule periodically)."""
+    return {kind: build_embedding_index(kind)["count"] for kind in EMBEDDING_MODELS}
+
+
+@shared_task
+def prune_change_log():
+    """Drop change feed entries older than CHANGE_LOG_RETENTION_DAYS (schedule daily)."""
+    return {"deleted": prune_change_log_entries()}
+
+
+@shared_task
+def prune_response_cache():
+    """Delete expired response cache entries and enforce RESPONSE_CACHE_MAX_BYTES (schedule daily)."""
+    return {"deleted": evict_responses()}
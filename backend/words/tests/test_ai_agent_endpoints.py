@@ -1,12 +1,20 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from ..embeddings import encode_embedding
 from ..models import ContrastPair, Temator, CypherArenaPerplexityDeepResearch, ContrastPairRating
 from datetime import datetime, timedelta
 from django.conf import settings
 import json
 import base64
+import numpy as np
 
 class AgentEndpointsTestCase(TestCase):
     """
@@ -52,6 +60,10 @@ class AgentEndpointsTestCase(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        # Embedding writes must not touch the real index under MEDIA_ROOT
+        self.index_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(EMBEDDING_INDEX_DIR=self.index_dir)
+        self.settings_override.enable()
         # URLs
         self.contrast_pairs_url = reverse('agent:agent-contrast-pair-list-create')
         self.contrast_pairs_rate_url = reverse('agent:agent-contrast-pair-batch-rate')
@@ -62,6 +74,10 @@ class AgentEndpointsTestCase(TestCase):
         self.agent_headers = {'HTTP_X_AGENT_TOKEN': self.expected_token}
         self.invalid_headers = {'HTTP_X_AGENT_TOKEN': 'wrongtoken'}
 
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+
     # --- Authentication Tests ---
     def test_auth_contrast_pairs_get_no_token(self):
         response = self.client.get(self.contrast_pairs_url)
@@ -217,7 +233,8 @@ class AgentEndpointsTestCase(TestCase):
 
     def test_patch_contrast_pairs_batch_update_valid(self):
         """Test PATCH /agent/contrast-pairs/update/ batch update valid payload."""
-        new_embedding_data = base64.b64encode(b"new_embedding").decode('utf-8')
+        # Raw float32 values are stored as a typed blob
+        new_embedding_data = base64.b64encode(np.array([0.5, -1], dtype='<f4').tobytes()).decode('utf-8')
         payload = {
             'updates': [
                 {'id': self.pair1.id, 'item1': 'banana'},
@@ -232,7 +249,7 @@ class AgentEndpointsTestCase(TestCase):
         self.pair_with_embedding.refresh_from_db()
         self.assertEqual(self.pair1.item1, 'banana')
         self.assertEqual(self.pair2.item2, 'bird')
-        self.assertEqual(self.pair2.vector_embedding, base64.b64decode(new_embedding_data))
+        self.assertEqual(bytes(self.pair2.vector_embedding), encode_embedding([0.5, -1]))
         self.assertIsNone(self.pair_with_embedding.vector_embedding)
 
     def test_patch_contrast_pairs_batch_update_invalid(self):
@@ -282,6 +299,36 @@ class AgentEndpointsTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.json()), 2) # Should return all created news
 
+    def test_get_news_summary_and_fields(self):
+        """Test GET /agent/news/ summary mode and fields projection skip data_response."""
+        self.assertNotIn('content', self.client.get(self.news_url, **self.agent_headers).json()[0])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.news_url, {'summary': 'true'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0], {
+            'id': self.news2.id, 'start_date': response.json()[0]['start_date'], 'end_date': response.json()[0]['end_date'],
+            'news_source': 'news', 'content': 'General news',
+        })
+        self.assertNotIn('data_response', queries[-1]['sql'])
+
+        response = self.client.get(self.news_url, {'fields': 'id,content', 'pagination': 'cursor', 'count': 1}, **self.agent_headers)
+        self.assertEqual(response.json()['results'], [{'id': self.news2.id, 'content': 'General news'}])
+        response = self.client.get(self.news_url, {'fields': 'id,body'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_news_content_extraction(self):
+        """Test the content column is filled on save from chat completion responses, and by the backfill."""
+        news = CypherArenaPerplexityDeepResearch.objects.create(
+            data_response={"choices": [{"message": {"role": "assistant", "content": "Wiadomości dnia"}}]},
+            start_date=datetime.now(), end_date=datetime.now(),
+        )
+        self.assertEqual(news.content, 'Wiadomości dnia')
+        CypherArenaPerplexityDeepResearch.objects.filter(id=news.id).update(content=None)
+        call_command('backfill_news_content', stdout=StringIO())
+        news.refresh_from_db()
+        self.assertEqual(news.content, 'Wiadomości dnia')
+        self.assertEqual(CypherArenaPerplexityDeepResearch.extract_content({"choices": []}), '')
+
     def test_get_news_invalid_params(self):
         """Test GET /agent/news/ with invalid date/type params returns error."""
         response = self.client.get(self.news_url, {
@@ -404,7 +451,7 @@ class AgentEndpointsTestCase(TestCase):
 
     def test_patch_topics_batch_update_valid(self):
         """Test PATCH /agent/topics/ batch update with valid payload."""
-        new_embedding_data = base64.b64encode(b"topic_embedding").decode('utf-8')
+        new_embedding_data = base64.b64encode(np.array([0.25, 2], dtype='<f4').tobytes()).decode('utf-8')
         payload = {
             'updates': [
                 {'id': self.topic1.id, 'name': 'Updated Tech'},
@@ -419,7 +466,7 @@ class AgentEndpointsTestCase(TestCase):
         self.topic_with_embedding.refresh_from_db()
         self.assertEqual(self.topic1.name, 'Updated Tech')
         self.assertEqual(self.topic2.source, 'manual')
-        self.assertEqual(self.topic2.vector_embedding, base64.b64decode(new_embedding_data))
+        self.assertEqual(bytes(self.topic2.vector_embedding), encode_embedding([0.25, 2]))
         self.assertIsNone(self.topic_with_embedding.vector_embedding)
 
     def test_patch_topics_batch_update_invalid(self):
@@ -436,3 +483,111 @@ class AgentEndpointsTestCase(TestCase):
         # Ensure original data is unchanged
         self.topic1.refresh_from_db()
         self.assertEqual(self.topic1.name, 'Technology')
+
+    def test_patch_topics_batch_update_name_conflict(self):
+        """Test PATCH /agent/topics/ reports duplicate names per id and applies the rest."""
+        payload = {
+            'updates': [
+                {'id': self.topic1.id, 'name': 'Science'}, # Taken by topic2
+                {'id': self.topic3.id, 'name': 'Painting'},
+                {'id': self.topic2.id, 'name': 'Painting'}, # Taken earlier in the batch
+            ]
+        }
+        response = self.client.patch(self.topics_url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = response.json()
+        self.assertEqual(data['updated_ids'], [self.topic3.id])
+        self.assertEqual(len(data['errors']), 2)
+        self.topic1.refresh_from_db()
+        self.topic3.refresh_from_db()
+        self.assertEqual(self.topic1.name, 'Technology')
+        self.assertEqual(self.topic3.name, 'Painting')
+
+    def test_patch_contrast_pairs_batch_update_is_bulk(self):
+        """Test PATCH /agent/contrast-pairs/update/ uses a constant number of queries."""
+        pairs = ContrastPair.objects.bulk_create([ContrastPair(item1=f"x{i}", item2=f"y{i}") for i in range(300)])
+        embedding = base64.b64encode(encode_embedding([1, 0, 0])).decode('utf-8')
+        payload = {'updates': [{'id': pair.id, 'vector_embedding': embedding} for pair in pairs]}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(self.contrast_pairs_update_url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertLess(len(queries), 10) # in_bulk + batched bulk_update, not 2 queries per row
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['updated_count'], 300)
+        pairs[150].refresh_from_db()
+        self.assertEqual(pairs[150].vector_embedding, encode_embedding([1, 0, 0]))
+        self.assertEqual(pairs[150].item1, "x150")
+
+    def test_post_contrast_pairs_batch_create_skips_duplicates(self):
+        """Test POST /agent/contrast-pairs/ does not create normalized duplicates."""
+        payload = {
+            'pairs': [
+                {'item1': 'Orange', 'item2': 'apple'}, # Same as the existing apple/orange pair
+                {'item1': 'sun', 'item2': 'moon'},
+                {'item1': 'MOON ', 'item2': 'sun'}, # Duplicate within the batch
+            ]
+        }
+        response = self.client.post(self.contrast_pairs_url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0]['id'], self.pair1.id)
+        self.assertEqual(data[1]['id'], data[2]['id'])
+        self.assertEqual(ContrastPair.objects.count(), 5) # 4 initial + 1 new
+
+    def test_post_topics_batch_insert_existing_names(self):
+        """Test POST /agent/topics/ returns existing topics instead of duplicating them."""
+        payload = {'topics': [{'name': 'Science'}, {'name': 'History'}, {'name': 'History'}]}
+        response = self.client.post(self.topics_url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual([t['name'] for t in data], ['Science', 'History', 'History'])
+        self.assertEqual(data[0]['id'], self.topic2.id)
+        self.assertEqual(Temator.objects.get(name='History').source, 'agent')
+        self.assertEqual(Temator.objects.count(), 5)
+
+    def test_patch_contrast_pairs_batch_update_duplicate_pair(self):
+        """Test PATCH /agent/contrast-pairs/update/ rejects an update that duplicates another pair."""
+        payload = {'updates': [{'id': self.pair2.id, 'item1': 'Orange', 'item2': 'Apple'}]}
+        response = self.client.patch(self.contrast_pairs_update_url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['updated_ids'], [])
+        self.pair2.refresh_from_db()
+        self.assertEqual(self.pair2.item1, 'cat')
+
+    def test_get_contrast_pairs_fields_projection(self):
+        """Test GET /agent/contrast-pairs/?fields= only selects and returns the requested columns."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.contrast_pairs_url, {'fields': 'id,item1'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for pair in response.json()['results']:
+            self.assertEqual(set(pair), {'id', 'item1'})
+        self.assertFalse(any('vector_embedding' in query['sql'] for query in queries))
+
+        # Without fields, vector_embedding is not even selected when not requested
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.contrast_pairs_url, **self.agent_headers)
+        self.assertFalse(any('vector_embedding' in query['sql'] for query in queries))
+
+        response = self.client.get(self.contrast_pairs_url, {'fields': 'id,password'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_contrast_pairs_ratings_not_queried_per_row(self):
+        """Test GET /agent/contrast-pairs/ loads tags and ratings with one query each."""
+        pairs = ContrastPair.objects.bulk_create([ContrastPair(item1=f"x{i}", item2=f"y{i}") for i in range(50)])
+        ContrastPairRating.objects.bulk_create([
+            ContrastPairRating(contrast_pair=pair, user_fingerprint='agent', rating=3) for pair in pairs
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.contrast_pairs_url, {'count': 100}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 54)
+        self.assertLess(len(queries), 10)
+        rated = next(pair for pair in response.json()['results'] if pair['id'] == pairs[0].id)
+        self.assertEqual(len(rated['ratings']), 1)
+
+    def test_get_topics_fields_projection(self):
+        """Test GET /agent/topics/?fields= returns only the requested fields."""
+        response = self.client.get(self.topics_url, {'fields': 'name'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for topic in response.json()['results']:
+            self.assertEqual(set(topic), {'name'})
@@ -0,0 +1,134 @@
+import base64
+import json
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..change_log import prune_change_log
+from ..models import ChangeLogEntry, ContrastPair, ContrastTag, Temator
+from ..rating_aggregates import upsert_rating
+
+
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0)
+class ChangeFeedTestCase(TestCase):
+    """
+    Tests for the /words/agent/changes/ feed and the change log behind it.
+    """
+    def setUp(self):
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+        self.url = reverse('agent:agent-changes')
+
+    def feed(self, **params):
+        response = self.client.get(self.url, params, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def post(self, name, payload):
+        return self.client.post(reverse(name), data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+
+    def test_single_row_changes(self):
+        head = self.feed()['next']
+        topic = Temator.objects.create(name="sport")
+        self.assertIsNotNone(topic.created_at)
+        pair = ContrastPair.objects.create(item1="ogień", item2="woda")
+        tag = ContrastTag.objects.create(name="żywioły")
+        tag.pairs.add(pair)
+        data = self.feed(since=head)
+        self.assertFalse(data['has_more'])
+        self.assertEqual([(c['kind'], c['id'], c['action']) for c in data['changes']],
+                         [('topic', topic.id, 'insert'), ('tag', tag.id, 'insert'), ('pair', pair.id, 'insert')])
+        self.assertEqual(data['changes'][0]['data']['name'], 'sport')
+        self.assertEqual(data['changes'][2]['data']['tags'], [tag.id])
+
+        # Nothing new after the returned token
+        token = data['next']
+        self.assertEqual(self.feed(since=token)['changes'], [])
+
+        topic.name = "football"
+        topic.save()
+        tag_id = tag.id
+        tag.delete()
+        data = self.feed(since=token)
+        self.assertEqual([(c['kind'], c['id'], c['action']) for c in data['changes']],
+                         [('topic', topic.id, 'update'), ('pair', pair.id, 'update'), ('tag', tag_id, 'delete')])
+        self.assertEqual(data['changes'][0]['data']['name'], 'football')
+        self.assertEqual(data['changes'][1]['data']['tags'], [])
+
+        # Deleting a pair cascades to its ratings
+        upsert_rating(pair.id, 'a', 3)
+        token = data['next']
+        pair_id = pair.id
+        pair.delete()
+        data = self.feed(since=token)
+        self.assertEqual([(c['kind'], c['action']) for c in data['changes']],
+                         [('rating', 'delete'), ('pair', 'delete')])
+        self.assertEqual(data['changes'][1]['id'], pair_id)
+        self.assertNotIn('data', data['changes'][1])
+
+    def test_bulk_paths_and_paging(self):
+        head = self.feed()['next']
+        Temator.objects.create(name="existing")
+        embedding = base64.b64encode(np.asarray([1, 0], dtype='<f4').tobytes()).decode()
+        response = self.post('agent:agent-topic-list-create-update', {'topics': [
+            {'name': 'existing'}, {'name': 'new one', 'vector_embedding': embedding}, {'name': 'new two'},
+        ]})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.post('agent:agent-contrast-pair-list-create', {'pairs': [{'item1': 'noc', 'item2': 'dzień'}]})
+        pair_id = response.json()[0]['id']
+        self.post('agent:agent-contrast-pair-batch-rate', {'ratings': [{'pair_id': pair_id, 'rating': 2}]})
+        self.post('agent:agent-contrast-pair-batch-rate', {'ratings': [{'pair_id': pair_id, 'rating': 5}]})
+        new_one = Temator.objects.get(name='new one')
+        self.client.patch(reverse('agent:agent-topic-list-create-update'),
+                          data=json.dumps({'updates': [{'id': new_one.id, 'source': 'edited'}]}),
+                          content_type='application/json', **self.agent_headers)
+
+        changes, token = [], head
+        while True:
+            data = self.feed(since=token, limit=2)
+            changes += data['changes']
+            token = data['next']
+            if not data['has_more']:
+                break
+        actions = [(c['kind'], c['action']) for c in changes]
+        # The existing topic is logged once (its own insert), not again by the batch create
+        # The rating insert and update share a page and are merged
+        self.assertEqual(actions, [('topic', 'insert'), ('topic', 'insert'), ('topic', 'insert'), ('pair', 'insert'),
+                                   ('rating', 'insert'), ('topic', 'update')])
+        self.assertEqual(changes[-1]['data']['source'], 'edited')
+        self.assertEqual(changes[-2]['data']['rating'], 5)
+
+        # Within one page, an insert followed by updates is one insert
+        data = self.feed(since=head, kinds='rating,topic')
+        self.assertEqual([(c['kind'], c['action']) for c in data['changes']],
+                         [('topic', 'insert'), ('topic', 'insert'), ('rating', 'insert'), ('topic', 'insert')])
+        self.assertEqual(data['changes'][2]['data']['rating'], 5)
+
+    def test_settle_lag_and_validation(self):
+        head = self.feed()['next']
+        Temator.objects.create(name="sport")
+        with override_settings(CHANGE_FEED_SETTLE_SECONDS=60):
+            data = self.feed(since=head)
+        self.assertEqual((data['changes'], data['next']), ([], head))
+        for params in ({'since': 'x'}, {'since': 0, 'limit': 0}, {'since': 0, 'kinds': 'word'}):
+            response = self.client.get(self.url, params, **self.agent_headers)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_prune_expires_old_tokens(self):
+        head = self.feed()['next']
+        Temator.objects.create(name="first")
+        Temator.objects.create(name="second")
+        token = self.feed(since=head)['next']
+        third = Temator.objects.create(name="third")
+        ChangeLogEntry.objects.filter(id__lte=token).update(created_at=timezone.now() - timedelta(days=40))
+
+        self.assertEqual(prune_change_log(), 1)
+        response = self.client.get(self.url, {'since': head}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        # Tokens at or after the kept entry are still good
+        self.assertEqual([c['id'] for c in self.feed(since=token)['changes']], [third.id])
@@ -0,0 +1,395 @@
+import base64
+import glob
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+import numpy as np
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from .. import embedding_index
+from ..agent_views import _find_near_duplicates
+from ..embedding_index import IVFIndex, build_embedding_index, get_embedding_index, reset_embedding_indexes
+from ..embeddings import (
+    decode_embedding,
+    encode_embedding,
+    find_near_duplicates,
+    get_embedding_matrix,
+    is_typed_embedding,
+    parse_embedding,
+    reset_embedding_matrices,
+)
+from ..models import ContrastPair, Temator
+
+
+def encode(values):
+    return np.asarray(values, dtype='<f4').tobytes()
+
+
+class EmbeddingSimilarityTestCase(TestCase):
+    """
+    Tests for the /words/agent/similar/ endpoint and the embedding matrix behind it.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.sport = Temator.objects.create(name="sport", vector_embedding=encode([1, 0, 0]))
+        cls.football = Temator.objects.create(name="football", vector_embedding=encode([0.9, 0.1, 0]))
+        cls.cooking = Temator.objects.create(name="cooking", vector_embedding=encode([0, 0, 2]))
+        cls.baking = Temator.objects.create(name="baking", vector_embedding=encode([0.1, 0.2, 1]))
+        # Unusable blobs are ignored
+        Temator.objects.create(name="no embedding")
+        Temator.objects.create(name="broken", vector_embedding=b"abc")
+        Temator.objects.create(name="wrong dimension", vector_embedding=encode([1, 0]))
+        cls.pair = ContrastPair.objects.create(item1="hot", item2="cold", vector_embedding=encode([1, 1]))
+        cls.other_pair = ContrastPair.objects.create(item1="up", item2="down", vector_embedding=encode([1, 0.8]))
+
+    def setUp(self):
+        reset_embedding_matrices()
+        reset_embedding_indexes()
+        self.index_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(EMBEDDING_INDEX_DIR=self.index_dir)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+        self.url = reverse('agent:agent-similar')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+
+    def test_matrix_skips_unusable_embeddings(self):
+        matrix = get_embedding_matrix('topic')
+        self.assertEqual(len(matrix), 4)
+        self.assertEqual(matrix.dimension, 3)
+        np.testing.assert_allclose(np.linalg.norm(matrix.vectors, axis=1), 1, rtol=1e-6)
+
+    def test_get_by_id(self):
+        response = self.client.get(self.url, {'kind': 'topic', 'id': self.sport.id, 'k': 2}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([r['name'] for r in results], ['football', 'baking'])
+        self.assertGreater(results[0]['score'], 0.99)
+
+        response = self.client.get(self.url, {'kind': 'pair', 'id': self.pair.id}, **self.agent_headers)
+        self.assertEqual(response.json()['results'][0]['item1'], 'up')
+
+    def test_get_errors(self):
+        response = self.client.get(self.url, {'kind': 'word', 'id': 1}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'kind': 'topic', 'id': self.sport.id, 'k': 0}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        no_embedding = Temator.objects.get(name="no embedding")
+        response = self.client.get(self.url, {'kind': 'topic', 'id': no_embedding.id}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.url, {'kind': 'topic', 'id': self.sport.id})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_post_batch(self):
+        payload = {
+            'kind': 'topic',
+            'k': 1,
+            'queries': [
+                {'id': self.cooking.id},
+                {'vector_embedding': base64.b64encode(encode([5, -1, 0])).decode()},
+            ],
+        }
+        response = self.client.post(self.url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual([r['id'] for r in results[0]], [self.baking.id])
+        self.assertEqual([r['id'] for r in results[1]], [self.sport.id])
+
+        payload['queries'] = [{'vector_embedding': base64.b64encode(encode([1, 0])).decode()}, {'id': self.sport.id}]
+        response = self.client.post(self.url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(response.json()['errors']), 1)
+        self.assertIsNone(response.json()['results'][0])
+
+        payload['queries'] = [{'id': self.sport.id, 'vector_embedding': 'AAAA'}]
+        response = self.client.post(self.url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_embedding_updates_invalidate_matrix(self):
+        self.assertEqual(len(get_embedding_matrix('topic')), 4)
+        payload = {'updates': [{'id': self.sport.id, 'vector_embedding': ''}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('agent:agent-topic-list-create-update'), data=json.dumps(payload),
+                              content_type='application/json', **self.agent_headers)
+        self.assertEqual(len(get_embedding_matrix('topic')), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cooking.delete()
+        self.assertEqual(len(get_embedding_matrix('topic')), 2)
+
+    def test_post_topics_dedupe_threshold(self):
+        def b64(values):
+            return base64.b64encode(encode(values)).decode()
+        payload = {
+            'dedupe_threshold': 0.95,
+            'topics': [
+                {'name': 'sports', 'vector_embedding': b64([1, 0.01, 0])}, # Near "sport"
+                {'name': 'music', 'vector_embedding': b64([0, 1, 0])},
+                {'name': 'songs', 'vector_embedding': b64([0, 0.99, 0.05])}, # Near "music" from this batch
+                {'name': 'weather'}, # No embedding, not checked
+            ],
+        }
+        url = reverse('agent:agent-topic-list-create-update')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual([topic['name'] for topic in data['results']], ['music', 'weather'])
+        music_id = data['results'][0]['id']
+        self.assertEqual(
+            [(item['index'], item['duplicate_of'], item['reason']) for item in data['skipped']],
+            [(0, self.sport.id, f'near-duplicate of id {self.sport.id}'), (2, music_id, f'near-duplicate of id {music_id}')],
+        )
+        self.assertFalse(Temator.objects.filter(name__in=['sports', 'songs']).exists())
+        # The new embedding is searchable as soon as it is committed
+        self.assertIn(music_id, [i for i, _ in get_embedding_matrix('topic').search([[0, 1, 0]], 1)[0]])
+
+    def test_non_finite_embeddings(self):
+        url = reverse('agent:agent-topic-list-create-update')
+        for blob in (encode([float('nan'), 0, 0]), encode_embedding([1, 0, 0], dtype='float16')[:-2] + b'\x00\x7c'):
+            payload = {'topics': [{'name': 'broken', 'vector_embedding': base64.b64encode(blob).decode()}]}
+            response = self.client.post(url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Rows stored before the check are left out of the duplicate search
+        with mock.patch('words.agent_views.find_near_duplicates', wraps=find_near_duplicates) as check:
+            matches = _find_near_duplicates('topic', [encode([float('nan'), 0, 0]), encode([1, 0.01, 0])], 0.95)
+        self.assertIsNone(check.call_args.args[1][0])
+        self.assertIsNone(matches[0])
+        self.assertEqual(matches[1][:2], ('id', self.sport.id))
+
+    def test_post_pairs_dedupe_threshold(self):
+        payload = {
+            'dedupe_threshold': 0.99,
+            'pairs': [
+                {'item1': 'warm', 'item2': 'chilly', 'vector_embedding': base64.b64encode(encode([1, 1.01])).decode()},
+                {'item1': 'left', 'item2': 'right', 'vector_embedding': base64.b64encode(encode([-1, 1])).decode()},
+            ],
+        }
+        url = reverse('agent:agent-contrast-pair-list-create')
+        response = self.client.post(url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual([pair['item1'] for pair in data['results']], ['left'])
+        self.assertEqual(data['skipped'][0]['duplicate_of'], self.pair.id)
+
+        # Without a threshold the response keeps its plain list shape
+        del payload['dedupe_threshold']
+        response = self.client.post(url, data=json.dumps(payload), content_type='application/json', **self.agent_headers)
+        self.assertEqual(len(response.json()), 2)
+
+
+class EmbeddingIndexTestCase(TestCase):
+    """
+    Tests for the memory-mapped IVF index and its delta segment.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(7)
+        centers = rng.normal(size=(8, 16))
+        vectors = centers[rng.integers(0, 8, size=400)] + rng.normal(scale=0.1, size=(400, 16))
+        cls.topics = Temator.objects.bulk_create([
+            Temator(name=f"topic {i}", vector_embedding=encode(vector)) for i, vector in enumerate(vectors)
+        ])
+
+    def setUp(self):
+        reset_embedding_matrices()
+        reset_embedding_indexes()
+        self.index_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(EMBEDDING_INDEX_DIR=self.index_dir)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.index_dir, ignore_errors=True)
+
+    def deltas(self):
+        return glob.glob(os.path.join(self.index_dir, 'topic', 'delta-*.npz'))
+
+    def test_falls_back_to_exact_matrix(self):
+        self.assertNotIsInstance(get_embedding_index('topic'), IVFIndex)
+
+    def test_index_matches_exact_search(self):
+        call_command('build_embedding_index', kind='topic', stdout=StringIO())
+        index = get_embedding_index('topic')
+        self.assertIsInstance(index, IVFIndex)
+        self.assertIsInstance(index.vectors, np.memmap)
+        self.assertEqual(len(index), 400)
+
+        exact = get_embedding_matrix('topic')
+        queries = [exact.vector_of(topic.id) for topic in self.topics[:20]]
+        exclude_ids = [topic.id for topic in self.topics[:20]]
+        approximate_results = index.search(queries, 5, exclude_ids=exclude_ids)
+        exact_results = exact.search(queries, 5, exclude_ids=exclude_ids)
+        recall = np.mean([
+            len({i for i, _ in a} & {i for i, _ in e}) / 5 for a, e in zip(approximate_results, exact_results)
+        ])
+        self.assertGreater(recall, 0.9)
+
+        # Probing every list is exact
+        index.nprobe = index.manifest['nlist']
+        self.assertEqual(
+            [[i for i, _ in result] for result in index.search(queries, 5, exclude_ids=exclude_ids)],
+            [[i for i, _ in result] for result in exact_results],
+        )
+
+    def test_delta_segment_and_merge(self):
+        build_embedding_index('topic')
+        target, removed_id = self.topics[0], self.topics[1].id
+        removed_vector = np.frombuffer(self.topics[1].vector_embedding, dtype='<f4')
+        query = np.full(16, 3.0)
+        payload = {'updates': [{'id': target.id, 'vector_embedding': base64.b64encode(encode(query)).decode()}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('agent:agent-topic-list-create-update'), data=json.dumps(payload),
+                                         content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            Temator.objects.get(id=removed_id).delete()
+        self.assertEqual(len(self.deltas()), 2)
+
+        index = get_embedding_index('topic')
+        self.assertEqual(len(index), 399)
+        self.assertIsNone(index.vector_of(removed_id))
+        self.assertEqual(index.search([query], 1)[0][0][0], target.id)
+        self.assertNotIn(removed_id, [i for i, _ in index.search([removed_vector], 10)[0]])
+
+        manifest = build_embedding_index('topic')
+        self.assertEqual(manifest['count'], 399)
+        self.assertEqual(self.deltas(), [])
+        self.assertEqual(get_embedding_index('topic').search([query], 1)[0][0][0], target.id)
+
+
+    def test_delta_is_written_on_commit(self):
+        build_embedding_index('topic')
+        topic = self.topics[0]
+        try:
+            with transaction.atomic():
+                topic.vector_embedding = encode(np.ones(16))
+                topic.save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(self.deltas(), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            topic.save()
+            self.assertEqual(self.deltas(), [])
+        self.assertEqual(len(self.deltas()), 1)
+
+    def test_reopen_reads_only_new_deltas(self):
+        build_embedding_index('topic')
+        first, second = self.topics[0], self.topics[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            first.vector_embedding = encode(np.full(16, 3.0))
+            first.save()
+        index = get_embedding_index('topic')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.vector_embedding = encode(np.full(16, -3.0))
+            second.save()
+        with mock.patch('words.embedding_index._load_delta', wraps=embedding_index._load_delta) as load_delta:
+            reopened = get_embedding_index('topic')
+        self.assertIsNot(reopened, index)
+        self.assertIs(reopened.vectors, index.vectors)
+        self.assertEqual(len(load_delta.call_args.args[1]), 1)
+        self.assertEqual(reopened.search([np.full(16, 3.0)], 1)[0][0][0], first.id)
+        self.assertEqual(reopened.search([np.full(16, -3.0)], 1)[0][0][0], second.id)
+        self.assertEqual(len(reopened), 400)
+
+
+    def test_deltas_of_other_processes_are_noticed_from_the_directory(self):
+        build_embedding_index('topic')
+        index = get_embedding_index('topic')
+        target = self.topics[0]
+        # Written by another process whose version bump this one does not see
+        with mock.patch('words.embedding_index.bump_embedding_version'):
+            embedding_index._write_delta('topic', {target.id: encode(np.full(16, 5.0))})
+        reopened = get_embedding_index('topic')
+        self.assertIsNot(reopened, index)
+        self.assertEqual(reopened.search([np.full(16, 5.0)], 1)[0][0][0], target.id)
+        self.assertIs(get_embedding_index('topic'), reopened)
+
+
+class TypedEmbeddingTestCase(TestCase):
+    """
+    Tests for the typed / quantized embedding blob format.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.vector = np.linspace(-1, 2, 32, dtype=np.float32)
+        cls.topic = Temator.objects.create(name="legacy", vector_embedding=encode(cls.vector))
+        cls.broken = Temator.objects.create(name="broken", vector_embedding=b"abc")
+
+    def setUp(self):
+        reset_embedding_matrices()
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+        self.url = reverse('agent:agent-topic-list-create-update')
+
+    def patch(self, update):
+        return self.client.patch(self.url, data=json.dumps({'updates': [{'id': self.topic.id, **update}]}),
+                                 content_type='application/json', **self.agent_headers)
+
+    def test_roundtrip(self):
+        for dtype, size, tolerance in (('float32', 128, 0), ('float16', 64, 1e-3), ('int8', 32, 2 / 127)):
+            blob = encode_embedding(self.vector, dtype=dtype, model='text-embedding-3-small')
+            self.assertEqual(len(blob) - len(encode_embedding([], dtype=dtype, model='text-embedding-3-small')), size)
+            embedding = parse_embedding(blob)
+            self.assertEqual((embedding.dtype, embedding.model, len(embedding.values)), (dtype, 'text-embedding-3-small', 32))
+            np.testing.assert_allclose(decode_embedding(blob), self.vector, atol=tolerance)
+
+        # float32 and legacy blobs are views of the stored bytes
+        blob = encode_embedding(self.vector)
+        self.assertFalse(decode_embedding(blob).flags.owndata)
+        self.assertFalse(decode_embedding(encode(self.vector)).flags.owndata)
+
+    def test_malformed_blobs(self):
+        blob = encode_embedding(self.vector, dtype='float16')
+        for bad in (blob[:-2], blob[:6], blob[:5] + bytes([9]) + blob[6:]):
+            with self.assertRaises(ValueError):
+                parse_embedding(bad)
+            self.assertIsNone(decode_embedding(bad))
+
+    def test_update_validates_and_quantizes(self):
+        typed = base64.b64encode(encode_embedding(self.vector, dtype='float16')[:-2]).decode()
+        response = self.patch({'vector_embedding': typed})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        raw = base64.b64encode(encode(self.vector)).decode()
+        response = self.patch({'vector_embedding': raw, 'embedding_dtype': 'int8', 'embedding_model': 'small'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.topic.refresh_from_db()
+        embedding = parse_embedding(self.topic.vector_embedding)
+        self.assertEqual((embedding.dtype, embedding.model), ('int8', 'small'))
+
+        response = self.patch({'vector_embedding': base64.b64encode(b"abc").decode(), 'embedding_dtype': 'float16'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_convert_command(self):
+        out = StringIO()
+        call_command('convert_embeddings', dtype='float16', kind='topic', dry_run=True, batch_size=1, stdout=out)
+        self.assertIn('Would convert 1 topic embeddings', out.getvalue())
+        self.topic.refresh_from_db()
+        self.assertFalse(is_typed_embedding(bytes(self.topic.vector_embedding)))
+
+        out = StringIO()
+        call_command('convert_embeddings', dtype='float16', model='small', kind='topic', stdout=out)
+        self.assertIn('Converted 1 topic embeddings', out.getvalue())
+        self.topic.refresh_from_db()
+        self.broken.refresh_from_db()
+        self.assertEqual(parse_embedding(self.topic.vector_embedding).model, 'small')
+        self.assertEqual(bytes(self.broken.vector_embedding), b"abc")
+        matrix = get_embedding_matrix('topic')
+        np.testing.assert_allclose(matrix.vector_of(self.topic.id), self.vector / np.linalg.norm(self.vector), atol=1e-3)
@@ -0,0 +1,111 @@
+import base64
+import json
+import os
+import tempfile
+import numpy as np
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..embeddings import encode_embedding
+from ..export import embedding_export_dimension, embedding_record_dtype, export_pairs
+from ..models import ContrastPair, ContrastTag, Temator
+from ..rating_aggregates import upsert_rating
+
+
+def encode(values):
+    return np.asarray(values, dtype='<f4').tobytes()
+
+
+class CorpusExportTestCase(TestCase):
+    """
+    Tests for the streaming /words/agent/export/ endpoint and the export_corpus command.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.sport = Temator.objects.create(name="sport", vector_embedding=encode([1, 0, 0]))
+        cls.cooking = Temator.objects.create(name="cooking", vector_embedding=encode_embedding([0, 0, 2], dtype='float16'))
+        cls.plain = Temator.objects.create(name="plain")
+        cls.odd = Temator.objects.create(name="odd", vector_embedding=encode([1, 2]))
+        cls.pair = ContrastPair.objects.create(item1="ogień", item2="woda", vector_embedding=encode([0, 1, 0]))
+        cls.other_pair = ContrastPair.objects.create(item1="noc", item2="dzień")
+        cls.tag = ContrastTag.objects.create(name="żywioły")
+        cls.tag.pairs.add(cls.pair)
+        upsert_rating(cls.pair.id, 'a', 4)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+        self.url = reverse('agent:agent-export')
+
+    def export(self, **params):
+        response = self.client.get(self.url, params, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_topics_ndjson(self):
+        response, body = self.export(kind='topics')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual([line['name'] for line in lines], ['sport', 'cooking', 'plain', 'odd'])
+        self.assertNotIn('vector_embedding', lines[0])
+
+        _, body = self.export(kind='topics', vector_embedding='true')
+        lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual(base64.b64decode(lines[0]['vector_embedding']), encode([1, 0, 0]))
+        self.assertIsNone(lines[2]['vector_embedding'])
+
+    def test_pairs_and_ratings_ndjson(self):
+        self.pair.refresh_from_db()
+        _, body = self.export(kind='pairs')
+        lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual(lines[0]['item1'], 'ogień')
+        self.assertEqual(lines[0]['tags'], [self.tag.id])
+        self.assertEqual((lines[0]['rating_count'], lines[0]['avg_rating']), (1, 4.0))
+        self.assertEqual(lines[0]['created_at'], self.pair.created_at.isoformat())
+        self.assertEqual(lines[1]['tags'], [])
+
+        _, body = self.export(kind='ratings')
+        lines = [json.loads(line) for line in body.decode('utf-8').splitlines()]
+        self.assertEqual([(line['contrast_pair_id'], line['rating']) for line in lines], [(self.pair.id, 4)])
+
+    def test_pairs_are_read_in_chunks(self):
+        ContrastPair.objects.bulk_create([ContrastPair(item1=f"a{i}", item2=f"b{i}") for i in range(25)])
+        chunks = list(export_pairs(chunk_size=10))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(sum(chunk.count(b'\n') for chunk in chunks), 27)
+
+    def test_embeddings_f32(self):
+        response, body = self.export(kind='topics', output='f32')
+        self.assertEqual(response['X-Embedding-Dimension'], '3')
+        records = np.frombuffer(body, dtype=embedding_record_dtype(3))
+        # Embeddings without a vector or with another dimension are skipped
+        self.assertEqual(records['id'].tolist(), [self.sport.id, self.cooking.id])
+        np.testing.assert_allclose(records['vector'], [[1, 0, 0], [0, 0, 2]])
+
+    def test_export_dimension_is_the_most_common_one(self):
+        # The first embedding by id has 2 values, most have 3 (NaN ones don't count)
+        Temator.objects.filter(id=self.sport.id).update(vector_embedding=encode([1, 2]))
+        Temator.objects.bulk_create([Temator(name=f"extra {i}", vector_embedding=encode([0, 1, i])) for i in range(2)])
+        Temator.objects.create(name="nan", vector_embedding=encode([float('nan'), 1]))
+        Temator.objects.create(name="nan 2", vector_embedding=encode([float('nan'), 2]))
+        self.assertEqual(embedding_export_dimension('topics'), 3)
+        self.assertEqual(embedding_export_dimension('pairs'), 3)
+
+    def test_invalid_requests(self):
+        for params in ({'kind': 'words'}, {'kind': 'ratings', 'output': 'f32'}, {'kind': 'topics', 'output': 'csv'}):
+            response = self.client.get(self.url, params, **self.agent_headers)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'kind': 'topics'}).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'pairs.f32')
+            call_command('export_corpus', 'pairs', '--format', 'f32', '--output', path, stdout=StringIO())
+            with open(path, 'rb') as stream:
+                records = np.frombuffer(stream.read(), dtype=embedding_record_dtype(3))
+        self.assertEqual(records['id'].tolist(), [self.pair.id])
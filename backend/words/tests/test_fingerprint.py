@@ -0,0 +1,36 @@
+import hashlib
+from unittest import mock
+from django.test import RequestFactory, TestCase
+from rest_framework.test import APIClient
+from user_agents import parse
+from core.middleware import _fingerprint_prefix, get_user_agent, get_user_fingerprint, parse_user_agent
+from ..models import ContrastPair, ContrastPairRating
+
+FIREFOX = "Mozilla/5.0 (X11; Linux x86_64; rv:120.0) Gecko/20100101 Firefox/120.0"
+
+
+class UserFingerprintTestCase(TestCase):
+    """
+    Tests for the cached user agent parsing and the rating fingerprint.
+    """
+    def test_fingerprint_matches_the_stored_format(self):
+        request = RequestFactory().get('/', HTTP_USER_AGENT=FIREFOX, REMOTE_ADDR='10.0.0.1')
+        user_agent = parse(FIREFOX)
+        expected = hashlib.sha256(
+            f"{user_agent.browser.family}-{user_agent.browser.version_string}-"
+            f"{user_agent.os.family}-{user_agent.os.version_string}-10.0.0.1".encode('utf-8')
+        ).hexdigest()
+        self.assertEqual(get_user_fingerprint(request), expected)
+        self.assertEqual(get_user_agent(request).browser.family, 'Firefox')
+
+    def test_parse_is_cached_per_user_agent(self):
+        parse_user_agent.cache_clear()
+        _fingerprint_prefix.cache_clear()
+        client = APIClient(HTTP_USER_AGENT=FIREFOX)
+        pair = ContrastPair.objects.create(item1="noc", item2="dzień")
+        with mock.patch('core.middleware.parse', wraps=parse) as parse_mock:
+            for rating in (2, 4, 5):
+                client.post(f'/words/contrast-pairs/{pair.id}/rate/', {'rating': rating})
+        self.assertEqual(parse_mock.call_count, 1)
+        # Same browser and address: one rating, changed in place
+        self.assertEqual(ContrastPairRating.objects.get().rating, 5)
@@ -0,0 +1,102 @@
+from datetime import timedelta
+from unittest import mock
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..models import CypherArenaPerplexityDeepResearch
+from ..news_search import ensure_news_search_index, news_search_index_exists
+
+
+def completion(text):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+class NewsSearchTestCase(TestCase):
+    """
+    Tests for the /words/agent/news/search/ full-text search.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.concert = CypherArenaPerplexityDeepResearch.objects.create(
+            data_response=completion("Quebonafide zagrał koncert na Stadionie Narodowym. Tłumy fanów."),
+            start_date=now - timedelta(days=10), end_date=now - timedelta(days=9), news_source="polish_showbiznes",
+        )
+        cls.album = CypherArenaPerplexityDeepResearch.objects.create(
+            data_response=completion("Nowy album Quebonafide. Quebonafide zapowiada trasę koncertową."),
+            start_date=now - timedelta(days=2), end_date=now - timedelta(days=1), news_source="polish_showbiznes",
+        )
+        cls.election = CypherArenaPerplexityDeepResearch.objects.create(
+            data_response=completion("Wybory samorządowe: wyniki w Krakowie."),
+            start_date=now - timedelta(days=2), end_date=now - timedelta(days=1), news_source="general_news",
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+        self.url = reverse('agent:agent-news-search')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['results']
+
+    def test_ranked_matches(self):
+        results = self.search(q='quebonafide')
+        # Two mentions rank above one
+        self.assertEqual([result['id'] for result in results], [self.album.id, self.concert.id])
+        self.assertIn('[Quebonafide]', results[0]['snippet'])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        # Every word is required; diacritics and case don't matter
+        self.assertEqual([result['id'] for result in self.search(q='quebonafide stadionie')], [self.concert.id])
+        self.assertEqual([result['id'] for result in self.search(q='wybory KRAKOWIE')], [self.election.id])
+        self.assertEqual([result['id'] for result in self.search(q='trase koncertowa')], [self.album.id])
+        # FTS operators in the input are plain words
+        self.assertEqual(self.search(q='quebonafide NOT "album'), [])
+
+    def test_filters(self):
+        since = (timezone.now() - timedelta(days=5)).isoformat()
+        self.assertEqual([result['id'] for result in self.search(q='quebonafide', start_time=since)], [self.album.id])
+        self.assertEqual(self.search(q='wyniki', news_type='polish_showbiznes'), [])
+        self.assertEqual(len(self.search(q='quebonafide', limit=1)), 1)
+        for params in ({}, {'q': 'x', 'limit': 0}, {'q': 'x', 'start_time': 'yesterday'}):
+            response = self.client.get(self.url, params, **self.agent_headers)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_index_follows_writes(self):
+        self.assertEqual([result['id'] for result in self.search(q='koncert')], [self.concert.id])
+        self.album.data_response = completion("Koncert odwołany.")
+        self.album.save()
+        self.assertEqual(sorted(result['id'] for result in self.search(q='koncert')), sorted([self.concert.id, self.album.id]))
+        self.concert.delete()
+        self.assertEqual([result['id'] for result in self.search(q='koncert')], [self.album.id])
+        created = CypherArenaPerplexityDeepResearch.objects.create(
+            data_response=completion("Koncert charytatywny"), start_date=timezone.now(), end_date=timezone.now(),
+        )
+        self.assertIn(created.id, [result['id'] for result in self.search(q='charytatywny')])
+
+    def test_missing_index_falls_back_to_a_scan(self):
+        with mock.patch('words.news_search.news_search_index_exists', return_value=False), \
+                mock.patch('words.news_search.ensure_news_search_index') as ensure:
+            results = self.search(q='quebonafide')
+        # Newest first and unranked; a search never creates the index
+        self.assertEqual([result['id'] for result in results], [self.album.id, self.concert.id])
+        self.assertIsNone(results[0]['rank'])
+        ensure.assert_not_called()
+        self.assertTrue(news_search_index_exists())
+
+    def test_index_is_not_created_before_the_news_table(self):
+        # post_migrate on a fresh database, before the words migrations ran
+        with mock.patch('words.news_search.news_search_index_exists', return_value=False) as exists, \
+                mock.patch.object(connection.introspection, 'table_names', return_value=[]):
+            self.assertFalse(ensure_news_search_index())
+        exists.assert_not_called()
+        # Table there, content column not added yet
+        with mock.patch('words.news_search.news_search_index_exists', return_value=False) as exists, \
+                mock.patch.object(connection.introspection, 'get_table_description', return_value=[]):
+            self.assertFalse(ensure_news_search_index())
+        exists.assert_not_called()
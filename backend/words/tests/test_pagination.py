@@ -0,0 +1,158 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..models import ContrastPair, CypherArenaPerplexityDeepResearch, Temator
+
+
+class KeysetPaginationTestCase(TestCase):
+    """
+    Tests for ?pagination=cursor on the agent list endpoints.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        pairs = ContrastPair.objects.bulk_create([ContrastPair(item1=f"a{i}", item2=f"b{i}") for i in range(25)])
+        # Several pairs share a timestamp so the id tiebreaker matters
+        now = timezone.now()
+        for i, pair in enumerate(pairs):
+            pair.created_at = now - timedelta(minutes=i // 3)
+        ContrastPair.objects.bulk_update(pairs, ['created_at'])
+        Temator.objects.bulk_create([Temator(name=f"topic {i:02d}") for i in range(12)])
+        CypherArenaPerplexityDeepResearch.objects.bulk_create([
+            CypherArenaPerplexityDeepResearch(start_date=now - timedelta(days=i), end_date=now) for i in range(5)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+
+    def crawl(self, url, params):
+        seen = []
+        response = self.client.get(url, params, **self.agent_headers)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            seen.extend(data['results'])
+            if data['next'] is None:
+                return seen
+            response = self.client.get(data['next'], **self.agent_headers)
+
+    def test_crawl_pairs_newest_first(self):
+        url = reverse('agent:agent-contrast-pair-list-create')
+        first = self.client.get(url, {'pagination': 'cursor', 'count': 10}, **self.agent_headers).json()
+        self.assertNotIn('total', first)
+        self.assertEqual(len(first['results']), 10)
+
+        # Pairs inserted mid-crawl (newest) don't shift the following pages
+        ContrastPair.objects.create(item1="late", item2="arrival")
+        seen = first['results'] + self.crawl(url, {'cursor': first['next_cursor'], 'count': 10})
+        ids = [pair['id'] for pair in seen]
+        self.assertEqual(len(ids), 25)
+        self.assertEqual(len(set(ids)), 25)
+        expected = list(
+            ContrastPair.objects.exclude(item1="late").order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_ascending_crawl_includes_rows_added_meanwhile(self):
+        url = reverse('agent:agent-contrast-pair-list-create')
+        first = self.client.get(url, {'pagination': 'cursor', 'order': 'asc', 'count': 10}, **self.agent_headers).json()
+        late = ContrastPair.objects.create(item1="late", item2="arrival")
+        # The next link keeps order=asc
+        seen = first['results'] + self.crawl(first['next'], {})
+        ids = [pair['id'] for pair in seen]
+        self.assertEqual(len(ids), 26)
+        self.assertEqual(ids[-1], late.id)
+        self.assertEqual(ids, list(ContrastPair.objects.order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_no_count_query_unless_requested(self):
+        url = reverse('agent:agent-contrast-pair-list-create')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {'pagination': 'cursor', 'fields': 'id'}, **self.agent_headers)
+        self.assertFalse(any('COUNT(' in query['sql'].upper() for query in queries))
+        response = self.client.get(url, {'pagination': 'cursor', 'total': 'true'}, **self.agent_headers)
+        self.assertEqual(response.json()['total'], 25)
+
+    def test_crawl_topics_and_news(self):
+        topics = self.crawl(reverse('agent:agent-topic-list-create-update'), {'pagination': 'cursor', 'count': 5, 'fields': 'name'})
+        self.assertEqual([topic['name'] for topic in topics], [f"topic {i:02d}" for i in range(12)])
+        news = self.crawl(reverse('agent:agent-news-list'), {'pagination': 'cursor', 'count': 2})
+        self.assertEqual(len(news), 5)
+        self.assertEqual(len({item['id'] for item in news}), 5)
+        news = self.crawl(reverse('agent:agent-news-list'), {'pagination': 'cursor', 'count': 2, 'order': 'asc', 'fields': 'start_date'})
+        self.assertEqual([item['start_date'] for item in news], sorted(item['start_date'] for item in news))
+
+    def test_invalid_requests(self):
+        url = reverse('agent:agent-contrast-pair-list-create')
+        response = self.client.get(url, {'cursor': 'not-a-cursor'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'pagination': 'cursor', 'random': 'true'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'pagination': 'cursor', 'order': 'sideways'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SeededOrderTestCase(TestCase):
+    """
+    Tests for seeded random ordering (core.ordering) on the list endpoints.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        ContrastPair.objects.bulk_create([ContrastPair(item1=f"a{i}", item2=f"b{i}") for i in range(30)])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+        self.url = reverse('agent:agent-contrast-pair-list-create')
+
+    def pages(self, params, count=10, pages=3):
+        ids = []
+        for page in range(1, pages + 1):
+            response = self.client.get(self.url, {**params, 'count': count, 'page': page}, **self.agent_headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(pair['id'] for pair in response.json()['results'])
+        return ids
+
+    def test_seeded_order_walks_the_stored_keys_from_the_pivot(self):
+        from core.ordering import shuffle_by_seed, shuffle_pivot
+        pivot = shuffle_pivot('abc')
+        rows = ContrastPair.objects.values_list('shuffle_key', 'id')
+        expected = sorted(rows, key=lambda row: (row[0] < pivot, row))
+        shuffled = shuffle_by_seed(ContrastPair.objects.all(), 'abc')
+        self.assertEqual([(pair.shuffle_key, pair.id) for pair in shuffled[0:30]], expected)
+        # Slices across the head / tail boundary
+        self.assertEqual([pair.id for pair in shuffled[5:25]], [obj_id for _, obj_id in expected[5:25]])
+        self.assertEqual(shuffled[29].id, expected[29][1])
+        self.assertEqual(shuffled[40:50], [])
+
+    def test_seeded_pages_partition_one_shuffle(self):
+        ids = self.pages({'random': 'true', 'seed': 'crawl-1'})
+        self.assertEqual(sorted(ids), sorted(ContrastPair.objects.values_list('id', flat=True)))
+        self.assertEqual(ids, self.pages({'random': 'true', 'seed': 'crawl-1'}))
+        # Seeds start at different rows (two pivots may fall between the same two keys)
+        self.assertGreater(len({tuple(self.pages({'random': 'true', 'seed': f'crawl-{i}'})) for i in range(3)}), 1)
+        self.assertNotEqual(ids, sorted(ids))
+
+    def test_seeded_cursor_pagination(self):
+        ids = []
+        response = self.client.get(self.url, {'random': 'true', 'seed': 7, 'pagination': 'cursor', 'count': 7}, **self.agent_headers)
+        while True:
+            data = response.json()
+            ids.extend(pair['id'] for pair in data['results'])
+            if data['next'] is None:
+                break
+            response = self.client.get(data['next'], **self.agent_headers)
+        self.assertEqual(ids, self.pages({'random': 'true', 'seed': 7}, count=30, pages=1))
+
+        response = self.client.get(self.url, {'random': 'true', 'pagination': 'cursor'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_public_list_seed(self):
+        first = self.client.get('/words/contrast-pairs/', {'seed': 'x', 'count': 15, 'page': 1}).json()['results']
+        second = self.client.get('/words/contrast-pairs/', {'seed': 'x', 'count': 15, 'page': 2}).json()['results']
+        self.assertEqual(len({pair['id'] for pair in first + second}), 30)
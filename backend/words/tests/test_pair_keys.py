@@ -0,0 +1,52 @@
+from io import StringIO
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase
+from ..models import ContrastPair, ContrastTag
+from ..rating_aggregates import upsert_rating
+
+
+class PairKeyTestCase(TestCase):
+    """
+    Tests for the duplicate checks built on ContrastPair.pair_key.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.pair = ContrastPair.objects.create(item1="ogień", item2="woda")
+
+    def test_full_clean_reports_duplicates(self):
+        with self.assertRaises(ValidationError) as raised:
+            ContrastPair(item1="WODA ", item2="ogień").full_clean()
+        self.assertEqual(raised.exception.messages, ["This contrast pair already exists."])
+        self.pair.item1 = "Ogień"
+        self.pair.full_clean()
+
+    def make_legacy_duplicate(self):
+        # Rows from before pair_key existed
+        duplicate = ContrastPair.objects.create(item1="tymczasowa", item2="para")
+        ContrastPair.objects.filter(pk=duplicate.pk).update(item1="woda", item2="OGIEŃ", pair_key=None)
+        ContrastPair.objects.filter(pk=self.pair.pk).update(pair_key=None)
+        return duplicate
+
+    def test_backfill_reports_duplicates(self):
+        duplicate = self.make_legacy_duplicate()
+        out = StringIO()
+        call_command('backfill_pair_keys', stdout=out)
+        self.assertIn(f'Pair {duplicate.id} "woda vs OGIEŃ" duplicates pair {self.pair.id}', out.getvalue())
+        self.assertIn('1 duplicates left without a key; rerun with --merge', out.getvalue())
+        self.assertIsNone(ContrastPair.objects.get(pk=duplicate.pk).pair_key)
+
+    def test_backfill_merges_duplicates(self):
+        duplicate = self.make_legacy_duplicate()
+        upsert_rating(self.pair.id, "a", 5)
+        upsert_rating(duplicate.id, "a", 1)
+        upsert_rating(duplicate.id, "b", 3)
+        ContrastTag.objects.create(name="natura").pairs.add(duplicate)
+
+        call_command('backfill_pair_keys', '--merge', stdout=StringIO())
+        self.assertFalse(ContrastPair.objects.filter(pk=duplicate.pk).exists())
+        self.pair.refresh_from_db()
+        self.assertEqual(self.pair.pair_key, ContrastPair.make_pair_key("ogień", "woda"))
+        self.assertEqual(sorted(self.pair.ratings.values_list('user_fingerprint', 'rating')), [('a', 5), ('b', 3)])
+        self.assertEqual((self.pair.rating_count, self.pair.avg_rating), (2, 4))
+        self.assertEqual(list(self.pair.tags.values_list('name', flat=True)), ['natura'])
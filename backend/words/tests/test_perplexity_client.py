@@ -0,0 +1,289 @@
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from core.celery import app as celery_app
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import CypherArenaPerplexityDeepResearch
+from ..perplexity_deep_research import (
+    PerplexityError,
+    backoff_delay,
+    date_windows,
+    search_internet,
+    search_many,
+    search_window,
+)
+from ..tasks import backfill_news_search, daily_search, run_news_searches
+
+
+class StubPerplexity(BaseHTTPRequestHandler):
+    """Chat completions endpoint answering from the server's `responses` queue ((status, delay) items)."""
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append((self.path, self.headers["Authorization"], payload))
+            status, delay = server.responses.pop(0) if server.responses else (200, server.delay)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(delay)
+            if status == 200:
+                body = {"model": payload["model"], "choices": [{"message": {"content": payload["messages"][1]["content"][:40]}}]}
+            else:
+                body = {"error": "busy"}
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubPerplexityMixin:
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubPerplexity)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests, self.server.responses = [], []
+        self.server.delay = 0
+        self.server.in_flight = self.server.max_in_flight = 0
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        settings_override = override_settings(
+            PERPLEXITY_BASE_URL=f"http://127.0.0.1:{self.server.server_port}/",
+            PERPLEXITY_API_KEY="test-key",
+            PERPLEXITY_TIMEOUT=5,
+            PERPLEXITY_MAX_CONCURRENCY=4,
+            PERPLEXITY_MAX_RETRIES=2,
+            SEARCH_WINDOW_LOCK_URL="",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+
+class PerplexityClientTestCase(StubPerplexityMixin, TestCase):
+    """
+    Tests for the async Perplexity client against a local stub server.
+    """
+    def setUp(self):
+        super().setUp()
+        self.end = timezone.make_aware(datetime(2025, 3, 10))
+        self.start = self.end - timedelta(days=2)
+
+    def test_search_internet_saves_response(self):
+        response = search_internet(self.start, self.end, name="general_news")
+
+        path, authorization, payload = self.server.requests[0]
+        self.assertEqual(path, "/chat/completions")
+        self.assertEqual(authorization, "Bearer test-key")
+        self.assertEqual(payload["model"], "sonar-pro")
+        self.assertIn("2025-03-08", payload["messages"][1]["content"])
+        record = CypherArenaPerplexityDeepResearch.objects.get()
+        self.assertEqual(record.data_response, response)
+        self.assertEqual(record.news_source, "general_news")
+        self.assertEqual(record.search_type, "sonar-pro")
+
+    def test_repeated_search_is_served_from_cache(self):
+        first = search_internet(self.start, self.end, name="general_news")
+        second = search_internet(self.start, self.end, name="general_news")
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.server.requests), 1)
+
+        search_internet(self.start, self.end, name="general_news", bypass_cache=True)
+        self.assertEqual(len(self.server.requests), 2)
+        # Same window: saved once (unique constraint)
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.count(), 1)
+
+    def test_window_saved_meanwhile_is_not_duplicated(self):
+        CypherArenaPerplexityDeepResearch.objects.create(
+            data_response={"content": "saved"}, news_source="general_news", start_date=self.start, end_date=self.end,
+        )
+        records = search_many([(self.start, self.end, "general_news"), (self.start, self.end, "polish_showbiznes")])
+
+        self.assertIsNone(records[0])
+        self.assertEqual(records[1].news_source, "polish_showbiznes")
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.count(), 2)
+        self.assertEqual(search_internet(self.start, self.end, name="general_news"), {"content": "saved"})
+
+    def test_searches_run_concurrently_within_limit(self):
+        self.server.delay = 0.2
+        jobs = [(self.start - timedelta(days=2 * i), self.end - timedelta(days=2 * i), name)
+                for i in range(3) for name in ("general_news", "polish_showbiznes")]
+
+        records = search_many(jobs, max_concurrency=3)
+
+        self.assertEqual([(r.start_date.date(), r.news_source) for r in records], [(s.date(), n) for s, _, n in jobs])
+        self.assertEqual(len(self.server.requests), 6)
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertLessEqual(self.server.max_in_flight, 3)
+
+    def test_retries_rate_limits_and_server_errors(self):
+        self.server.responses = [(429, 0), (503, 0)]
+        with mock.patch("words.perplexity_deep_research.backoff_delay", return_value=0):
+            search_internet(self.start, self.end, name="polish_showbiznes")
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.count(), 1)
+
+    def test_retries_are_bounded(self):
+        self.server.responses = [(500, 0)] * 3
+        with mock.patch("words.perplexity_deep_research.backoff_delay", return_value=0):
+            with self.assertRaises(PerplexityError) as raised:
+                search_many([(self.start, self.end, "general_news")])
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(raised.exception.errors[(self.start, self.end, "general_news")].status, 500)
+        self.assertFalse(CypherArenaPerplexityDeepResearch.objects.exists())
+
+    def test_failed_search_does_not_lose_the_others(self):
+        # Client errors are not retried
+        self.server.responses = [(400, 0)]
+        with self.assertRaises(PerplexityError) as raised:
+            search_many([(self.start, self.end, "general_news"), (self.start, self.end, "polish_showbiznes")], max_concurrency=1)
+
+        self.assertEqual(list(raised.exception.errors), [(self.start, self.end, "general_news")])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.get().news_source, "polish_showbiznes")
+
+    def test_timeout(self):
+        self.server.responses = [(200, 0.5)]
+        with self.assertRaises(PerplexityError) as raised:
+            search_many([(self.start, self.end, "general_news")], timeout=0.2, max_retries=0)
+        self.assertIsInstance(raised.exception.errors[(self.start, self.end, "general_news")], TimeoutError)
+
+    def test_unknown_search_type_fails_before_any_request(self):
+        with self.assertRaises(ValueError):
+            search_many([(self.start, self.end, "general_news"), (self.start, self.end, "sport")])
+        self.assertEqual(self.server.requests, [])
+
+    def test_backoff_delay(self):
+        self.assertEqual(backoff_delay(3, retry_after="2"), 2.0)
+        for attempt in range(8):
+            self.assertLessEqual(backoff_delay(attempt), 30.0)
+
+
+class NewsSearchTasksTestCase(StubPerplexityMixin, TestCase):
+    """
+    Tests for the parallel, idempotent news search tasks (run eagerly).
+    """
+    def setUp(self):
+        super().setUp()
+        # Chords store their header results even when run eagerly: no Redis needed with the memory backend
+        eager = {"CELERY_TASK_ALWAYS_EAGER": True, "CELERY_TASK_EAGER_PROPAGATES": True, "CELERY_RESULT_BACKEND": "cache+memory://"}
+        previous = {key: celery_app.conf.get(key) for key in eager}
+        celery_app.conf.update(eager)
+        self.addCleanup(celery_app.conf.update, previous)
+        self.reset_result_backend()
+        self.addCleanup(self.reset_result_backend)
+
+    def reset_result_backend(self):
+        # The app caches its backend instance; the next use rebuilds it from the current config
+        celery_app._backend_cache = None
+        celery_app._local.__dict__.pop("backend", None)
+
+    def test_date_windows(self):
+        self.assertEqual(date_windows(date(2025, 3, 1), date(2025, 3, 7), 2), [
+            (date(2025, 3, 1), date(2025, 3, 3)), (date(2025, 3, 4), date(2025, 3, 6)), (date(2025, 3, 7), date(2025, 3, 7)),
+        ])
+        self.assertEqual(date_windows(date(2025, 3, 1), date(2025, 3, 2), 0), [
+            (date(2025, 3, 1), date(2025, 3, 1)), (date(2025, 3, 2), date(2025, 3, 2)),
+        ])
+
+    def test_daily_search_fans_out_per_category(self):
+        daily_search.apply()
+
+        end_day = timezone.localdate() - timedelta(days=1)
+        records = CypherArenaPerplexityDeepResearch.objects.order_by("news_source")
+        self.assertEqual([r.news_source for r in records], ["general_news", "polish_showbiznes"])
+        self.assertEqual({r.end_date.date() for r in records}, {end_day})
+        self.assertEqual({r.start_date.date() for r in records}, {end_day - timedelta(days=2)})
+
+    def test_backfill_skips_windows_with_records(self):
+        backfill_news_search.run("2025-03-01", "2025-03-06", names=["general_news"])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.count(), 2)
+
+        # A rerun over a larger range only fetches the new windows; a failed one is fetched by the next run
+        self.server.responses = [(400, 0)]
+        backfill_news_search.run("2025-03-01", "2025-03-11", names=["general_news"])
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.count(), 3)
+
+        backfill_news_search.run("2025-03-01", "2025-03-11", names=["general_news"])
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.count(), 4)
+
+    def test_backfill_batches_share_the_client(self):
+        self.server.delay = 0.2
+        # 3 windows x 2 categories: one task with 4 searches, one with 2
+        summary = run_news_searches(date_windows(date(2025, 3, 1), date(2025, 3, 9), 2)).get()
+        self.assertEqual(len(summary["created"]), 6)
+        self.assertEqual(self.server.max_in_flight, 4)
+
+    def test_summary(self):
+        CypherArenaPerplexityDeepResearch.objects.create(
+            data_response={}, news_source="general_news",
+            start_date=timezone.make_aware(datetime(2025, 3, 1, 12)), end_date=timezone.make_aware(datetime(2025, 3, 3, 12)),
+        )
+        self.server.responses = [(400, 0)]
+        summary = run_news_searches(
+            [(date(2025, 3, 1), date(2025, 3, 3))], names=["general_news", "polish_showbiznes"]
+        ).get()
+        self.assertEqual(summary["skipped"], ["perplexity:general_news:2025-03-01:2025-03-03"])
+        self.assertEqual(list(summary["failed"]), ["perplexity:polish_showbiznes:2025-03-01:2025-03-03"])
+        self.assertEqual(summary["created"], [])
+
+    def test_window_locked_by_another_worker(self):
+        class HeldLock:
+            def acquire(self):
+                return False
+
+        with mock.patch("words.perplexity_deep_research.search_window_lock", return_value=HeldLock()):
+            result = search_window("general_news", date(2025, 3, 1), date(2025, 3, 3))
+        self.assertEqual(result, {"key": "perplexity:general_news:2025-03-01:2025-03-03", "status": "running"})
+        self.assertEqual(self.server.requests, [])
+
+    @override_settings(SEARCH_WINDOW_LOCK_URL="redis://127.0.0.1:1/0")
+    def test_unreachable_lock_server_falls_back_to_the_constraint(self):
+        result = search_window("general_news", date(2025, 3, 1), date(2025, 3, 3))
+        self.assertEqual(result["status"], "created")
+
+    def test_window_saved_by_a_concurrent_run_is_skipped(self):
+        start = timezone.make_aware(datetime(2025, 3, 1))
+        CypherArenaPerplexityDeepResearch.objects.create(
+            data_response={}, news_source="general_news", start_date=start, end_date=start + timedelta(days=2),
+        )
+        # The other run saved it after this one checked
+        with mock.patch("words.perplexity_deep_research.search_window_exists", return_value=False):
+            result = search_window("general_news", date(2025, 3, 1), date(2025, 3, 3))
+        self.assertEqual(result["status"], "skipped")
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.count(), 1)
+
+    def test_backfill_command(self):
+        out = StringIO()
+        call_command("backfill_news_search", "2025-03-01", "2025-03-03", "--category", "polish_showbiznes", stdout=out)
+        self.assertIn("Queued 1 searches", out.getvalue())
+        self.assertEqual(CypherArenaPerplexityDeepResearch.objects.get().news_source, "polish_showbiznes")
@@ -0,0 +1,117 @@
+import json
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..models import ContrastPair, ContrastPairRating
+
+
+class RatingAggregatesTestCase(TestCase):
+    """
+    Tests for the denormalized rating aggregates on ContrastPair.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.pair = ContrastPair.objects.create(item1="ogień", item2="woda")
+        cls.other_pair = ContrastPair.objects.create(item1="noc", item2="dzień")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+
+    def rate(self, pair, rating, remote_addr='127.0.0.1'):
+        return self.client.post(f'/words/contrast-pairs/{pair.id}/rate/', {'rating': rating}, REMOTE_ADDR=remote_addr)
+
+    def assertAggregates(self, pair, count, total, minimum, average):
+        pair.refresh_from_db()
+        self.assertEqual(pair.rating_count, count)
+        self.assertEqual(pair.rating_sum, total)
+        self.assertEqual(pair.min_rating, minimum)
+        if average is None:
+            self.assertIsNone(pair.avg_rating)
+        else:
+            self.assertAlmostEqual(pair.avg_rating, average)
+
+    def test_create_change_and_delete(self):
+        self.assertEqual(self.rate(self.pair, 4, '10.0.0.1').status_code, status.HTTP_200_OK)
+        self.rate(self.pair, 2, '10.0.0.2')
+        self.assertAggregates(self.pair, 2, 6, 2, 3.0)
+
+        # Raising the lowest rating recomputes the minimum
+        self.rate(self.pair, 5, '10.0.0.2')
+        self.assertAggregates(self.pair, 2, 9, 4, 4.5)
+
+        # Lowering a rating
+        self.rate(self.pair, 1, '10.0.0.1')
+        self.assertAggregates(self.pair, 2, 6, 1, 3.0)
+
+        ContrastPairRating.objects.filter(contrast_pair=self.pair, rating=1).delete()
+        self.assertAggregates(self.pair, 1, 5, 5, 5.0)
+        ContrastPairRating.objects.filter(contrast_pair=self.pair).delete()
+        self.assertAggregates(self.pair, 0, 0, None, None)
+
+    def test_agent_batch_rate_updates_aggregates(self):
+        payload = {'ratings': [{'pair_id': self.pair.id, 'rating': 3}, {'pair_id': self.other_pair.id, 'rating': 1}]}
+        response = self.client.post(reverse('agent:agent-contrast-pair-batch-rate'), data=json.dumps(payload),
+                                    content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertAggregates(self.pair, 1, 3, 3, 3.0)
+        self.assertAggregates(self.other_pair, 1, 1, 1, 1.0)
+
+    def test_public_list_only_returns_unrated_pairs(self):
+        self.rate(self.pair, 3)
+        response = self.client.get('/words/contrast-pairs/')
+        data = response.json()
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['results'][0]['id'], self.other_pair.id)
+
+    def test_agent_list_rating_filters(self):
+        self.rate(self.pair, 5)
+        url = reverse('agent:agent-contrast-pair-list-create')
+        response = self.client.get(url, {'min_avg_rating': 4}, **self.agent_headers)
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.pair.id])
+        response = self.client.get(url, {'rated': 'false'}, **self.agent_headers)
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.other_pair.id])
+        response = self.client.get(url, {'min_avg_rating': 'high'}, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_command(self):
+        ContrastPairRating.objects.bulk_create([
+            ContrastPairRating(contrast_pair=self.pair, user_fingerprint='a', rating=2),
+            ContrastPairRating(contrast_pair=self.pair, user_fingerprint='b', rating=5),
+        ])
+        self.assertAggregates(self.pair, 0, 0, None, None)
+        call_command('rebuild_rating_aggregates', stdout=StringIO())
+        self.assertAggregates(self.pair, 2, 7, 2, 3.5)
+        self.assertAggregates(self.other_pair, 0, 0, None, None)
+
+    def test_agent_batch_rate_is_set_based(self):
+        pairs = ContrastPair.objects.bulk_create([ContrastPair(item1=f"a{i}", item2=f"b{i}") for i in range(2000)])
+        ratings = [{'pair_id': pair.id, 'rating': 1 + i % 5} for i, pair in enumerate(pairs)]
+        # Duplicate entry (last one wins) and a missing pair
+        ratings += [{'pair_id': pairs[0].id, 'rating': 4}, {'pair_id': 999999, 'rating': 2}]
+        url = reverse('agent:agent-contrast-pair-batch-rate')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data=json.dumps({'ratings': ratings}),
+                                        content_type='application/json', **self.agent_headers)
+        # A handful of batched queries instead of ~3 per rating
+        self.assertLess(len(queries), 30)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = response.json()
+        self.assertEqual(data['updated_count'], 2001)
+        self.assertEqual(data['errors'], ["ContrastPair with id 999999 does not exist."])
+        self.assertEqual(ContrastPairRating.objects.count(), 2000)
+        self.assertAggregates(pairs[0], 1, 4, 4, 4.0)
+        self.assertAggregates(pairs[7], 1, 3, 3, 3.0)
+
+        # Re-rating updates in place
+        response = self.client.post(url, data=json.dumps({'ratings': [{'pair_id': pairs[7].id, 'rating': 5}]}),
+                                    content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.json()['updated_count'], 1)
+        self.assertEqual(ContrastPairRating.objects.count(), 2000)
+        self.assertAggregates(pairs[7], 1, 5, 5, 5.0)
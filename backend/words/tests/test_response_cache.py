@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from ..models import ExternalResponseCache, ExternalResponseCacheCounter
+from ..response_cache import (
+    cached_response,
+    evict_responses,
+    get_cached_response,
+    response_cache_key,
+    STORED_BYTES_COUNTER,
+    response_cache_stats,
+    store_response,
+)
+
+
+class ResponseCacheTestCase(TestCase):
+    """
+    Tests for the persistent LLM / search response cache.
+    """
+    def setUp(self):
+        self.calls = []
+
+    def fetch(self, response):
+        def call():
+            self.calls.append(response)
+            return response
+        return call
+
+    def test_key_covers_model_and_prompts(self):
+        key = response_cache_key("sonar-pro", "system", "user")
+        self.assertEqual(len(key), 64)
+        self.assertEqual(key, response_cache_key("sonar-pro", "system", "user"))
+        self.assertNotEqual(key, response_cache_key("sonar", "system", "user"))
+        self.assertNotEqual(key, response_cache_key("sonar-pro", "system", "other"))
+        # No ambiguity from concatenation
+        self.assertNotEqual(response_cache_key("m", "ab", "c"), response_cache_key("m", "a", "bc"))
+
+    def test_hit_after_miss(self):
+        first = cached_response("gemini", "", "prompt", self.fetch({"text": "one"}))
+        second = cached_response("gemini", "", "prompt", self.fetch({"text": "two"}))
+
+        self.assertEqual(first, {"text": "one"})
+        self.assertEqual(second, {"text": "one"})
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(response_cache_stats(), {"hits": 1, "misses": 1, "bypassed": 0})
+
+    def test_bypass_refreshes_entry(self):
+        cached_response("gemini", "", "prompt", self.fetch({"text": "one"}))
+        refreshed = cached_response("gemini", "", "prompt", self.fetch({"text": "two"}), bypass=True)
+        again = cached_response("gemini", "", "prompt", self.fetch({"text": "three"}))
+
+        self.assertEqual(refreshed, {"text": "two"})
+        self.assertEqual(again, {"text": "two"})
+        self.assertEqual(ExternalResponseCache.objects.count(), 1)
+        self.assertEqual(response_cache_stats()["bypassed"], 1)
+
+    def test_uncacheable_response_is_not_stored(self):
+        error = {"error": {"code": 429}}
+        cached_response("gemini", "", "prompt", self.fetch(error), cacheable=lambda response: "error" not in response)
+        self.assertFalse(ExternalResponseCache.objects.exists())
+
+    @override_settings(RESPONSE_CACHE_TTL=60)
+    def test_expired_entry_is_a_miss(self):
+        key = response_cache_key("gemini", "", "prompt")
+        store_response(key, "gemini", {"text": "old"})
+        ExternalResponseCache.objects.update(created_at=timezone.now() - timedelta(seconds=61))
+
+        self.assertIsNone(get_cached_response(key))
+        self.assertEqual(evict_responses(), 1)
+        self.assertFalse(ExternalResponseCache.objects.exists())
+
+    def test_size_bound_evicts_least_recently_used(self):
+        with override_settings(RESPONSE_CACHE_MAX_BYTES=10 ** 6):
+            for index in range(3):
+                store_response(response_cache_key("gemini", "", str(index)), "gemini", {"text": "x" * 100})
+            old = timezone.now() - timedelta(minutes=10)
+            ExternalResponseCache.objects.update(last_used_at=old)
+            # Reading an entry makes it recently used
+            get_cached_response(response_cache_key("gemini", "", "0"))
+        size = ExternalResponseCache.objects.values_list("size", flat=True).first()
+
+        with override_settings(RESPONSE_CACHE_MAX_BYTES=2 * size):
+            store_response(response_cache_key("gemini", "", "3"), "gemini", {"text": "x" * 100})
+
+        kept = {entry.key for entry in ExternalResponseCache.objects.all()}
+        self.assertEqual(kept, {response_cache_key("gemini", "", "0"), response_cache_key("gemini", "", "3")})
+
+    def test_stored_size_is_a_counter(self):
+        def counted():
+            return ExternalResponseCacheCounter.objects.get(name=STORED_BYTES_COUNTER).value
+
+        def actual():
+            return ExternalResponseCache.objects.aggregate(total=Sum("size"))["total"] or 0
+
+        # An entry stored before the counter existed is picked up by the first store
+        key = response_cache_key("gemini", "", "0")
+        ExternalResponseCache.objects.create(key=key, model="gemini", response={}, size=2,
+                                             created_at=timezone.now(), last_used_at=timezone.now())
+        store_response(response_cache_key("gemini", "", "1"), "gemini", {"text": "x" * 100})
+        self.assertEqual(counted(), actual())
+
+        with CaptureQueriesContext(connection) as queries:
+            store_response(key, "gemini", {"text": "replaced"})
+        self.assertEqual(counted(), actual())
+        self.assertFalse([query for query in queries if "SUM(" in query["sql"].upper()])
+
+        ExternalResponseCacheCounter.objects.filter(name=STORED_BYTES_COUNTER).update(value=10 ** 9)
+        with override_settings(RESPONSE_CACHE_MAX_BYTES=10 ** 6):
+            # The (drifted) counter is over the bound: eviction recomputes it and deletes nothing
+            store_response(response_cache_key("gemini", "", "2"), "gemini", {"text": "y"})
+        self.assertEqual(ExternalResponseCache.objects.count(), 3)
+        self.assertEqual(counted(), actual())
@@ -0,0 +1,99 @@
+import json
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..models import ChangeLogEntry, ContrastPair, ContrastTag
+from ..tag_index import TAG_INDEX_VERSION_KEY, bump_tag_index_version, get_tag_index, reset_tag_index
+
+
+class TagFilterTestCase(TestCase):
+    """
+    Tests for the tag filters of the pair lists and the batch tagging endpoint.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.fire = ContrastPair.objects.create(item1="ogień", item2="woda")
+        cls.night = ContrastPair.objects.create(item1="noc", item2="dzień")
+        cls.cold = ContrastPair.objects.create(item1="zimno", item2="ciepło")
+        cls.nature = ContrastTag.objects.create(name="natura")
+        cls.time = ContrastTag.objects.create(name="czas")
+        cls.nature.pairs.add(cls.fire, cls.night, cls.cold)
+        cls.time.pairs.add(cls.night)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.agent_headers = {'HTTP_X_AGENT_TOKEN': settings.AI_AGENT_SECRET_KEY}
+        reset_tag_index()
+
+    def agent_ids(self, **params):
+        response = self.client.get(reverse('agent:agent-contrast-pair-list-create'), params, **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(pair['id'] for pair in response.json()['results'])
+
+    def test_agent_any_and_all(self):
+        self.assertEqual(self.agent_ids(tags='czas'), [self.night.id])
+        self.assertEqual(self.agent_ids(tags='czas,natura'), sorted([self.fire.id, self.night.id, self.cold.id]))
+        self.assertEqual(self.agent_ids(tags='czas,natura', tag_match='all'), [self.night.id])
+        self.assertEqual(self.agent_ids(tags='czas,brak', tag_match='all'), [])
+        self.assertEqual(self.agent_ids(tags='brak'), [])
+        response = self.client.get(reverse('agent:agent-contrast-pair-list-create'), {'tags': 'czas', 'tag_match': 'some'},
+                                   **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_large_matches_use_subquery(self):
+        with mock.patch('words.tag_index.TAG_FILTER_MAX_IDS', 1):
+            self.assertEqual(self.agent_ids(tags='czas,natura', tag_match='all'), [self.night.id])
+            self.assertEqual(len(self.agent_ids(tags='czas,natura')), 3)
+
+    def test_public_list_filter(self):
+        response = self.client.get('/words/contrast-pairs/', {'tags': 'czas'})
+        self.assertEqual([pair['id'] for pair in response.json()['results']], [self.night.id])
+
+    def test_cached_sets_follow_tag_changes(self):
+        self.assertEqual(self.agent_ids(tags='czas'), [self.night.id])
+        index = get_tag_index()
+        self.time.pairs.add(self.fire)
+        self.assertIsNot(get_tag_index(), index)
+        self.assertEqual(self.agent_ids(tags='czas'), sorted([self.fire.id, self.night.id]))
+        self.client.post(f'/words/contrast-pairs/{self.cold.id}/add_tag/', {'tag': 'zima'})
+        self.assertEqual(self.agent_ids(tags='zima'), [self.cold.id])
+
+    def test_changes_made_by_other_processes(self):
+        index = get_tag_index()
+        # Another worker bumped the shared version
+        cache.incr(TAG_INDEX_VERSION_KEY)
+        self.assertIsNot(get_tag_index(), index)
+        # A flushed cache does not restart the version at a value a process may still hold
+        index = get_tag_index()
+        cache.delete(TAG_INDEX_VERSION_KEY)
+        self.assertIsNot(get_tag_index(), index)
+        self.assertNotIn(bump_tag_index_version(), (0, 1, index.version))
+
+    def test_batch_tag(self):
+        index = get_tag_index()
+        before = ChangeLogEntry.objects.count()
+        payload = {'assignments': [
+            {'pair_ids': [self.fire.id, self.cold.id], 'tags': ['żywioły', 'natura']},
+            {'pair_ids': [self.fire.id, 999999], 'tags': ['czas']},
+        ]}
+        response = self.client.post(reverse('agent:agent-contrast-pair-batch-tag'), data=json.dumps(payload),
+                                    content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        data = response.json()
+        self.assertEqual(data['errors'], ["ContrastPair with id 999999 does not exist."])
+        # fire and cold already had natura
+        self.assertEqual((data['tagged_count'], data['created_tags']), (3, ['żywioły']))
+        self.assertEqual(sorted(self.fire.tags.values_list('name', flat=True)), ['czas', 'natura', 'żywioły'])
+        self.assertIsNot(get_tag_index(), index)
+        self.assertEqual(self.agent_ids(tags='żywioły'), sorted([self.fire.id, self.cold.id]))
+        # One tag insert and one update per pair that gained a link
+        self.assertEqual(ChangeLogEntry.objects.count() - before, 3)
+
+        response = self.client.post(reverse('agent:agent-contrast-pair-batch-tag'),
+                                    data=json.dumps({'assignments': [{'pair_ids': [self.fire.id], 'tags': ['czas']}]}),
+                                    content_type='application/json', **self.agent_headers)
+        self.assertEqual(response.json()['tagged_count'], 0)
@@ -0,0 +1,136 @@
+import numpy as np
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..embedding_index import reset_embedding_indexes
+from ..embeddings import diverse_subset, normalize_rows, reset_embedding_matrices
+from ..models import Temator
+from ..permutations import FeistelPermutation
+
+
+class FeistelPermutationTestCase(TestCase):
+    def test_is_a_permutation(self):
+        for size in (0, 1, 2, 7, 100, 1000):
+            permutation = FeistelPermutation(size, seed=42)
+            self.assertEqual(sorted(permutation[i] for i in range(size)), list(range(size)))
+
+    def test_seed_changes_order(self):
+        first = [FeistelPermutation(100, seed=1)[i] for i in range(100)]
+        second = [FeistelPermutation(100, seed=2)[i] for i in range(100)]
+        self.assertNotEqual(first, second)
+
+
+class TopicRotationTestCase(TestCase):
+    """
+    Tests for /words/get_topics/ cursor based rotation.
+    """
+    url = '/words/get_topics/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Temator.objects.bulk_create([Temator(name=f"topic {i}") for i in range(60)])
+        # Leave holes in the id range
+        Temator.objects.filter(name__in=[f"topic {i}" for i in range(0, 60, 6)]).delete()
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_no_repeats_until_reset(self):
+        seen = []
+        # 50 topics, page size 10: four pages before the cycle restarts
+        for _ in range(4):
+            response = self.client.get(self.url, {'page_size': 10})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            words = response.json()['words']
+            self.assertEqual(len(words), 10)
+            seen.extend(words)
+        self.assertEqual(len(set(seen)), 40)
+        self.assertTrue(all(Temator.objects.filter(name=name).exists() for name in seen))
+
+        cursor = self.client.session['topic_cursor']
+        self.assertEqual(cursor['sent'], 40)
+
+        response = self.client.get(self.url, {'page_size': 10})
+        self.assertEqual(len(response.json()['words']), 10)
+        self.assertEqual(self.client.session['topic_cursor']['sent'], 10)
+
+    def test_small_table_returns_everything(self):
+        response = self.client.get(self.url, {'page_size': 100})
+        self.assertEqual(len(set(response.json()['words'])), 50)
+
+    def test_legacy_session_list_is_dropped(self):
+        session = self.client.session
+        session['sent_temator_ids'] = list(range(1000))
+        session.save()
+        self.client.get(self.url, {'page_size': 5})
+        self.assertNotIn('sent_temator_ids', self.client.session)
+
+
+class DiverseTopicTestCase(TestCase):
+    """
+    Tests for /words/get_topics/?diverse=true.
+    """
+    url = '/words/get_topics/'
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = np.random.default_rng(3)
+        cls.centers = normalize_rows(rng.normal(size=(5, 96)).astype(np.float32))
+        topics = []
+        # One dominant theme and four small ones, plus topics without embeddings
+        for cluster, size in enumerate((60, 5, 5, 5, 5)):
+            for i in range(size):
+                vector = cls.centers[cluster] + rng.normal(scale=0.01, size=96)
+                topics.append(Temator(name=f"theme {cluster} #{i}", vector_embedding=vector.astype('<f4').tobytes()))
+        topics += [Temator(name=f"plain #{i}") for i in range(20)]
+        Temator.objects.bulk_create(topics)
+
+    def setUp(self):
+        reset_embedding_matrices()
+        reset_embedding_indexes()
+        self.client = APIClient()
+
+    def test_diverse_subset_covers_clusters(self):
+        labels = np.repeat(np.arange(5), (60, 5, 5, 5, 5))
+        vectors = normalize_rows(self.centers[labels] + np.random.default_rng(0).normal(scale=0.01, size=(80, 96)).astype(np.float32))
+        picked = diverse_subset(vectors, 5)
+        self.assertEqual(sorted(labels[picked]), [0, 1, 2, 3, 4])
+        self.assertEqual(diverse_subset(vectors[:2], 5), [0, 1])
+
+    def test_diverse_pages(self):
+        seen = []
+        for _ in range(4):
+            response = self.client.get(self.url, {'page_size': 5, 'diverse': 'true'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            words = response.json()['words']
+            self.assertEqual(len(words), 5)
+            seen.extend(words)
+        self.assertEqual(len(set(seen)), len(seen))
+        # A pool of 20 holds ~4 plain topics and ~12 of the dominant theme
+        themes = {word.split(' #')[0] for word in seen}
+        self.assertIn('plain', themes)
+        self.assertGreater(len(themes), 3)
+
+    def test_diverse_cycle_shows_every_topic(self):
+        seen = []
+        # 100 topics, page size 5: 19 pages before the cycle restarts
+        for _ in range(19):
+            seen.extend(self.client.get(self.url, {'page_size': 5, 'diverse': 'true'}).json()['words'])
+        self.assertEqual(len(seen), 95)
+        self.assertEqual(len(set(seen)), 95)
+        cursor = self.client.session['topic_cursor']
+        self.assertEqual(cursor['sent'], 95)
+        self.assertLessEqual(len(cursor['carry']), 5)
+
+    def test_plain_pages_after_a_diverse_one(self):
+        seen = self.client.get(self.url, {'page_size': 5, 'diverse': 'true'}).json()['words']
+        self.assertTrue(self.client.session['topic_cursor']['carry'])
+        for _ in range(18):
+            words = self.client.get(self.url, {'page_size': 5}).json()['words']
+            self.assertEqual(len(words), 5)
+            seen.extend(words)
+        # The topics left over from the diverse pool were served by the plain pages
+        self.assertEqual(len(set(seen)), 95)
+        # Then a new cycle starts instead of empty pages
+        for _ in range(5):
+            self.assertEqual(len(self.client.get(self.url, {'page_size': 5}).json()['words']), 5)
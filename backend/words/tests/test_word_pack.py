@@ -0,0 +1,95 @@
+import gzip
+import shutil
+import tempfile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..models import Word
+from ..word_pack import accepted_encodings, decode_word_pack, encode_word_pack, publish_word_pack
+
+
+class WordPackTestCase(TestCase):
+    """
+    Tests for the versioned word pack endpoints.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        Word.objects.create(name="żaba", occurrence=20, speech_part="subst")
+        Word.objects.create(name="żabka", occurrence=30, speech_part="subst")
+        Word.objects.create(name="biegać", occurrence=40, speech_part=None)
+        Word.objects.create(name="rzadkie", occurrence=3, speech_part="adj")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.pack_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(WORD_PACK_DIR=self.pack_dir)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.pack_dir, ignore_errors=True)
+
+    def test_encode_decode_roundtrip(self):
+        words = [("ab", 1, None), ("abc", 2, "subst"), ("żaba", 3, "adj"), ("żabka", 4, "subst")]
+        self.assertEqual(decode_word_pack(encode_word_pack(words)), words)
+
+    def test_publish_is_idempotent(self):
+        manifest, published = publish_word_pack()
+        self.assertTrue(published)
+        self.assertEqual(manifest['count'], 3)
+        same, published = publish_word_pack()
+        self.assertFalse(published)
+        self.assertEqual(same['version'], manifest['version'])
+
+        Word.objects.create(name="nowe", occurrence=50)
+        changed, published = publish_word_pack()
+        self.assertTrue(published)
+        self.assertNotEqual(changed['version'], manifest['version'])
+
+    def test_manifest_before_first_build(self):
+        response = self.client.get(reverse('word_pack_manifest'))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+        # The request does not publish a pack itself
+        self.assertEqual(self.client.get(reverse('word_pack_manifest')).status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_accepted_encodings(self):
+        def names(header):
+            return [encoding for encoding, _ in accepted_encodings(header)]
+        self.assertEqual(names('gzip, deflate, br'), ['br', 'gzip'])
+        self.assertEqual(names('br;q=0, gzip'), ['gzip'])
+        self.assertEqual(names('gzip;q=0, br;q=0'), [])
+        self.assertEqual(names('gzip;q=1.0, br;q=0.5'), ['gzip', 'br'])
+        self.assertEqual(names('*;q=0.3, gzip;q=0'), ['br'])
+        self.assertEqual(names('identity'), [])
+        self.assertEqual(names(''), [])
+        self.assertEqual(names('BR ; Q=0.8'), ['br'])
+
+    def test_manifest_and_pack_download(self):
+        publish_word_pack()
+        response = self.client.get(reverse('word_pack_manifest'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        manifest = response.json()
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+
+        pack_url = reverse('word_pack', args=[manifest['version']])
+        response = self.client.get(pack_url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], f'"{manifest["version"]}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        words = decode_word_pack(gzip.decompress(b"".join(response.streaming_content)))
+        self.assertEqual([word[0] for word in words], ["biegać", "żaba", "żabka"])
+
+        response = self.client.get(pack_url, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(decode_word_pack(b"".join(response.streaming_content)), words)
+
+        response = self.client.get(pack_url, HTTP_IF_NONE_MATCH=f'"{manifest["version"]}"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_unknown_version(self):
+        publish_word_pack()
+        response = self.client.get(reverse('word_pack', args=['0123456789abcdef']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,129 @@
+import random
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework import status
+from ..models import Word
+from ..word_pool import WordBucket, get_word_pool, reset_word_pool
+
+
+class RandomWordPoolTestCase(TestCase):
+    """
+    Tests for /words/get_random_word/ backed by the in-memory word pool.
+    """
+    url = '/words/get_random_word/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Word.objects.bulk_create(
+            [Word(name=f"subst{i}", occurrence=10 + i, speech_part="subst") for i in range(20)]
+            + [Word(name=f"adj{i}", occurrence=10 + i, speech_part="adj") for i in range(20)]
+            + [Word(name=f"verb{i}", occurrence=10 + i, speech_part=None) for i in range(20)]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        reset_word_pool()
+
+    def test_default_threshold_filters_rare_words(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        words = response.json()['words']
+        # occurrence > 15 leaves 14 words per bucket
+        self.assertEqual(len(words), 42)
+        self.assertEqual(len(set(words)), 42)
+        self.assertNotIn('subst5', words)
+        self.assertIn('subst6', words)
+
+    def test_count_and_subst_ratio(self):
+        response = self.client.get(self.url, {'count': 10, 'subst_ratio': 0.5, 'occurrence_threshold': 0})
+        words = response.json()['words']
+        self.assertEqual(len(words), 10)
+        self.assertEqual(sum(word.startswith('subst') for word in words), 5)
+
+    def test_other_bucket_shortage_is_filled_with_subst(self):
+        response = self.client.get(self.url, {'count': 30, 'subst_ratio': 0, 'occurrence_threshold': 25})
+        words = response.json()['words']
+        # 4 adj + 4 verbs above the threshold, the rest comes from subst
+        self.assertEqual(len(words), 12)
+        self.assertEqual(sum(word.startswith('subst') for word in words), 4)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get(self.url, {'count': 'abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'subst_ratio': 2}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pool_is_patched_in_place_when_words_change(self):
+        pool = get_word_pool()
+        word = Word.objects.create(name="nowe", occurrence=100, speech_part="subst")
+        self.assertIs(get_word_pool(), pool)
+        self.assertEqual(pool.sample(100, 1, 99), ["nowe"])
+
+        word.speech_part = "adj"
+        word.save()
+        self.assertEqual(pool.sample(100, 0, 99), ["nowe"])
+        self.assertEqual(pool.buckets['subst'].eligible_count(99), 0)
+
+        word.delete()
+        self.assertEqual(pool.sample(100, 0.5, 99), [])
+        self.assertIs(get_word_pool(), pool)
+
+    def test_weighted_mode_prefers_frequent_words(self):
+        Word.objects.create(name="czesty", occurrence=1000000, speech_part="subst")
+        pool = get_word_pool()
+        hits = sum(
+            pool.sample(1, 1, 15, weighted=True)[0] == "czesty" for _ in range(50)
+        )
+        self.assertGreater(hits, 40)
+
+    def test_weighted_mode_endpoint(self):
+        response = self.client.get(self.url, {'mode': 'weighted', 'temperature': 2, 'count': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        words = response.json()['words']
+        self.assertEqual(len(words), 20)
+        self.assertEqual(len(set(words)), 20)
+        self.assertEqual(self.client.get(self.url, {'mode': 'weighted', 'temperature': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'mode': 'sorted'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_weighted_sample_drains_heavy_tailed_bucket(self):
+        bucket = WordBucket()
+        for i in range(200):
+            bucket.insert(i, f"w{i}", 10 ** (i % 12))
+        words = bucket.weighted_sample(0, 200, 0.1, random.Random(1))
+        self.assertEqual(sorted(words), sorted(f"w{i}" for i in range(200)))
+        bucket.remove(5, 10 ** 5)
+        self.assertEqual(len(set(bucket.weighted_sample(0, 500, 1.0, random.Random(2)))), 199)
+
+    def test_weighted_sample_follows_the_weights(self):
+        bucket = WordBucket()
+        for i, occurrence in enumerate([1, 2, 3, 4]):
+            bucket.insert(i, f"w{occurrence}", occurrence)
+        rng = random.Random(3)
+        firsts = [bucket.weighted_sample(0, 1, 1.0, rng)[0] for _ in range(4000)]
+        # P(w4) = 0.4, P(w1) = 0.1
+        self.assertAlmostEqual(firsts.count("w4") / 4000, 0.4, delta=0.03)
+        self.assertAlmostEqual(firsts.count("w1") / 4000, 0.1, delta=0.03)
+        # Temperature 0.5 squares the weights: P(w1) = 1 / 30
+        firsts = [bucket.weighted_sample(0, 1, 0.5, rng)[0] for _ in range(4000)]
+        self.assertAlmostEqual(firsts.count("w1") / 4000, 1 / 30, delta=0.015)
+
+    def test_cumulative_tables_are_kept_per_temperature(self):
+        bucket = WordBucket()
+        for i, occurrence in enumerate([0, 1, 2, 3]):
+            bucket.insert(i, f"w{occurrence}", occurrence)
+        table = bucket.cumulative_weights(1.0)
+        self.assertEqual(list(table), [0, 1 / 3, 1, 2])
+        self.assertIs(bucket.cumulative_weights(1.0), table)
+        self.assertAlmostEqual(bucket.cumulative_weights(0.5)[-1], 1 / 9 + 4 / 9 + 1)
+        # Zero occurrence words are only drawn once the others run out
+        self.assertNotIn("w0", bucket.weighted_sample(-1, 3, 1.0, random.Random(4)))
+        bucket.insert(4, "w6", 6)
+        self.assertEqual(bucket.cumulative_weights(1.0)[-1], 1 / 6 + 2 / 6 + 3 / 6 + 1)
+
+    def test_weighted_sample_with_few_heavy_words(self):
+        bucket = WordBucket()
+        for i in range(200):
+            bucket.insert(i, f"w{i}", 10 ** (i % 12))
+        # Redraws keep hitting the heaviest words, the rest is drawn with keys
+        words = bucket.weighted_sample(0, 150, 0.1, random.Random(5))
+        self.assertEqual(len(set(words)), 150)
+        self.assertTrue({f"w{i}" for i in range(11, 200, 12)} <= set(words))
@@ -7,6 +7,8 @@ from . import agent_views
 
 urlpatterns = [
     path('get_random_word/', views.RandomWordAPIView.as_view(), name='get_random_word'),  # For getting a random word as JSON
+    path('word_pack/', views.WordPackManifestAPIView.as_view(), name='word_pack_manifest'),
+    path('word_pack/<slug:version>/', views.WordPackAPIView.as_view(), name='word_pack'),
     path('get_topics/', views.TopicAPIView.as_view(), name='get_random_word'),  # For getting a random word as JSON
 ]
 
@@ -18,9 +20,14 @@ router.register(r'contrast-pairs', views.ContrastPairViewSet)
 agent_urlpatterns = [
     path('contrast-pairs/', agent_views.AgentContrastPairListCreateAPIView.as_view(), name='agent-contrast-pair-list-create'),
     path('contrast-pairs/rate/', agent_views.AgentContrastPairBatchRateAPIView.as_view(), name='agent-contrast-pair-batch-rate'),
+    path('contrast-pairs/tags/', agent_views.AgentContrastPairBatchTagAPIView.as_view(), name='agent-contrast-pair-batch-tag'),
     path('contrast-pairs/update/', agent_views.AgentContrastPairBatchUpdateAPIView.as_view(), name='agent-contrast-pair-batch-update'),
     path('news/', agent_views.AgentNewsListAPIView.as_view(), name='agent-news-list'),
+    path('news/search/', agent_views.AgentNewsSearchAPIView.as_view(), name='agent-news-search'),
     path('topics/', agent_views.AgentTopicListCreateUpdateAPIView.as_view(), name='agent-topic-list-create-update'),
+    path('similar/', agent_views.AgentSimilarAPIView.as_view(), name='agent-similar'),
+    path('export/', agent_views.AgentExportAPIView.as_view(), name='agent-export'),
+    path('changes/', agent_views.AgentChangesAPIView.as_view(), name='agent-changes'),
 ]
 
 urlpatterns += [
@@ -0,0 +1,41 @@
+import random
+from itertools import islice
+
+from django.core.cache import cache
+
+
+def chunked(iterable, size):
+    """Yield lists of at most `size` items from `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_cache_version(key):
+    """
+    Current value of the version counter `key` in the shared cache. A missing
+    key is seeded first, so the next bump is exactly this value + 1.
+    """
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, random.getrandbits(62), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """
+    Increment the version counter `key` in the shared cache and return it.
+    A missing key (first bump, flushed or evicted cache) is seeded with a
+    random value rather than 1, so it can't come back to a version some
+    process still holds and make that process miss the change.
+    """
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = random.getrandbits(62)
+        cache.set(key, version, timeout=None)
+        return version
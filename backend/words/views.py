@@ -9,16 +9,26 @@ from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import F
+from django.db.models import F, Count, Min, Max
 from random import sample
 from .models import ContrastPair, ContrastTag, ContrastPairRating
-from .serializers import ContrastPairSerializer2, TagSerializer
+from .serializers import ContrastPairSerializer2, TagSerializer, rating_ids_prefetch
 from django.db.models import Q
-from django_user_agents.utils import get_user_agent
-import hashlib
+from core.middleware import get_user_fingerprint
+import os
 from core.settings import AI_AGENT_SECRET_KEY
 from rest_framework.permissions import IsAuthenticated
 from core.permissions import IsValidSecretKey
+from core.ordering import shuffle_by_seed
+from .word_pool import get_word_pool
+from .permutations import FeistelPermutation
+from .embedding_index import get_embedding_index
+from .embeddings import diverse_subset
+from .rating_aggregates import upsert_rating
+from .tag_index import filter_by_tags, parse_tag_filter
+from . import word_pack
+from django.http import FileResponse, HttpResponseNotModified
+from django.urls import reverse
 
 # Existing soft_mode view for rendering HTML
 def soft_mode(request):
@@ -31,87 +41,234 @@ def hard_mode(request):
     return render(request, "soft_mode.html", {"countdown_duration": countdown_duration})
 
 class TopicAPIView(APIView):
+    """
+    Returns a page of random topics without repeats until (almost) every topic
+    was sent, then starts a new cycle.
+
+    The session only holds a cursor: a seed and an offset into a shuffled
+    permutation of the topic id range (see words.permutations), so the
+    session payload and the per-page cost stay O(1) / O(page_size).
+
+    With `diverse=true` a page spread over the embedding space is picked
+    (farthest-point selection, see embeddings.diverse_subset) from a pool of
+    DIVERSITY_POOL_FACTOR pages. Pool topics that were not picked are carried
+    over in the cursor (`carry`, at most MAX_DIVERSITY_POOL ids) and head the
+    next pool, which the permutation tops up, so they are still shown in this
+    cycle. Plain pages serve carried topics first as well.
+    """
+    CURSOR_SESSION_KEY = 'topic_cursor'
+    DIVERSITY_POOL_FACTOR = 4
+    MAX_DIVERSITY_POOL = 2000
+
+    def _new_cursor(self, stats):
+        min_id = stats['min_id'] or 0
+        max_id = stats['max_id'] or 0
+        return {
+            'seed': random.getrandbits(63),
+            'base': min_id,
+            'span': max_id - min_id + 1 if stats['total'] else 0,
+            'offset': 0,
+            'sent': 0,
+            'carry': [],
+        }
+
+    def _next_page(self, cursor, page_size, total_count):
+        """Advance the cursor and return up to page_size (id, name) topics."""
+        permutation = FeistelPermutation(cursor['span'], cursor['seed'])
+        base, span = cursor['base'], cursor['span']
+        offset = cursor['offset']
+        # Share of existing ids in the id range, used to over-fetch past deleted ids
+        density = total_count / span if span else 1
+        topics = []
+        while len(topics) < page_size and offset < span:
+            needed = page_size - len(topics)
+            batch_end = min(span, offset + int(needed / max(density, 0.01)) + 8)
+            candidate_ids = [base + permutation[position] for position in range(offset, batch_end)]
+            found = dict(Temator.objects.filter(id__in=candidate_ids).values_list('id', 'name'))
+            next_offset = batch_end
+            for position, topic_id in enumerate(candidate_ids, start=offset):
+                if topic_id in found:
+                    topics.append((topic_id, found[topic_id]))
+                    if len(topics) == page_size:
+                        next_offset = position + 1
+                        break
+            offset = next_offset
+        cursor['offset'] = offset
+        cursor['sent'] += len(topics)
+        return topics
+
+    def _diverse_page(self, candidates, page_size):
+        """
+        Pick page_size of the candidates spread over the embedding space.
+        Topics without a usable embedding keep their share of the page and
+        are taken in cursor (random) order.
+        """
+        if len(candidates) <= page_size:
+            return candidates
+        found, vectors = get_embedding_index('topic').vectors_of([topic_id for topic_id, _ in candidates])
+        embedded = [topic for topic, has_vector in zip(candidates, found) if has_vector]
+        plain = [topic for topic, has_vector in zip(candidates, found) if not has_vector]
+        plain_share = round(page_size * len(plain) / len(candidates))
+        picked = [embedded[position] for position in diverse_subset(vectors, page_size - plain_share)]
+        picked += plain[:page_size - len(picked)]
+        random.shuffle(picked)
+        return picked
+
+    def _take_carry(self, cursor, limit):
+        """Remove up to `limit` ids from the carry; returns (id, name) of those that still exist."""
+        carry = cursor.get('carry', [])
+        carried_ids, cursor['carry'] = carry[:limit], carry[limit:]
+        # Carried topics deleted meanwhile drop out here
+        names = dict(Temator.objects.filter(id__in=carried_ids).values_list('id', 'name'))
+        return [(topic_id, names[topic_id]) for topic_id in carried_ids if topic_id in names]
+
+    def _page(self, cursor, page_size, total_count, diverse):
+        """Next page of (id, name) topics; carried topics come before new ones in both modes."""
+        if not diverse:
+            carried = self._take_carry(cursor, page_size)
+            cursor['sent'] += len(carried)
+            return carried + self._next_page(cursor, page_size - len(carried), total_count)
+
+        pool_size = min(page_size * self.DIVERSITY_POOL_FACTOR, max(self.MAX_DIVERSITY_POOL, page_size))
+        carried = self._take_carry(cursor, pool_size)
+        fresh = self._next_page(cursor, pool_size - len(carried), total_count)
+        topics = self._diverse_page(carried + fresh, page_size)
+        picked_ids = {topic_id for topic_id, _ in topics}
+        cursor['carry'] = [topic_id for topic_id, _ in carried + fresh if topic_id not in picked_ids] + cursor['carry']
+        # _next_page counted the whole fresh batch as sent
+        cursor['sent'] += len(topics) - len(fresh)
+        return topics
+
     def get(self, request):
         # Get the page size from query params or use default
         page_size = int(request.query_params.get('page_size', 200))
-        
-        # Initialize or get the list of already sent Temator IDs from the session
-        if 'sent_temator_ids' not in request.session:
-            request.session['sent_temator_ids'] = []
-        
-        sent_ids = request.session['sent_temator_ids']
-        
-        # Get total count of Temator objects
-        total_count = Temator.objects.count()
-        
-        # Check if we've sent almost all Temators
-        if len(sent_ids) >= total_count - page_size:
-            # Reset the session if we've sent almost all Temators
-            request.session['sent_temator_ids'] = []
-            sent_ids = []
-        
-        # Query for Temators excluding already sent ones
-        available_topics = Temator.objects.exclude(id__in=sent_ids)
-        available_count = available_topics.count()
-        
-        # If we have fewer available records than the page size, just return all of them
-        if available_count <= page_size:
-            topics = list(available_topics)
-            random.shuffle(topics)
-        else:
-            # Select a random subset of the available topics
-            # Get all IDs (this is much faster than fetching all objects)
-            available_ids = list(available_topics.values_list('id', flat=True))
-            
-            # Select random IDs
-            random_ids = random.sample(available_ids, min(page_size, len(available_ids)))
-            
-            # Fetch only the randomly selected objects
-            topics = list(Temator.objects.filter(id__in=random_ids))
-            random.shuffle(topics)
-        
-        # Update the session with the newly sent IDs
-        new_sent_ids = [topic.id for topic in topics]
-        request.session['sent_temator_ids'] = sent_ids + new_sent_ids
-        request.session.modified = True
-        
-        # Extract names
-        word_list = [word.name for word in topics]
-        
+        diverse = request.query_params.get('diverse', 'false').lower() == 'true'
+
+        # Sessions created before the cursor existed carried the full id list
+        request.session.pop('sent_temator_ids', None)
+
+        stats = Temator.objects.aggregate(total=Count('id'), min_id=Min('id'), max_id=Max('id'))
+        total_count = stats['total']
+
+        cursor = request.session.get(self.CURSOR_SESSION_KEY)
+        # Start a new cycle if we've sent almost all Temators (or ran out of topics)
+        if cursor is None or cursor['sent'] >= total_count - page_size or (
+                cursor['offset'] >= cursor['span'] and not cursor.get('carry')):
+            cursor = self._new_cursor(stats)
+
+        topics = self._page(cursor, page_size, total_count, diverse)
+        if not topics and total_count:
+            # Nothing left in this cycle (e.g. its topics were deleted meanwhile)
+            cursor = self._new_cursor(stats)
+            topics = self._page(cursor, page_size, total_count, diverse)
+        word_list = [name for _, name in topics]
+        request.session[self.CURSOR_SESSION_KEY] = cursor
+
         # Return standard response (not paginated)
         return Response({
             "words": word_list
         }, status=status.HTTP_200_OK)
 
 class RandomWordAPIView(APIView):
+    """
+    Random words sampled from the in-memory word pool.
+    Query parameters:
+    - count: number of words (default: 10000, max: 20000)
+    - subst_ratio: share of nouns (speech_part='subst') in the result (default: 0.3)
+    - occurrence_threshold: only words with occurrence greater than this (default: 15)
+    - mode: 'uniform' (default) or 'weighted' (probability grows with occurrence)
+    - temperature: weighted mode only, probability ~ occurrence ** (1 / temperature) (default: 1.0)
+    """
+    DEFAULT_COUNT = 10000
+    MAX_COUNT = 20000
+    DEFAULT_SUBST_RATIO = 0.3
+    DEFAULT_OCCURRENCE_THRESHOLD = 15
+    DEFAULT_TEMPERATURE = 1.0
+
     def get(self, request):
-        target_count = 10000
-        subst_target = int(target_count * 0.3)  # 30% of 10,000
-        
-        # Fetch words with speech_part='subst'
-        subst_words = Word.objects.filter(
-            occurrence__gt=15,
-            speech_part="subst"
-        ).order_by("?")[:subst_target]
-        
-        # Fetch remaining words (70%)
-        remaining_count = target_count - len(subst_words)
-        remaining_words = Word.objects.filter(
-            occurrence__gt=15
-        ).exclude(
-            id__in=[word.id for word in subst_words]
-        ).order_by("?")[:remaining_count]
-        
-        # Merge and shuffle
-        all_words = list(subst_words) + list(remaining_words)
-        random.shuffle(all_words)
-        word_list = [word.name for word in all_words]
-        
+        try:
+            count = int(request.query_params.get('count', self.DEFAULT_COUNT))
+            subst_ratio = float(request.query_params.get('subst_ratio', self.DEFAULT_SUBST_RATIO))
+            occurrence_threshold = int(request.query_params.get('occurrence_threshold', self.DEFAULT_OCCURRENCE_THRESHOLD))
+            temperature = float(request.query_params.get('temperature', self.DEFAULT_TEMPERATURE))
+        except ValueError:
+            return Response(
+                {"error": "count and occurrence_threshold must be integers, subst_ratio and temperature must be numbers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 0 <= subst_ratio <= 1:
+            return Response({"error": "subst_ratio must be between 0 and 1"}, status=status.HTTP_400_BAD_REQUEST)
+        mode = request.query_params.get('mode', 'uniform')
+        if mode not in ('uniform', 'weighted'):
+            return Response({"error": "mode must be 'uniform' or 'weighted'"}, status=status.HTTP_400_BAD_REQUEST)
+        if not temperature > 0:
+            return Response({"error": "temperature must be greater than 0"}, status=status.HTTP_400_BAD_REQUEST)
+        count = max(0, min(count, self.MAX_COUNT))
+
+        word_list = get_word_pool().sample(
+            count,
+            subst_ratio,
+            occurrence_threshold,
+            weighted=mode == 'weighted',
+            temperature=temperature,
+        )
+
         return Response({
             "words": word_list
         }, status=status.HTTP_200_OK)
 
 
+class WordPackManifestAPIView(APIView):
+    """
+    Describes the current word pack. Cheap to poll; clients only download
+    the pack itself when the version changes. 503 until the build_word_pack
+    task or command has published a first pack.
+    """
+    def get(self, request):
+        manifest = word_pack.get_current_manifest()
+        if manifest is None:
+            # Publishing reads the whole Word table: left to the build_word_pack task / command
+            response = Response({"error": "The word pack has not been built yet"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response["Retry-After"] = "300"
+            return response
+        data = dict(manifest)
+        data["url"] = request.build_absolute_uri(reverse('word_pack', args=[manifest["version"]]))
+        response = Response(data, status=status.HTTP_200_OK)
+        response["Cache-Control"] = "no-cache"
+        return response
+
+
+class WordPackAPIView(APIView):
+    """
+    Serves an immutable, precompressed word pack by version (see words.word_pack
+    for the binary layout).
+    """
+    def get(self, request, version):
+        manifest = word_pack.get_current_manifest()
+        if manifest is None or not os.path.exists(word_pack.pack_path(version)):
+            return Response({"error": "Unknown word pack version"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{version}"'
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            response = HttpResponseNotModified()
+        else:
+            accept_encoding = request.headers.get("Accept-Encoding", "")
+            path, content_encoding = word_pack.pack_path(version), None
+            for encoding, suffix in word_pack.accepted_encodings(accept_encoding):
+                if os.path.exists(word_pack.pack_path(version, suffix)):
+                    path, content_encoding = word_pack.pack_path(version, suffix), encoding
+                    break
+            response = FileResponse(open(path, "rb"), content_type="application/octet-stream")
+            if content_encoding:
+                response["Content-Encoding"] = content_encoding
+
+        response["ETag"] = etag
+        response["Vary"] = "Accept-Encoding"
+        response["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
 # Create your views here.
 class ContrastPairViewSet(viewsets.ModelViewSet):
     queryset = ContrastPair.objects.all()
@@ -123,10 +280,23 @@ class ContrastPairViewSet(viewsets.ModelViewSet):
         Query parameters:
         - count: number of items per page (default: 10)
         - page: page number (default: 1)
+        - seed: stable random order, so consecutive pages don't repeat pairs (optional)
+        - tags: comma separated tag names, only pairs with any of them (optional)
+        - tag_match: "all" to require every tag instead of any (default: "any")
         """
-        queryset = self.get_queryset().prefetch_related("tags").filter(
-            Q(ratings__isnull=True)
-        ).exclude(ratings__rating=1).order_by('?')
+        # Only pairs nobody has rated yet (rating_count is kept in sync, no join needed)
+        queryset = self.get_queryset().prefetch_related("tags", rating_ids_prefetch()).defer(
+            "vector_embedding"
+        ).filter(
+            rating_count=0
+        )
+        try:
+            tag_names, tag_match = parse_tag_filter(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = filter_by_tags(queryset, tag_names, tag_match)
+        seed = request.query_params.get("seed")
+        queryset = shuffle_by_seed(queryset, seed) if seed is not None else queryset.order_by('?')
         count = int(request.query_params.get("count", 10))
         page = int(request.query_params.get("page", 1))
         start = (page - 1) * count
@@ -151,13 +321,6 @@ class ContrastPairViewSet(viewsets.ModelViewSet):
                 return Response({"error": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
         return super().create(request, *args, **kwargs)
 
-    def _get_user_fingerprint(self, request):
-        user_agent = get_user_agent(request)
-        ip_address = request.META.get('REMOTE_ADDR', '')
-        fingerprint_string = f"{user_agent.browser.family}-{user_agent.browser.version_string}-{user_agent.os.family}-{user_agent.os.version_string}-{ip_address}"
-        fingerprint_hash = hashlib.sha256(fingerprint_string.encode('utf-8')).hexdigest()
-        return fingerprint_hash
-
     @action(detail=True, methods=["post"])
     def rate(self, request, pk=None):
         pair = self.get_object()
@@ -167,13 +330,9 @@ class ContrastPairViewSet(viewsets.ModelViewSet):
             try:
                 rating = int(rating)  # Convert to integer
                 if 1 <= rating <= 5:  # Validate rating range
-                    user_fingerprint = self._get_user_fingerprint(request)
+                    user_fingerprint = get_user_fingerprint(request)
                     
-                    ContrastPairRating.objects.update_or_create(
-                        contrast_pair=pair,
-                        user_fingerprint=user_fingerprint,
-                        defaults={'rating': rating}
-                    )
+                    upsert_rating(pair.pk, user_fingerprint, rating)
 
                     return Response({"status": "rating updated"})
                 else:
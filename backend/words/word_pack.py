@@ -0,0 +1,219 @@
+"""
+Versioned binary "word pack" with every word eligible for RandomWordAPIView.
+
+Clients download the pack once per version instead of pulling ~10k JSON
+strings from /words/get_random_word/ on every session. The pack is rebuilt by
+the `build_word_pack` management command / Celery task, precompressed on disk
+and served with a strong ETag and `Cache-Control: immutable`.
+
+Pack layout (little endian):
+    b"CAWP", u8 format version, u32 word count
+    u8 speech part count, then per speech part: u8 length + UTF-8 bytes
+    per word (sorted by name, front coded against the previous word):
+        u8 shared prefix length (bytes), u16 suffix length, suffix bytes,
+        u8 speech part index (255 = none), u32 occurrence
+"""
+import gzip
+import hashlib
+import json
+import os
+import struct
+import tempfile
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Word
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always produced
+    brotli = None
+
+PACK_MAGIC = b"CAWP"
+PACK_FORMAT_VERSION = 1
+NO_SPEECH_PART = 255
+DEFAULT_OCCURRENCE_THRESHOLD = 15
+# Older packs kept on disk so clients in the middle of a download still get them
+KEEP_PACKS = 3
+MANIFEST_NAME = "current.json"
+
+_HEADER = struct.Struct("<4sBI")
+_WORD_HEAD = struct.Struct("<BH")
+_WORD_TAIL = struct.Struct("<BI")
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(accept_encoding):
+    """
+    ENCODINGS entries an Accept-Encoding header allows, best first: by
+    q-value, then by our preference. A coding with q=0, or one neither
+    listed nor covered by "*", is not acceptable.
+    """
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    ranked = [
+        (qvalues.get(encoding, qvalues.get("*", 0.0)), -position, (encoding, suffix))
+        for position, (encoding, suffix) in enumerate(ENCODINGS)
+    ]
+    return [entry for q, _, entry in sorted(ranked, reverse=True) if q > 0]
+
+
+def get_pack_dir():
+    return getattr(settings, "WORD_PACK_DIR", os.path.join(settings.MEDIA_ROOT, "word_packs"))
+
+
+def encode_word_pack(words):
+    """Encode (name, occurrence, speech_part) tuples sorted by name."""
+    speech_parts = sorted({speech_part for _, _, speech_part in words if speech_part})
+    if len(speech_parts) >= NO_SPEECH_PART:
+        raise ValueError("Too many distinct speech parts for a word pack")
+    speech_part_index = {speech_part: i for i, speech_part in enumerate(speech_parts)}
+
+    chunks = [_HEADER.pack(PACK_MAGIC, PACK_FORMAT_VERSION, len(words)), bytes([len(speech_parts)])]
+    for speech_part in speech_parts:
+        encoded = speech_part.encode("utf-8")[:255]
+        chunks.append(bytes([len(encoded)]) + encoded)
+
+    previous = b""
+    for name, occurrence, speech_part in words:
+        encoded = name.encode("utf-8")
+        shared = 0
+        limit = min(len(previous), len(encoded), 255)
+        while shared < limit and previous[shared] == encoded[shared]:
+            shared += 1
+        suffix = encoded[shared:]
+        chunks.append(_WORD_HEAD.pack(shared, len(suffix)))
+        chunks.append(suffix)
+        chunks.append(_WORD_TAIL.pack(speech_part_index.get(speech_part, NO_SPEECH_PART), occurrence))
+        previous = encoded
+    return b"".join(chunks)
+
+
+def decode_word_pack(data):
+    """Inverse of encode_word_pack, returns a list of (name, occurrence, speech_part)."""
+    magic, format_version, count = _HEADER.unpack_from(data, 0)
+    if magic != PACK_MAGIC or format_version != PACK_FORMAT_VERSION:
+        raise ValueError("Not a word pack or unsupported format version")
+    offset = _HEADER.size
+    speech_part_count = data[offset]
+    offset += 1
+    speech_parts = []
+    for _ in range(speech_part_count):
+        length = data[offset]
+        speech_parts.append(data[offset + 1:offset + 1 + length].decode("utf-8"))
+        offset += 1 + length
+
+    words = []
+    previous = b""
+    for _ in range(count):
+        shared, suffix_length = _WORD_HEAD.unpack_from(data, offset)
+        offset += _WORD_HEAD.size
+        encoded = previous[:shared] + data[offset:offset + suffix_length]
+        offset += suffix_length
+        speech_part, occurrence = _WORD_TAIL.unpack_from(data, offset)
+        offset += _WORD_TAIL.size
+        words.append((
+            encoded.decode("utf-8"),
+            occurrence,
+            None if speech_part == NO_SPEECH_PART else speech_parts[speech_part],
+        ))
+        previous = encoded
+    return words
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_current_manifest():
+    """Return the manifest of the published pack or None if nothing is published."""
+    try:
+        with open(os.path.join(get_pack_dir(), MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def pack_path(version, suffix=""):
+    return os.path.join(get_pack_dir(), f"{version}.bin{suffix}")
+
+
+def publish_word_pack(occurrence_threshold=DEFAULT_OCCURRENCE_THRESHOLD, force=False):
+    """
+    Build the word pack and publish it if its content changed.
+    Returns (manifest, published).
+    """
+    words = list(
+        Word.objects.filter(occurrence__gt=occurrence_threshold)
+        .order_by("name")
+        .values_list("name", "occurrence", "speech_part")
+        .iterator(chunk_size=10000)
+    )
+    data = encode_word_pack(words)
+    version = hashlib.sha256(data).hexdigest()[:16]
+
+    current = get_current_manifest()
+    if not force and current and current["version"] == version and os.path.exists(pack_path(version)):
+        return current, False
+
+    os.makedirs(get_pack_dir(), exist_ok=True)
+    _write_atomic(pack_path(version), data)
+    encodings = ["gzip"]
+    _write_atomic(pack_path(version, ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _write_atomic(pack_path(version, ".br"), brotli.compress(data, quality=11))
+        encodings.insert(0, "br")
+
+    manifest = {
+        "version": version,
+        "format_version": PACK_FORMAT_VERSION,
+        "count": len(words),
+        "occurrence_threshold": occurrence_threshold,
+        "size": len(data),
+        "encodings": encodings,
+        "created_at": timezone.now().isoformat(),
+    }
+    _write_atomic(
+        os.path.join(get_pack_dir(), MANIFEST_NAME),
+        json.dumps(manifest).encode("utf-8"),
+    )
+    _prune_old_packs(keep_version=version)
+    return manifest, True
+
+
+def _prune_old_packs(keep_version):
+    pack_dir = get_pack_dir()
+    packs = [
+        name for name in os.listdir(pack_dir)
+        if name.endswith(".bin") and not name.startswith(keep_version)
+    ]
+    packs.sort(key=lambda name: os.path.getmtime(os.path.join(pack_dir, name)), reverse=True)
+    for name in packs[KEEP_PACKS - 1:]:
+        for suffix in ("", ".gz", ".br"):
+            path = os.path.join(pack_dir, name + suffix)
+            if os.path.exists(path):
+                os.remove(path)
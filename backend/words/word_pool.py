@@ -0,0 +1,285 @@
+"""
+Process-level pool of words used by RandomWordAPIView.
+
+The whole Word table is loaded once into compact arrays bucketed by
+speech_part and sorted by occurrence, so every request can sample from memory
+instead of running ORDER BY RANDOM() scans. Word saves/deletes made by this
+process are applied to the pool in place; other processes notice the bumped
+data version in the shared cache (CACHES) and rebuild their pool. Bulk writes
+(bulk_create, QuerySet.update, raw SQL) send no signals: call
+bump_word_pool_version() after them.
+
+Weighted sampling (probability ~ occurrence ** (1 / temperature)) draws from a
+cumulative weight table with binary search, O(log n) per word. A bucket builds
+the table of a temperature on first use and drops its tables when a word
+changes. Words are drawn one after another without replacement: a draw that
+hits an already picked word is repeated, and if a few heavy words keep being
+hit the rest is drawn with Efraimidis-Spirakis keys over the remaining words.
+The pool lock is held while sampling, so a request never sees a word change
+half applied.
+"""
+import random
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import numpy as np
+
+from .models import Word
+from .utils import bump_cache_version, get_cache_version
+
+SUBST_SPEECH_PART = "subst"
+OTHER_BUCKET = "other"
+
+WORD_POOL_VERSION_KEY = "words:word_pool_version"
+# Cumulative weight tables kept per bucket (one per temperature)
+MAX_CUMULATIVE_TABLES = 8
+# Repeated draws allowed per requested word before the rest is drawn with keys
+MAX_REDRAWS_PER_WORD = 4
+
+
+class WordBucket:
+    """Words of one speech part, sorted by (occurrence, id)."""
+
+    def __init__(self):
+        self.ids = array("q")
+        self.occurrences = array("L")
+        self.names = []
+        # temperature -> running sums of the weights, aligned with ids
+        self._cumulative = OrderedDict()
+
+    def __len__(self):
+        return len(self.names)
+
+    def append(self, word_id, name, occurrence):
+        self.ids.append(word_id)
+        self.occurrences.append(occurrence)
+        self.names.append(name)
+
+    def insert(self, word_id, name, occurrence):
+        """Insert a word keeping the (occurrence, id) order."""
+        lo = bisect_left(self.occurrences, occurrence)
+        hi = bisect_right(self.occurrences, occurrence, lo)
+        index = lo + bisect_left(self.ids[lo:hi], word_id)
+        self.ids.insert(index, word_id)
+        self.occurrences.insert(index, occurrence)
+        self.names.insert(index, name)
+        self._cumulative.clear()
+
+    def remove(self, word_id, occurrence):
+        lo = bisect_left(self.occurrences, occurrence)
+        hi = bisect_right(self.occurrences, occurrence, lo)
+        index = lo + bisect_left(self.ids[lo:hi], word_id)
+        if index < hi and self.ids[index] == word_id:
+            del self.ids[index]
+            del self.occurrences[index]
+            del self.names[index]
+            self._cumulative.clear()
+
+    def eligible_start(self, occurrence_threshold):
+        """Index of the first word with occurrence > occurrence_threshold."""
+        return bisect_right(self.occurrences, occurrence_threshold)
+
+    def eligible_count(self, occurrence_threshold):
+        return len(self.names) - self.eligible_start(occurrence_threshold)
+
+    def sample(self, occurrence_threshold, count, rng=random):
+        """Sample up to `count` distinct names with occurrence > threshold."""
+        start = self.eligible_start(occurrence_threshold)
+        available = len(self.names) - start
+        count = min(count, available)
+        if count <= 0:
+            return []
+        names = self.names
+        return [names[i] for i in rng.sample(range(start, len(names)), count)]
+
+    def _log_occurrences(self, start=0):
+        occurrences = np.frombuffer(self.occurrences, dtype=f"u{self.occurrences.itemsize}")[start:]
+        with np.errstate(divide="ignore"):
+            return np.log(occurrences.astype(np.float64))
+
+    def cumulative_weights(self, temperature):
+        """Running sums of occurrence ** (1 / temperature), built on first use per temperature."""
+        table = self._cumulative.get(temperature)
+        if table is not None:
+            self._cumulative.move_to_end(temperature)
+            return table
+        table = array("d")
+        if self.names and self.occurrences[-1] > 0:
+            log_occurrences = self._log_occurrences()
+            # Relative to the largest occurrence, so low temperatures can't overflow
+            weights = np.exp((log_occurrences - log_occurrences[-1]) / temperature)
+            table.frombytes(np.cumsum(weights).tobytes())
+        self._cumulative[temperature] = table
+        while len(self._cumulative) > MAX_CUMULATIVE_TABLES:
+            self._cumulative.popitem(last=False)
+        return table
+
+    def weighted_sample(self, occurrence_threshold, count, temperature, rng=random):
+        """
+        Sample up to `count` distinct names with occurrence > threshold, drawn
+        one after another with probability proportional to occurrence ** (1 / temperature).
+        """
+        start = self.eligible_start(occurrence_threshold)
+        end = len(self.names)
+        count = min(count, end - start)
+        if count <= 0:
+            return []
+        cumulative = self.cumulative_weights(temperature)
+        low = cumulative[start - 1] if start else 0.0
+        span = cumulative[-1] - low if cumulative else 0.0
+        if count == end - start or not span > 0:
+            # Every eligible word is taken, or none of them has any weight
+            return self.sample(occurrence_threshold, count, rng)
+
+        picked = {}
+        redraws = 0
+        while len(picked) < count and redraws <= MAX_REDRAWS_PER_WORD * count:
+            index = min(bisect_right(cumulative, low + rng.random() * span, start, end), end - 1)
+            if index in picked:
+                redraws += 1
+            else:
+                picked[index] = None
+        if len(picked) < count:
+            picked.update(dict.fromkeys(self._keyed_sample(start, count - len(picked), temperature, picked, rng)))
+        names = self.names
+        return [names[index] for index in picked]
+
+    def _keyed_sample(self, start, count, temperature, exclude, rng):
+        """
+        Continue a weighted draw without replacement over the words from
+        `start` on that are not in `exclude`: each gets the key
+        log(E) - log(weight) with E ~ Exp(1), and the `count` smallest keys win.
+        """
+        candidates = np.setdiff1d(np.arange(start, len(self.names)), np.fromiter(exclude, dtype=np.int64))
+        generator = np.random.default_rng(rng.getrandbits(64))
+        with np.errstate(divide="ignore"):
+            keys = np.log(generator.standard_exponential(len(candidates))) \
+                - self._log_occurrences()[candidates] / temperature
+        if count < len(candidates):
+            candidates = candidates[np.argpartition(keys, count - 1)[:count]]
+        return candidates.tolist()
+
+
+class WordPool:
+    """In-memory snapshot of the Word table split into subst/other buckets."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.buckets = {SUBST_SPEECH_PART: WordBucket(), OTHER_BUCKET: WordBucket()}
+        # Held by sample and by the in-place updates of word_saved / word_deleted
+        self.lock = threading.Lock()
+        # word id -> (bucket key, occurrence), used to locate words on updates
+        self.locations = {}
+
+    @classmethod
+    def build(cls, version=None):
+        pool = cls(version=version)
+        rows = Word.objects.order_by("occurrence", "id").values_list(
+            "id", "name", "occurrence", "speech_part"
+        )
+        for word_id, name, occurrence, speech_part in rows.iterator(chunk_size=10000):
+            key = cls.bucket_key(speech_part)
+            pool.buckets[key].append(word_id, name, occurrence)
+            pool.locations[word_id] = (key, occurrence)
+        return pool
+
+    @staticmethod
+    def bucket_key(speech_part):
+        return SUBST_SPEECH_PART if speech_part == SUBST_SPEECH_PART else OTHER_BUCKET
+
+    def is_stale(self, version):
+        return version != self.version
+
+    def remove_word(self, word_id):
+        location = self.locations.pop(word_id, None)
+        if location is not None:
+            key, occurrence = location
+            self.buckets[key].remove(word_id, occurrence)
+
+    def apply_word(self, word):
+        """Insert or update a single Word in place."""
+        self.remove_word(word.pk)
+        key = self.bucket_key(word.speech_part)
+        self.buckets[key].insert(word.pk, word.name, word.occurrence)
+        self.locations[word.pk] = (key, word.occurrence)
+
+    def sample(self, count, subst_ratio, occurrence_threshold, weighted=False, temperature=1.0, rng=random):
+        """
+        Return `count` distinct random names with occurrence > threshold,
+        with roughly `subst_ratio` of them being nouns (speech_part='subst').
+        If one bucket runs short, the other one fills the gap.
+        """
+        subst = self.buckets[SUBST_SPEECH_PART]
+        other = self.buckets[OTHER_BUCKET]
+        with self.lock:
+            subst_available = subst.eligible_count(occurrence_threshold)
+            other_available = other.eligible_count(occurrence_threshold)
+
+            subst_count = min(int(count * subst_ratio), subst_available)
+            other_count = min(count - subst_count, other_available)
+            # Top up from subst if there were not enough other words
+            subst_count = min(count - other_count, subst_available)
+
+            if weighted:
+                words = subst.weighted_sample(occurrence_threshold, subst_count, temperature, rng) + \
+                    other.weighted_sample(occurrence_threshold, other_count, temperature, rng)
+            else:
+                words = subst.sample(occurrence_threshold, subst_count, rng) + \
+                    other.sample(occurrence_threshold, other_count, rng)
+        rng.shuffle(words)
+        return words
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_word_pool_version():
+    return get_cache_version(WORD_POOL_VERSION_KEY)
+
+
+def bump_word_pool_version():
+    """Mark the current word pool as outdated and return the new version."""
+    return bump_cache_version(WORD_POOL_VERSION_KEY)
+
+
+def get_word_pool():
+    """Return the process-wide word pool, (re)building it if outdated."""
+    global _pool
+    version = get_word_pool_version()
+    pool = _pool
+    if pool is not None and not pool.is_stale(version):
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.is_stale(version):
+            _pool = WordPool.build(version=version)
+        return _pool
+
+
+def word_saved(word):
+    """Apply a saved Word to this process's pool and bump the shared version."""
+    version = bump_word_pool_version()
+    with _pool_lock:
+        # Only patch a pool that was current; anything older gets rebuilt
+        if _pool is not None and _pool.version == version - 1:
+            with _pool.lock:
+                _pool.apply_word(word)
+            _pool.version = version
+
+
+def word_deleted(word_id):
+    version = bump_word_pool_version()
+    with _pool_lock:
+        if _pool is not None and _pool.version == version - 1:
+            with _pool.lock:
+                _pool.remove_word(word_id)
+            _pool.version = version
+
+
+def reset_word_pool():
+    """Drop the cached pool so the next request rebuilds it."""
+    global _pool
+    with _pool_lock:
+        _pool = None